@@ -15,9 +15,39 @@ are based on Bellevue School District Procedure 2420P:
 
 # import modules
 from math import ceil  # ceiling function
+import hashlib
+import os
+import re
 import lt_module as ltm
-from sys import exit
 
+# Global variables
+DEFAULT_TEMPLATE_FILENAME = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "advice_template.txt")
+# Variables that may be used in the advice template file
+TEMPLATE_VARIABLES = frozenset([
+        'total_lt_count', 'list_of_4s', 'list_of_3s', 'list_of_2s',
+        'list_of_0s_and_1s', 'list_of_lts_below_standard',
+        'min_4_count_for_A', 'min_count_of_lts_met_for_A',
+        'min_count_of_lts_met_for_B', 'min_count_of_lts_met_for_C',
+        'min_count_of_lts_met_for_D', 'count_of_4s', 'count_of_3s',
+        'count_of_2s', 'count_of_0s_and_1s', 'count_of_lts_met'])
+# Sections of the advice template file, one for each advice_for_* function
+SECTION_NAMES = ('advice_for_A_with_all_LTs_met',
+                 'advice_for_A_without_all_LTs_met',
+                 'advice_for_B_geq_90_pct',
+                 'advice_for_B_under_90',
+                 'advice_for_C_geq_80',
+                 'advice_for_C_under_80',
+                 'advice_for_D',
+                 'advice_for_F',
+                 'advice_when_no_LTs_in_gradebook')
+PLACEHOLDER_PATTERN = re.compile(r'\{(\w+)\}')
+NEWLINE_ESCAPE_PATTERN = re.compile(r'[ \t]*\\n[ \t]*')
+# Version reported by template_version() when the built-in advice is used
+BUILT_IN_TEMPLATE_VERSION = 'built-in'
+# Compiled templates by file: path -> (modification time, sections,
+# hash of the file's contents)
+_template_cache = {}
 
 
 def extract_LT_list_by_score(search, student, list_of_all_LTs):
@@ -30,103 +60,214 @@ def extract_LT_list_by_score(search, student, list_of_all_LTs):
     It returns a list of LearningTarget objects on which the student
     has earned the specified score.
     '''
-    list_of_LTs_with_desired_score = []  # Initialize empty list
-    student_lt_dict = student.scores
-    # Look at each lt in the student's dictionary. If the student's
-    # most recent score matches the searched-for score, add it.
-    for lt_label in student_lt_dict:
-        # Compare most recent score to search
-        if student_lt_dict[lt_label][-1] == search:
-            list_of_LTs_with_desired_score.append(
-                ltm.lt_with_label(lt_label, list_of_all_LTs))
-    return list_of_LTs_with_desired_score
+    # Sort the student's LTs by most recent score in one pass
+    # (see Student.score_buckets()), and take the searched-for score.
+    return student.score_buckets(list_of_all_LTs).lts_with_score(search)
+
+
+def template_values(student, list_of_all_LTs, buckets=None):
+    '''
+    This function takes two arguments:
+        (i) a Student object
+        (ii) a list of LearningTarget objects that holds (at minimum)
+            all LTs on which the student has been assessed.
+    buckets is an optional ScoreBuckets object for the student, if the
+    caller already has one (see Student.score_buckets()).
+    It returns a dictionary from the name of each variable that may be
+    used in the advice template file (see TEMPLATE_VARIABLES) to its
+    value for the student. Lists of LTs are stored as lists of
+    LearningTarget objects; they are only written out as rows of LT
+    briefs when a template is rendered.
+    '''
+    if buckets is None:
+        buckets = student.score_buckets(list_of_all_LTs)
+    total_lt_count = len(buckets.lts_assessed)
+    list_of_4s = buckets.lts_with_score(4)
+    list_of_3s = buckets.lts_with_score(3)
+    list_of_2s = buckets.lts_with_score(2)
+    list_of_0s_and_1s = buckets.lts_with_score(0, 1)
+    return {'total_lt_count': total_lt_count,
+            'list_of_4s': list_of_4s,
+            'list_of_3s': list_of_3s,
+            'list_of_2s': list_of_2s,
+            'list_of_0s_and_1s': list_of_0s_and_1s,
+            'list_of_lts_below_standard': list_of_0s_and_1s + list_of_2s,
+            'min_4_count_for_A': ceil(total_lt_count * 0.5),
+            'min_count_of_lts_met_for_A': ceil(total_lt_count * 0.9),
+            'min_count_of_lts_met_for_B': ceil(total_lt_count * 0.8),
+            'min_count_of_lts_met_for_C': ceil(total_lt_count * 0.65),
+            'min_count_of_lts_met_for_D': ceil(total_lt_count * 0.5),
+            'count_of_4s': len(list_of_4s),
+            'count_of_3s': len(list_of_3s),
+            'count_of_2s': len(list_of_2s),
+            'count_of_0s_and_1s': len(list_of_0s_and_1s),
+            'count_of_lts_met': len(list_of_4s) + len(list_of_3s)}
+
+
+class AdviceTemplate:
+    '''
+    Class for one compiled section of the advice template file.
+    The section's text is split once, when the file is read, into a
+    plan of alternating literal strings and variable names, so that
+    rendering the advice for a student is a single join.
+    '''
+
+    __slots__ = ('name', 'plan')
+
+    def __init__(self, name, text):
+        '''
+        Constructor method. Takes the section's name and its text, with
+        comments removed and newline escapes already applied.
+        Variables that are not in TEMPLATE_VARIABLES are left as text.
+        '''
+        self.name = name
+        pieces = PLACEHOLDER_PATTERN.split(text)
+        plan = [pieces[0]]
+        for index in range(1, len(pieces), 2):
+            if pieces[index] in TEMPLATE_VARIABLES:
+                plan.extend([pieces[index], pieces[index + 1]])
+            else:
+                print(f"Warning: unknown variable {{{pieces[index]}}} " +
+                      f"in advice template {name}.")
+                plan[-1] += '{' + pieces[index] + '}' + pieces[index + 1]
+        self.plan = tuple(plan)
+
+    @property
+    def variables(self):
+        '''
+        Tuple of the variables used in the section, in order.
+        '''
+        return self.plan[1::2]
+
+    def render(self, values):
+        '''
+        This method takes a dictionary of values (see template_values())
+        and returns the section's advice with each variable replaced by
+        its value. Lists of LTs are written as rows of LT briefs.
+        '''
+        parts = list(self.plan)
+        for index in range(1, len(parts), 2):
+            value = values[parts[index]]
+            if isinstance(value, list):
+                parts[index] = ltm.rows_of_lt_briefs(value)
+            else:
+                parts[index] = str(value)
+        return ''.join(parts)
+
+    def __repr__(self):
+        '''
+        Method that returns a string representation of the section.
+        '''
+        return f"AdviceTemplate({self.name}: {', '.join(self.variables)})"
+
+
+def parse_templates(text):
+    '''
+    This function takes the contents of an advice template file and
+    returns a dictionary from section name to AdviceTemplate.
+    Lines beginning with '#' are comments. Each section starts with a
+    header line such as "def advice_for_D:". Within a section, newlines
+    are read as spaces and the '\\n' combination is read as a newline.
+    '''
+    sections = {}
+    name = None
+    lines = []
+    for line in text.splitlines() + ['def end:']:
+        line = line.strip()
+        if line.startswith('#'):
+            continue
+        if line.startswith('def ') and line.endswith(':'):
+            if name is not None:
+                body = NEWLINE_ESCAPE_PATTERN.sub('\n', ' '.join(lines))
+                sections[name] = AdviceTemplate(name, body.strip())
+            name = line[len('def '):-1].strip()
+            lines = []
+        elif line != '':
+            lines.append(line)
+    return sections
+
+
+def load_templates(filename=DEFAULT_TEMPLATE_FILENAME):
+    '''
+    This function returns a dictionary from section name to AdviceTemplate
+    for the advice template file with the given name (see
+    parse_templates()), or False if the file cannot be read.
+    The file is only read and compiled again if its modification time has
+    changed since it was last loaded, so it may be called for every report.
+    '''
+    path = os.path.abspath(filename)
+    cached_mtime, cached_sections, _ = _template_cache.get(path,
+                                                           (None, {}, None))
+    try:
+        mtime = os.stat(path).st_mtime_ns
+        if mtime == cached_mtime:
+            return cached_sections
+        with open(path, 'r') as file:
+            text = file.read()
+    except OSError:
+        if cached_mtime is not False:  # Only report the problem once
+            print(f"Error: advice template file {filename} not found.")
+            _template_cache[path] = (False, False, BUILT_IN_TEMPLATE_VERSION)
+        return False
+    sections = parse_templates(text)
+    missing = [name for name in SECTION_NAMES if name not in sections]
+    if len(missing) > 0:
+        print(f"Warning: advice template file {filename} has no " +
+              f"section {', '.join(missing)}; built-in advice will be used.")
+    version = hashlib.sha1(text.encode()).hexdigest()[:12]
+    _template_cache[path] = (mtime, sections, version)
+    return sections
+
+
+def template_version(filename=DEFAULT_TEMPLATE_FILENAME):
+    '''
+    This function returns a short hash of the contents of the advice
+    template file (see load_templates()), which changes whenever the
+    file's text changes, or BUILT_IN_TEMPLATE_VERSION if the file cannot
+    be read. Like load_templates(), it reads the file only if it has
+    changed.
+    '''
+    if load_templates(filename) is False:
+        return BUILT_IN_TEMPLATE_VERSION
+    return _template_cache[os.path.abspath(filename)][2]
+
+
+def render_advice(section, values, filename=DEFAULT_TEMPLATE_FILENAME):
+    '''
+    This function takes the name of an advice section (see SECTION_NAMES)
+    and a dictionary of values (see template_values()), and returns the
+    advice for that section from the advice template file.
+    If the file or the section is missing, it returns the built-in advice
+    from the matching advice_for_* function instead.
+    '''
+    templates = load_templates(filename)
+    if templates is not False and section in templates:
+        return templates[section].render(values)
+    return FALLBACK_ADVICE[section](values)
 
 
 def read_templates_from_file_to_dict(student,
                                      list_of_all_LTs,
-                                     filename="advice_template.txt"):
-    '''
-    This function reads boilerplate from a data file.
-    It replaces specific variables with appropriate values.
-    Any newline characters are changed to spaces,
-    and the '\n' combination is changed to newlines.
-    Finally, the text is stored in a dictionary
-    which this function returns.
+                                     filename=DEFAULT_TEMPLATE_FILENAME):
+    '''
+    This function reads boilerplate from a data file (see
+    load_templates()) and fills in each section's variables with values
+    for the student (see template_values()).
+    It returns a dictionary from section name to advice string,
+    or False if the file cannot be read.
     Arguments:
         (i) a Student object
         (ii) a list of LearningTarget objects that holds (at minimum)
             all LTs on which the student has been assessed.
         (iii) A file name for a file holding advice boilerplate
-
     '''
-    # Open file and read lines into a list, 'lines'.
-    try:
-        with open(filename, 'r') as file:
-            lines = file.readlines()
-    except FileNotFoundError:
-        print(f"Error: file {filename} not found.")
-        exit()
-
-    # Prepare variables to use
-    total_lt_count = len(list_of_all_LTs)
-    list_of_4s = ltm.rows_of_lt_briefs(
-            extract_LT_list_by_score(4, student, list_of_all_LTs))
-    list_of_3s = ltm.rows_of_lt_briefs(
-            extract_LT_list_by_score(3, student, list_of_all_LTs))
-    list_of_2s = ltm.rows_of_lt_briefs(
-               extract_LT_list_by_score(2, student, list_of_all_LTs))
-    list_of_0s_and_1s = ltm.rows_of_lt_briefs(
-            extract_LT_list_by_score(0, student, list_of_all_LTs)) +\
-            ltm.rows_of_lt_briefs(
-                extract_LT_list_by_score(1, student, list_of_all_LTs))
-    list_of_lts_below_standard = list_of_2s + list_of_0s_and_1s
-    min_4_count_for_a = ceil(total_lt_count * 0.5)
-    min_count_of_lts_met_for_A = ceil(total_lt_count * 0.9)
-    min_count_of_lts_met_for_B = ceil(total_lt_count * 0.8)
-    min_count_of_lts_met_for_C = ceil(total_lt_count * 0.65)
-    min_count_of_lts_met_for_D = ceil(total_lt_count * 0.5)
-    count_of_4s = len(list_of_4s)
-    count_of_3s = len(list_of_3s)
-    count_of_2s = len(list_of_2s)
-    count_of_0s_and_1s = len(list_of_0s_and_1s)
-    count_of_lts_met = count_of_4s + count_of_3s
-
-    # Dict to govern replacements
-    vars_dict={'{total_lt_count}': total_lt_count,
-              '{list_of_4s}': list_of_4s,
-              '{list_of_3s}': list_of_3s,
-              '{list_of_2s}': list_of_2s,
-              '{list_of_0s_and_1s}': list_of_0s_and_1s,
-              '{min_4_count_for_a}': min_4_count_for_a,
-              '{min_count_of_lts_met_for_A}': min_count_of_lts_met_for_A,
-              '{min_count_of_lts_met_for_B}': min_count_of_lts_met_for_B,
-              '{min_count_of_lts_met_for_C}': min_count_of_lts_met_for_C
-              '{min_count_of_lts_met_for_D}': min_count_of_lts_met_for_D
-              '{count_of_4s}':  count_of_4s,
-              '{count_of_3s}': count_of_3s,
-              '{count_of_2s}': count_of_2s,
-              '{count_of_0s_and_1s}': count_of_0s_and_1s,
-              '{count_of_lts_met}': count_of_lts_met,
-              '\\n': '\n'}
-
-    # Make replacements in lines
-    for line in lines:
-        # Ignore any commented lines
-        if lines[0] == '#':
-            lines.remove(line)
-        # Replace variable names with values
-        for varname in vars_dict.keys()
-            line.replace(varname, vars_dict[varname])
-
-    advice_dict = {}
-
-    # Find advice_for_A_with_all_LTs_met
-    advice_for_a_with_all_LTs_met_list = []
-    for line in lines:
-        if 'def advice_for_a_with_all_lts_met:' in line.lower():
-            pass # TODO
-
-pass
+    templates = load_templates(filename)
+    if templates is False:
+        return False
+    values = template_values(student, list_of_all_LTs)
+    return {name: template.render(values)
+            for name, template in templates.items()}
+
 
 def advice_for_A_with_all_LTs_met():
     '''
@@ -332,6 +473,37 @@ def advice_when_no_LTs_in_gradebook():
     return advice
 
 
+# Built-in advice for each section, used when the advice template file
+# cannot be read (see render_advice())
+FALLBACK_ADVICE = {
+    'advice_for_A_with_all_LTs_met':
+        lambda values: advice_for_A_with_all_LTs_met(),
+    'advice_for_A_without_all_LTs_met':
+        lambda values: advice_for_A_without_all_LTs_met(
+            values['list_of_lts_below_standard']),
+    'advice_for_B_geq_90_pct':
+        lambda values: advice_for_B_geq_90_pct(
+            values['list_of_3s'], values['count_of_4s'],
+            values['total_lt_count']),
+    'advice_for_B_under_90':
+        lambda values: advice_for_B_under_90(
+            values['list_of_2s'], values['list_of_3s'],
+            values['count_of_4s'], values['total_lt_count']),
+    'advice_for_C_geq_80':
+        lambda values: advice_for_C_geq_80(values['list_of_0s_and_1s']),
+    'advice_for_C_under_80':
+        lambda values: advice_for_C_under_80(
+            values['list_of_lts_below_standard'], values['total_lt_count']),
+    'advice_for_D':
+        lambda values: advice_for_D(values['list_of_lts_below_standard'],
+                                    values['total_lt_count']),
+    'advice_for_F':
+        lambda values: advice_for_F(values['list_of_lts_below_standard'],
+                                    values['total_lt_count']),
+    'advice_when_no_LTs_in_gradebook':
+        lambda values: advice_when_no_LTs_in_gradebook()}
+
+
 # Unit tests
 if __name__ == "__main__":
     # Get some test data
@@ -374,3 +546,77 @@ if __name__ == "__main__":
             extract_LT_list_by_score(4, bob, list_of_all_lts),
             len(list_of_all_lts)))
     # Other methods are similar; testing them is not a priority.
+
+    # Test parse_templates()
+    print("\n\nTesting parse_templates():")
+    sections = parse_templates("# Comment\n" +
+                               "def advice_for_D:\n" +
+                               "# Another comment\n" +
+                               "You have {count_of_4s} 4s\n" +
+                               "and {unknown} things.\\n\\n\n" +
+                               "Study these:\\n\n" +
+                               "{list_of_2s}\n\n\n" +
+                               "def advice_for_F:\n" +
+                               "Total: {total_lt_count}\n")
+    assert list(sections) == ['advice_for_D', 'advice_for_F']
+    assert sections['advice_for_D'].variables == ('count_of_4s',
+                                                  'list_of_2s')
+    assert sections['advice_for_D'].plan[0] == "You have "
+    assert "{unknown} things.\n\nStudy these:\n" in \
+        sections['advice_for_D'].plan[2]
+    print("Success!")
+
+    # Test load_templates() and render_advice()
+    print("Testing load_templates() and render_advice():")
+    templates = load_templates()
+    assert set(templates) == set(SECTION_NAMES)
+    assert load_templates() is templates  # Compiled only once
+    values = template_values(dilbert, list_of_all_lts)
+    assert render_advice('advice_for_A_without_all_LTs_met', values) == \
+        advice_for_A_without_all_LTs_met(
+                values['list_of_lts_below_standard'])
+    values = template_values(bob, list_of_all_lts)
+    rendered = render_advice('advice_for_B_geq_90_pct', values)
+    assert f"standard (earning 3s) on {values['count_of_3s']}" in rendered
+    assert rendered.endswith(ltm.rows_of_lt_briefs(values['list_of_3s']))
+    for section in SECTION_NAMES:
+        assert '{' not in render_advice(section, values)
+    # The file is read again only when it changes
+    import os
+    import tempfile
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "advice_template.txt")
+        with open(filename, 'w') as file:
+            file.write("def advice_for_D:\nFirst {count_of_3s}\n")
+        first = load_templates(filename)
+        assert render_advice('advice_for_D', values, filename) == \
+            f"First {values['count_of_3s']}"
+        assert load_templates(filename) is first
+        first_version = template_version(filename)
+        with open(filename, 'w') as file:
+            file.write("def advice_for_D:\nSecond\n")
+        os.utime(filename, ns=(0, 0))
+        version = template_version(filename)
+        assert render_advice('advice_for_D', values, filename) == "Second"
+        assert version != first_version and len(version) == 12
+        # Missing sections and files fall back to the built-in advice
+        assert render_advice('advice_for_F', values, filename) == \
+            advice_for_F(values['list_of_lts_below_standard'],
+                         values['total_lt_count'])
+        os.remove(filename)
+        assert load_templates(filename) is False
+        assert template_version(filename) == BUILT_IN_TEMPLATE_VERSION
+        assert render_advice('advice_for_D', values, filename) == \
+            advice_for_D(values['list_of_lts_below_standard'],
+                         values['total_lt_count'])
+    print("Success!")
+
+    # Test read_templates_from_file_to_dict()
+    print("Testing read_templates_from_file_to_dict():")
+    advice_dict = read_templates_from_file_to_dict(ivan, list_of_all_lts)
+    assert advice_dict['advice_when_no_LTs_in_gradebook'] == \
+        advice_when_no_LTs_in_gradebook()
+    assert read_templates_from_file_to_dict(
+            ivan, list_of_all_lts, "no_such_file.txt") is False
+    print("Success!\n\n")
+    print("All tests were successful.")
@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+Description: batch_grading module.
+This module grades many students at once. It packs one or more
+ClassPeriods into a dense students x LTs array of most recent scores
+(with a mask for missing and exempt scores) and computes the simple,
+piecewise and sticky grades, and letter grades, for every student with
+vectorized NumPy operations.
+
+The results agree with the per-student functions in
+nitty_gritty_of_grading (NGOG). A grade that NGOG cannot calculate
+(e.g. the simple grade of a student with a 0.5) is left undefined, as in
+ngog.cached_grades().
+
+Dependencies:
+    numpy
+"""
+
+# import modules
+import numpy as np
+import nitty_gritty_of_grading as ngog
+
+# Global variables
+GRADE_CODES = np.array(['A', 'B', 'C', 'D', 'F'])
+# Values of ClassPeriod.overall_function that can be graded
+OVERALL_FUNCTIONS = ['simple', 'piecewise', 'sticky']
+# Scores accepted by NGOG's simple grade (see ngog.GradeSummary)
+SIMPLE_GRADE_SCORES = [0, 1, 1.5, 2, 2.5, 3, 3.5, 4]
+
+
+def score_matrix_from_classperiods(list_of_classperiods,
+                                   exempt_code=ngog.DEFAULT_X_CODE):
+    '''
+    This function takes a list of ClassPeriod objects and packs the most
+    recent scores of every student in them into one array.
+    It returns a tuple of four elements:
+        (i) a list of LT labels, one per column. LTs in the ClassPeriods'
+            course_lts come first, followed by any other labels found
+            in student scores.
+        (ii) a 2-D float array with one row per student (in the order
+             the students appear in the ClassPeriods) and one column
+             per LT, holding the most recent score.
+        (iii) a 2-D bool array of the same shape that is True wherever
+              the student has no score on the LT or is exempt.
+        (iv) a 1-D int array giving, for each row, the index of the
+             student's ClassPeriod in list_of_classperiods.
+    '''
+    column_of_label = {}
+    for cp in list_of_classperiods:
+        for lt in cp.course_lts:
+            column_of_label.setdefault(lt.lt_label, len(column_of_label))
+    # Flat lists of (row, column, score) for every most recent score
+    rows = []
+    columns = []
+    recent_scores = []
+    period_index = []
+    for cp_index, cp in enumerate(list_of_classperiods):
+        for student in cp.students_in_period:
+            row = len(period_index)
+            period_index.append(cp_index)
+            for lt_label, history in student.scores.items():
+                column = column_of_label.setdefault(lt_label,
+                                                    len(column_of_label))
+                rows.append(row)
+                columns.append(column)
+                recent_scores.append(history[-1])
+    scores = np.full((len(period_index), len(column_of_label)),
+                     float(exempt_code))
+    scores[rows, columns] = recent_scores
+    mask = scores == exempt_code
+    return (list(column_of_label),
+            scores,
+            mask,
+            np.array(period_index, dtype=int))
+
+
+def grade_score_matrix(scores, mask):
+    '''
+    This function takes a 2-D array of most recent scores (one row per
+    student) and a mask that is True for missing or exempt scores,
+    as returned by score_matrix_from_classperiods().
+    It returns a dictionary of 1-D arrays, one entry per student:
+        'lt_count': number of LTs assessed
+        'count_of_4s': number of 4s
+        'count_of_lts_met': number of 3s, 3.5s and 4s
+        'grade_code': 'A', 'B', 'C', 'D' or 'F' (as in ngog.GradeSummary)
+        'simple', 'piecewise', 'sticky': the three overall grades.
+            The simple and sticky grades are NaN for students with a
+            score that NGOG's simple grade does not accept (e.g. 0.5).
+    An AssertionError is raised if any unmasked score is invalid.
+    '''
+    assessed = ~mask
+    assert np.isin(scores[assessed], ngog.DEFAULT_VALID_SCORES).all()
+    lt_count = assessed.sum(axis=1)
+    count_of_4s = ((scores == 4) & assessed).sum(axis=1)
+    count_of_lts_met = ((scores >= 3) & assessed).sum(axis=1)
+    has_0s_or_1s = (((scores == 0) | (scores == 1)) & assessed).any(axis=1)
+    pct = np.divide(count_of_lts_met, lt_count,
+                    out=np.zeros(len(lt_count)), where=lt_count > 0)
+    # Same cascade as ngog.GradeSummary
+    is_a = (pct >= 0.9) & (count_of_4s >= lt_count / 2) & ~has_0s_or_1s
+    is_b = ~is_a & (pct >= 0.8) & ~has_0s_or_1s
+    is_c = ~is_a & ~is_b & (pct >= 0.65)
+    is_d = ~is_a & ~is_b & ~is_c & (pct >= 0.5)
+    grade_index = np.select([is_a, is_b, is_c, is_d], [0, 1, 2, 3], 4)
+    grade_code = GRADE_CODES[grade_index]
+    simple = np.array([ngog.SIMPLE_GRADES[code]
+                       for code in GRADE_CODES])[grade_index]
+    simple_is_valid = (np.isin(scores, SIMPLE_GRADE_SCORES) | mask).all(axis=1)
+    simple = np.where(simple_is_valid, simple, np.nan)
+    # Curve each distinct (LTs met, LTs assessed) pair once with
+    # ngog.curve_pct so that rounding matches the per-student code exactly.
+    pair_keys = count_of_lts_met * (scores.shape[1] + 1) + lt_count
+    unique_keys, inverse = np.unique(pair_keys, return_inverse=True)
+    unique_pct = np.divide(unique_keys // (scores.shape[1] + 1),
+                           unique_keys % (scores.shape[1] + 1),
+                           out=np.zeros(len(unique_keys)),
+                           where=unique_keys % (scores.shape[1] + 1) > 0)
+    curved = np.array([ngog.curve_pct(p) for p in unique_pct.tolist()],
+                      dtype=float)[inverse.reshape(-1)]
+    piecewise = np.where(is_b & (curved >= 0.9), 0.89,
+                         np.where(is_c & (curved >= 0.8), 0.79, curved))
+    return {'lt_count': lt_count,
+            'count_of_4s': count_of_4s,
+            'count_of_lts_met': count_of_lts_met,
+            'grade_code': grade_code,
+            'simple': simple,
+            'piecewise': piecewise,
+            'sticky': np.minimum(simple, piecewise)}  # NaN if simple is
+
+
+def letter_grades_from_codes(grade_code, d_is_valid):
+    '''
+    This function takes an array of grade codes (as returned by
+    grade_score_matrix()) and a bool, or a bool array with one entry
+    per student, for whether D is a valid grade.
+    It returns an array of letter grades, with Ds changed to Fs
+    wherever D is not valid.
+    '''
+    return np.where((grade_code == 'D') & ~np.asarray(d_is_valid, dtype=bool),
+                    'F', grade_code)
+
+
+def grade_classperiods(list_of_classperiods):
+    '''
+    This function takes a list of ClassPeriod objects and grades every
+    student in them at once.
+    It returns a list with one entry per ClassPeriod. Each entry is a
+    tuple of two lists, in the order of that ClassPeriod's students:
+        (i) overall grades as percentages (0-100), using the ClassPeriod's
+            overall_function, as in ClassPeriod.get_list_of_overall_grades()
+        (ii) letter grades, using the ClassPeriod's d_is_valid setting.
+    A grade that cannot be calculated (see grade_score_matrix()) is None,
+    as is the letter grade of a student without a simple grade.
+    It raises a ValueError if a ClassPeriod's overall_function is not one
+    of OVERALL_FUNCTIONS.
+    '''
+    for cp in list_of_classperiods:
+        if cp.overall_function not in OVERALL_FUNCTIONS:
+            raise ValueError(f"{cp.description} has unknown overall " +
+                             f"function {cp.overall_function!r}")
+    labels, scores, mask, period_index = \
+        score_matrix_from_classperiods(list_of_classperiods)
+    grades = grade_score_matrix(scores, mask)
+    overall_function = np.array([cp.overall_function
+                                 for cp in list_of_classperiods] +
+                                [''])[period_index]
+    overall = np.select([overall_function == function
+                         for function in OVERALL_FUNCTIONS],
+                        [grades[function] for function in OVERALL_FUNCTIONS])
+    overall_pct = np.rint(np.nan_to_num(overall) * 100).astype(object)
+    overall_pct[np.isnan(overall)] = None
+    d_is_valid = np.array([cp.d_is_valid for cp in list_of_classperiods] +
+                          [True])[period_index]
+    letters = letter_grades_from_codes(grades['grade_code'],
+                                       d_is_valid).astype(object)
+    letters[np.isnan(grades['simple'])] = None
+    results = []
+    for cp_index in range(len(list_of_classperiods)):
+        in_period = period_index == cp_index
+        results.append(([None if grade is None else int(grade)
+                         for grade in overall_pct[in_period]],
+                        letters[in_period].tolist()))
+    return results
+
+
+# Unit tests
+if __name__ == "__main__":
+    import data_for_unit_testing as dfut
+    import classperiod_module as cpm
+    import student_module as stu
+    students = dfut.sample_list_of_students()
+    lts = dfut.sample_list_of_lts()
+    # Test score_matrix_from_classperiods()
+    print("Testing score_matrix_from_classperiods():")
+    cp_x = cpm.ClassPeriod("Period X", students[:5], lts)
+    cp_y = cpm.ClassPeriod("Period Y", students[5:], lts,
+                           overall_function='sticky', d_is_valid=False)
+    labels, scores, mask, period_index = \
+        score_matrix_from_classperiods([cp_x, cp_y])
+    assert labels == [lt.lt_label for lt in lts]
+    assert scores.shape == (10, 10)
+    assert scores[0].tolist() == [4, 4, 4, 4, 4, 3, 3, 3, 3, 3]  # Aerik
+    assert mask[8].all()  # Ivan has no scores
+    assert mask[9].tolist() == [True] + [False] + [True] * 8  # Janet
+    assert period_index.tolist() == [0] * 5 + [1] * 5
+    print("Success!")
+    # Test grade_score_matrix() against the per-student functions
+    print("Testing grade_score_matrix():")
+    grades = grade_score_matrix(scores, mask)
+    assert grades['grade_code'].tolist() == ['A', 'B', 'A', 'B', 'C',
+                                             'C', 'D', 'F', 'F', 'A']
+    for index, student in enumerate(students):
+        for function in ['simple', 'piecewise', 'sticky']:
+            assert grades[function][index] == \
+                student.calculate_overall_grade(function)
+    print("Success!")
+    # Test grade_classperiods()
+    print("Testing grade_classperiods():")
+    (x_grades, x_letters), (y_grades, y_letters) = \
+        grade_classperiods([cp_x, cp_y])
+    assert x_grades == cp_x.get_list_of_overall_grades()
+    assert y_grades == cp_y.get_list_of_overall_grades()
+    assert x_letters == ['A', 'B', 'A', 'B', 'C']
+    assert y_letters == ['C', 'F', 'F', 'F', 'A']  # D is not valid
+    assert grade_classperiods([]) == []
+    # NGOG's simple grade (and so the sticky and letter grades) does not
+    # accept 0.5, while the piecewise grade does
+    half = stu.Student(11, "Half", "Point")
+    half.scores = {'LT01': [0.5], 'LT02': [4]}
+    cp_z = cpm.ClassPeriod("Period Z", [half], lts)
+    grades = grade_score_matrix(*score_matrix_from_classperiods([cp_z])[1:3])
+    assert np.isnan(grades['simple'][0]) and np.isnan(grades['sticky'][0])
+    assert grades['piecewise'][0] == half.calculate_overall_grade('piecewise')
+    for function in ['simple', 'sticky']:
+        calculated = True
+        try:
+            half.calculate_overall_grade(function)
+        except AssertionError:
+            calculated = False
+        assert not(calculated), f"NGOG calculated a {function} grade"
+    assert grade_classperiods([cp_z]) == [([60], [None])]
+    cp_z.overall_function = 'sticky'
+    assert grade_classperiods([cp_z]) == [([None], [None])]
+    cp_y.overall_function = 'letter'
+    try:
+        grade_classperiods([cp_x, cp_y])
+        assert False, "An unknown overall function should raise an error"
+    except ValueError:
+        pass
+    print("Success!\n\n")
+    print("All tests were successful.")
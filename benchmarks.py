@@ -0,0 +1,865 @@
+# -*- coding: utf-8 -*-
+"""
+Description: benchmarks module.
+This module contains benchmarks that measure the speed and memory use
+of sbgrader on large synthetic gradebooks.
+Run this file to run all of the benchmarks and print the results.
+"""
+
+# import modules
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+import advice
+import classperiod_module as cpm
+import report_bundle as rb
+import report_manifest as rm
+import lt_module as ltm
+import sbg_data_methods as dm
+import school_module as scm
+import score_journal as sj
+import snapshot_cache as sc
+import student_module as stu
+import sqlite_gradebook as sqg
+import synergy_html as sh
+
+# Global variables
+BENCHMARK_SEED = 521
+BENCHMARK_LT_COUNT = 20
+# Most recent scores are drawn from these, weighted toward meeting standard
+BENCHMARK_SCORES = [0, 1, 1.5, 2, 2.5, 3, 3, 3.5, 4, 4]
+
+
+def synthetic_scores_dicts(student_count,
+                           lt_count=BENCHMARK_LT_COUNT,
+                           seed=BENCHMARK_SEED):
+    '''
+    This function returns a list of student_count score dictionaries
+    (LT label -> list of scores), each with scores on lt_count LTs
+    and one to three attempts per LT.
+    The same seed always gives the same scores.
+    '''
+    rng = random.Random(seed)
+    labels = [f"LT{index + 1:02}" for index in range(lt_count)]
+    scores_dicts = []
+    for _ in range(student_count):
+        scores_dicts.append({label: [rng.choice(BENCHMARK_SCORES)
+                                     for _ in range(rng.randint(1, 3))]
+                             for label in labels})
+    return scores_dicts
+
+
+def synthetic_lts(lt_count=BENCHMARK_LT_COUNT):
+    '''
+    This function returns a list of lt_count LearningTarget objects
+    labeled to match synthetic_scores_dicts().
+    '''
+    return [ltm.LearningTarget(f"LT{index + 1:02}",
+                               f"Brief description of LT{index + 1:02}",
+                               f"Verbose description of LT{index + 1:02}")
+            for index in range(lt_count)]
+
+
+def synthetic_students(student_count,
+                       lt_count=BENCHMARK_LT_COUNT,
+                       seed=BENCHMARK_SEED):
+    '''
+    This function returns a list of student_count Student objects
+    with scores from synthetic_scores_dicts().
+    '''
+    students = []
+    for sid, scores_dict in enumerate(
+            synthetic_scores_dicts(student_count, lt_count, seed), 1):
+        student = stu.Student(sid, f"Last{sid}", f"First{sid}")
+        student.scores = scores_dict
+        students.append(student)
+    return students
+
+
+def synthetic_classperiod(description, student_count,
+                          lt_count=BENCHMARK_LT_COUNT,
+                          seed=BENCHMARK_SEED):
+    '''
+    This function returns a ClassPeriod with the given description
+    holding synthetic_students() and synthetic_lts().
+    '''
+    return cpm.ClassPeriod(description,
+                           synthetic_students(student_count, lt_count, seed),
+                           synthetic_lts(lt_count))
+
+
+def synthetic_gradebook_page(student_count, assignment_count,
+                             seed=BENCHMARK_SEED):
+    '''
+    This function returns the HTML of a synthetic Synergy gradebook page
+    (see synergy_html) with student_count students and assignment_count
+    assignments, every other one an LT. Each score box is laid out as
+    on a saved Grade Book Main page.
+    '''
+    rng = random.Random(seed)
+    assignments = [f"LT{column + 1:02} Target {column + 1}" if column % 2
+                   else f"Homework {column + 1}"
+                   for column in range(assignment_count)]
+    names = "".join(f'<tr><td><a href="#">Last{sid}, First{sid}</a>' +
+                    f'<br/><span>{100000 + sid}</span></td></tr>\n'
+                    for sid in range(student_count))
+    rows = []
+    for sid in range(student_count):
+        cells = []
+        for column in range(assignment_count):
+            score = rng.choice(BENCHMARK_SCORES + ['&nbsp;'])
+            cells.append(
+                    f'<td GBID="{column}" col="{column}" class="cAGR">' +
+                    '<div class="dc">' +
+                    f'<div class="SAI">{score}</div>' +
+                    '<div class="SS" style="display:none;">0.00</div>' +
+                    '<div class="SAE"></div></div></td>')
+        rows.append(f'<tr class="cAGR" studentid="{sid}">' +
+                    "".join(cells) + '</tr>\n')
+    return "".join([
+        '<html><body>\n',
+        f'<span id="{sh.FOCUS_ID}">Current Focus: (S1) Teacher, A ',
+        f'Period {seed} SEC: 1</span>\n',
+        f'<input type="hidden" id="{sh.ASSIGNMENT_INDEX_ID}" value="',
+        '║'.join(assignments), '">\n',
+        f'<table id="{sh.STUDENT_TABLE_ID}"><tr><th>Student</th></tr>\n',
+        names, '<tr><td>Total</td></tr></table>\n',
+        f'<table id="{sh.SCORE_GRID_ID}"><tr><th>Scores</th></tr>\n',
+        "".join(rows), '<tr><td>Average</td></tr></table>\n',
+        '</body></html>\n'])
+
+
+def time_call(function, *args):
+    '''
+    This function calls function(*args) and returns a tuple of its
+    return value and the number of seconds the call took.
+    '''
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+class PlainStudent:
+    '''
+    Class holding student data the way Student held it before
+    scores were stored compactly: instance attributes in a __dict__
+    and scores in a dictionary of lists of ints and floats.
+    Used as the baseline in benchmark_memory().
+    '''
+    def __init__(self, sid, lastname, firstname, scores_dict):
+        '''
+        Constructor method
+        '''
+        self.sid = sid
+        self.lastname = lastname
+        self.firstname = firstname
+        self.pronoun = "they"
+        self.scores = scores_dict
+
+
+def legacy_build_scores_dict_from_data(data_str):
+    '''
+    This function is the scores parser that dm.build_scores_dict_from_data()
+    replaced, which splits the data on "scores: ", then on "]," and then
+    on ":". Used as the baseline in benchmark_scores_parser().
+    '''
+    scores_dict = {}
+    dict_string = data_str.split("scores: ")[1].strip()
+    assert dict_string[0] == '{' and dict_string[-1] == '}'
+    dict_string = dict_string[1:-1]
+    assert dm.no_taboos(dict_string)
+    if dict_string.strip() == '':
+        return {}
+    for item in dict_string.split('],'):
+        pair = item.strip().split(':')
+        label = pair[0]
+        if label[0] == "'" or label[0] == '"':
+            label = label[1:]
+        if label[-1] == "'" or label[-1] == '"':
+            label = label[:-1]
+        scores_dict[label] = dm.str_to_list(pair[1].strip())
+    return scores_dict
+
+
+def legacy_render_advice(section, values,
+                         filename=advice.DEFAULT_TEMPLATE_FILENAME):
+    '''
+    This function renders one section of the advice template file the way
+    advice.read_templates_from_file_to_dict() was written to: by reading
+    the file again and calling str.replace() once for each variable.
+    Used as the baseline in benchmark_advice_templates().
+    '''
+    with open(filename, 'r') as file:
+        lines = file.readlines()
+    body = []
+    in_section = False
+    for line in lines:
+        line = line.strip()
+        if line.startswith('#'):
+            continue
+        if line.startswith('def ') and line.endswith(':'):
+            in_section = (line == f"def {section}:")
+        elif in_section and line != '':
+            body.append(line)
+    text = ' '.join(body)
+    for name, value in values.items():
+        if isinstance(value, list):
+            value = ltm.rows_of_lt_briefs(value)
+        text = text.replace('{' + name + '}', str(value))
+    return advice.NEWLINE_ESCAPE_PATTERN.sub('\n', text).strip()
+
+
+def measure_memory(build):
+    '''
+    This function calls build() and returns a tuple of its return value
+    and the number of bytes allocated (and still held) while it ran.
+    '''
+    tracemalloc.start()
+    try:
+        result = build()
+        allocated = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return result, allocated
+
+
+def measure_peak_memory(function):
+    '''
+    This function calls function() and returns a tuple of its return
+    value and the largest number of bytes allocated at once while it ran.
+    '''
+    tracemalloc.start()
+    try:
+        result = function()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return result, peak
+
+
+def benchmark_memory(student_count=100000, lt_count=BENCHMARK_LT_COUNT):
+    '''
+    This function compares the memory held by a synthetic gradebook of
+    student_count students stored as PlainStudents and as Students.
+    It prints the results and returns a tuple of the two byte counts.
+    '''
+    def build_plain():
+        return [PlainStudent(sid, f"Last{sid}", f"First{sid}",
+                             {label: [float(score) if score % 1 else score
+                                      for score in history]
+                              for label, history in scores_dict.items()})
+                for sid, scores_dict in enumerate(
+                        synthetic_scores_dicts(student_count, lt_count), 1)]
+
+    def build_compact():
+        return synthetic_students(student_count, lt_count)
+
+    plain, plain_bytes = measure_memory(build_plain)
+    score_count = sum(len(history) for student in plain
+                      for history in student.scores.values())
+    del plain
+    compact, compact_bytes = measure_memory(build_compact)
+    del compact
+    print(f"Memory for {student_count} students, {lt_count} LTs, " +
+          f"{score_count} scores:")
+    print(f"\tdict of lists: {plain_bytes / 2**20:.1f} MiB " +
+          f"({plain_bytes / score_count:.1f} bytes/score)")
+    print(f"\tScoreBook:     {compact_bytes / 2**20:.1f} MiB " +
+          f"({compact_bytes / score_count:.1f} bytes/score)")
+    print(f"\treduction:     {plain_bytes / compact_bytes:.1f}x")
+    return plain_bytes, compact_bytes
+
+
+def benchmark_storage(period_count=6, students_per_period=150,
+                      lt_count=BENCHMARK_LT_COUNT):
+    '''
+    This function compares the time taken to save and load period_count
+    synthetic class periods in the legacy layout (one .studat file per
+    student, see cpm.write_classperiod_to_datafile()) and in a single
+    SQLite database (see sqlite_gradebook). Files are written to a
+    temporary directory.
+    It prints the results and returns a dictionary of the times.
+    '''
+    classperiods = [synthetic_classperiod(f"Period {index + 1}",
+                                          students_per_period, lt_count,
+                                          BENCHMARK_SEED + index)
+                    for index in range(period_count)]
+    times = {}
+    working_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        # write_classperiod_to_datafile() writes to the working directory
+        os.chdir(directory)
+        try:
+            _, times['legacy save'] = time_call(
+                    lambda: all(cpm.write_classperiod_to_datafile(cp)
+                                for cp in classperiods))
+            index_files = [os.path.join(
+                    cpm.replace_punctuation_with_underscores(cp.description),
+                    cpm.replace_punctuation_with_underscores(cp.description)
+                    + ".txt") for cp in classperiods]
+            legacy, times['legacy load'] = time_call(
+                    lambda: [cpm.build_classperiod_from_datafile(filename)
+                             for filename in index_files])
+            connection = sqg.open_gradebook('gradebook.sqlite')
+            _, times['SQLite save'] = time_call(
+                    sqg.save_classperiods, connection, classperiods)
+            connection.close()
+            connection = sqg.open_gradebook('gradebook.sqlite')
+            loaded, times['SQLite load'] = time_call(
+                    lambda: [sqg.load_classperiod(connection, cp.description)
+                             for cp in classperiods])
+            _, times['SQLite one student'] = time_call(
+                    sqg.load_student, connection, "Period 1",
+                    students_per_period // 2)
+            connection.close()
+        finally:
+            os.chdir(working_directory)
+    assert [repr(cp) for cp in loaded] == [repr(cp) for cp in legacy]
+    print(f"Storage for {period_count} periods of {students_per_period} " +
+          f"students, {lt_count} LTs:")
+    for name, seconds in times.items():
+        print(f"\t{name + ':':20}{seconds * 1000:9.1f} ms")
+    return times
+
+
+def benchmark_incremental_save(period_count=40, students_per_period=30,
+                               edit_count=20, lt_count=BENCHMARK_LT_COUNT):
+    '''
+    This function times saving after every edit for a teacher with
+    period_count class periods: each edit appends one score to one
+    student and then saves that student's class period, first writing
+    only the changed files and then rewriting every file.
+    It prints the results and returns a tuple of the average seconds
+    per save in each case.
+    '''
+    rng = random.Random(BENCHMARK_SEED)
+    classperiods = [synthetic_classperiod(f"Period {index + 1}",
+                                          students_per_period, lt_count,
+                                          BENCHMARK_SEED + index)
+                    for index in range(period_count)]
+    averages = []
+    working_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            for cp in classperiods:
+                cpm.write_classperiod_to_datafile(cp)
+            for only_modified in [True, False]:
+                total = 0
+                for _ in range(edit_count):
+                    cp = rng.choice(classperiods)
+                    student = rng.choice(cp.students_in_period)
+                    lt_label = rng.choice(cp.course_lts).lt_label
+                    stu.update_grade(student, lt_label,
+                                     rng.choice(BENCHMARK_SCORES))
+                    _, seconds = time_call(cpm.write_classperiod_to_datafile,
+                                           cp, only_modified)
+                    total += seconds
+                averages.append(total / edit_count)
+        finally:
+            os.chdir(working_directory)
+    print(f"Save after each edit, {period_count} periods of " +
+          f"{students_per_period} students:")
+    print(f"\tchanged files only: {averages[0] * 1000:7.2f} ms per save")
+    print(f"\tevery file:         {averages[1] * 1000:7.2f} ms per save")
+    return tuple(averages)
+
+
+def benchmark_load_modes(student_count=3000, lt_count=BENCHMARK_LT_COUNT):
+    '''
+    This function saves a synthetic class period of student_count students
+    in the legacy layout and times reading it back with each of
+    cpm.LOAD_MODES. For lazy loading, it also times listing the roster
+    (every sid) and then reading every student.
+    It prints the results and returns a dictionary of the times.
+    '''
+    cp = synthetic_classperiod("Load Test", student_count, lt_count)
+    times = {}
+    working_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            cpm.write_classperiod_to_datafile(cp)
+            index_filename = cp.saved_index_filename
+            for load_mode in cpm.LOAD_MODES:
+                loaded, times[load_mode] = time_call(
+                        cpm.build_classperiod_from_datafile, index_filename,
+                        False, load_mode)
+            _, times['lazy, list roster'] = time_call(
+                    lambda: [student.sid
+                             for student in loaded.students_in_period])
+            _, times['lazy, then read all'] = time_call(
+                    loaded.get_list_of_overall_grades)
+        finally:
+            os.chdir(working_directory)
+    print(f"Loading a class period of {student_count} students, " +
+          f"{lt_count} LTs:")
+    for name, seconds in times.items():
+        print(f"\t{name + ':':22}{seconds * 1000:9.1f} ms")
+    return times
+
+
+def benchmark_scores_parser(entry_count=10000, repeats=20):
+    '''
+    This function times dm.build_scores_dict_from_data() against
+    legacy_build_scores_dict_from_data() on two synthetic student data
+    strings: one with entry_count LTs of one to three scores each, and
+    one with a single LT whose history has entry_count scores.
+    It prints the best of repeats runs of each and returns a dictionary
+    of the times.
+    '''
+    rng = random.Random(BENCHMARK_SEED)
+    many_lts = {f"LT{index:05}": [rng.choice(BENCHMARK_SCORES)
+                                  for _ in range(rng.randint(1, 3))]
+                for index in range(entry_count)}
+    long_history = {'LT01': [rng.choice(BENCHMARK_SCORES)
+                             for _ in range(entry_count)]}
+    times = {}
+    for name, scores_dict in [(f"{entry_count} LTs", many_lts),
+                              (f"{entry_count}-score history",
+                               long_history)]:
+        student = stu.Student(1, "Last", "First")
+        student.scores = scores_dict
+        data_str = str(student)
+        for parser in [legacy_build_scores_dict_from_data,
+                       dm.build_scores_dict_from_data]:
+            assert parser(data_str) == scores_dict
+            times[(name, parser.__name__)] = min(
+                    time_call(parser, data_str)[1] for _ in range(repeats))
+    print("Parsing student scores (best of " + str(repeats) + "):")
+    for (name, parser_name), seconds in times.items():
+        print(f"\t{name}, {parser_name}: {seconds * 1000:.2f} ms")
+    return times
+
+
+def benchmark_snapshots(period_count=6, students_per_period=35,
+                        lt_count=BENCHMARK_LT_COUNT):
+    '''
+    This function times a teacher's start-up: loading period_count
+    synthetic class periods saved in the legacy layout, first by parsing
+    the text files (which also writes snapshots) and then from the
+    snapshots (see snapshot_cache).
+    It prints the results and returns a tuple of the two times.
+    '''
+    classperiods = [synthetic_classperiod(f"Period {index + 1}",
+                                          students_per_period, lt_count,
+                                          BENCHMARK_SEED + index)
+                    for index in range(period_count)]
+    working_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            for cp in classperiods:
+                cpm.write_classperiod_to_datafile(cp)
+            index_files = [cp.saved_index_filename for cp in classperiods]
+            parsed, parse_seconds = time_call(
+                    lambda: [sc.load_classperiod(filename)
+                             for filename in index_files])
+            loaded, snapshot_seconds = time_call(
+                    lambda: [sc.read_snapshot(filename)
+                             for filename in index_files])
+        finally:
+            os.chdir(working_directory)
+    assert [repr(cp) for cp in loaded] == [repr(cp) for cp in parsed]
+    print(f"Start-up with {period_count} periods of {students_per_period} " +
+          f"students, {lt_count} LTs:")
+    print(f"\tparsing text files: {parse_seconds * 1000:7.1f} ms")
+    print(f"\tfrom snapshots:     {snapshot_seconds * 1000:7.1f} ms")
+    return parse_seconds, snapshot_seconds
+
+
+def benchmark_journal(student_count=150, edit_count=200,
+                      lt_count=BENCHMARK_LT_COUNT):
+    '''
+    This function times making edit_count edits to a synthetic class
+    period of student_count students, with each edit made durable
+    either by recording it in the period's journal (see score_journal)
+    or by saving the changed files after it.
+    It prints the results and returns a tuple of the average seconds
+    per edit in each case.
+    '''
+    rng = random.Random(BENCHMARK_SEED)
+    cp = synthetic_classperiod("Journal Period", student_count, lt_count)
+    edits = [(rng.choice(cp.students_in_period).sid,
+              rng.choice(cp.course_lts).lt_label,
+              rng.choice(BENCHMARK_SCORES)) for _ in range(edit_count)]
+    averages = []
+    working_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            cpm.write_classperiod_to_datafile(cp)
+            sj.open_journal(cp, compact_every=None)
+
+            def journaled_edits():
+                for sid, lt_label, score in edits:
+                    sj.update_grade(cp, cp.find_student(sid), lt_label, score)
+
+            def saved_edits():
+                for sid, lt_label, score in edits:
+                    stu.update_grade(cp.find_student(sid), lt_label, score)
+                    cpm.write_classperiod_to_datafile(cp)
+
+            _, seconds = time_call(journaled_edits)
+            averages.append(seconds / edit_count)
+            _, compact_seconds = time_call(sj.compact, cp)
+            sj.close_journal(cp)
+            _, seconds = time_call(saved_edits)
+            averages.append(seconds / edit_count)
+        finally:
+            os.chdir(working_directory)
+    print(f"Durable edits to a period of {student_count} students:")
+    print(f"\tjournal record:     {averages[0] * 1000:7.2f} ms per edit")
+    print(f"\tsave changed files: {averages[1] * 1000:7.2f} ms per edit")
+    print(f"\tcompacting {edit_count} records: " +
+          f"{compact_seconds * 1000:.1f} ms")
+    return tuple(averages)
+
+
+def benchmark_school(period_count=16, students_per_period=150,
+                     lt_count=BENCHMARK_LT_COUNT):
+    '''
+    This function times loading a school of period_count synthetic class
+    periods (see school_module), first one period after another and then
+    in a pool of processes, and the time until the first period is ready
+    in each case.
+    It prints the results and returns a tuple of the two total times.
+    '''
+    classperiods = [synthetic_classperiod(f"Period {index + 1}",
+                                          students_per_period, lt_count,
+                                          BENCHMARK_SEED + index)
+                    for index in range(period_count)]
+    first_seconds = []
+    working_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            for cp in classperiods:
+                cpm.write_classperiod_to_datafile(cp)
+            index_files = scm.find_period_index_files(directory)
+            start = time.perf_counter()
+            for filename in index_files:
+                cpm.build_classperiod_from_datafile(filename)
+                if len(first_seconds) == 0:
+                    first_seconds.append(time.perf_counter() - start)
+            sequential_seconds = time.perf_counter() - start
+        finally:
+            os.chdir(working_directory)
+        start = time.perf_counter()
+        loads = []
+        for load in scm.iter_load_school(directory):
+            if len(loads) == 0:
+                first_seconds.append(time.perf_counter() - start)
+            loads.append(load)
+        pool_seconds = time.perf_counter() - start
+    assert all(load.succeeded for load in loads)
+    assert len(loads) == period_count
+    print(f"Loading a school of {period_count} periods of " +
+          f"{students_per_period} students ({os.cpu_count()} CPUs):")
+    print(f"\tone at a time:    {sequential_seconds * 1000:7.1f} ms " +
+          f"(first period after {first_seconds[0] * 1000:.1f} ms)")
+    print(f"\tprocess pool:     {pool_seconds * 1000:7.1f} ms " +
+          f"(first period after {first_seconds[1] * 1000:.1f} ms)")
+    return sequential_seconds, pool_seconds
+
+
+def benchmark_streaming(period_count=20, students_per_period=150,
+                        lt_count=BENCHMARK_LT_COUNT):
+    '''
+    This function exports the overall grades of period_count synthetic
+    class periods to a CSV file, first by loading every period and then
+    by streaming one student at a time (see cpm.iter_period_students()).
+    It prints the peak memory used by each and returns a tuple of the
+    two byte counts.
+    '''
+    working_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            for index in range(period_count):
+                cpm.write_classperiod_to_datafile(synthetic_classperiod(
+                        f"Period {index + 1}", students_per_period,
+                        lt_count, BENCHMARK_SEED + index))
+            index_files = scm.find_period_index_files(directory)
+
+            def export_loaded():
+                classperiods = [cpm.build_classperiod_from_datafile(filename)
+                                for filename in index_files]
+                return cpm.export_overall_grades_to_csv(
+                        ((cp, student) for cp in classperiods
+                         for student in cp.students_in_period), 'all.csv')
+
+            def export_streamed():
+                return cpm.export_overall_grades_to_csv(
+                        cpm.iter_period_students(index_files), 'streamed.csv')
+
+            _, loaded_bytes = measure_peak_memory(export_loaded)
+            _, streamed_bytes = measure_peak_memory(export_streamed)
+            with open('all.csv') as loaded, open('streamed.csv') as streamed:
+                assert loaded.read() == streamed.read()
+        finally:
+            os.chdir(working_directory)
+    print(f"Peak memory exporting grades for {period_count} periods of " +
+          f"{students_per_period} students:")
+    print(f"\tloading every period: {loaded_bytes / 2**20:6.2f} MiB")
+    print(f"\tstreaming students:   {streamed_bytes / 2**20:6.2f} MiB")
+    return loaded_bytes, streamed_bytes
+
+
+def benchmark_roster(student_count=150, lt_count=BENCHMARK_LT_COUNT,
+                     extra_attempts=30):
+    '''
+    This function times listing the students of a synthetic class period
+    of student_count students with long score histories (extra_attempts
+    more scores on every LT), by loading the whole period, by reading
+    its roster file, and by reading only the beginning of each student's
+    data file (see cpm.read_roster()).
+    It prints the results and returns a tuple of the three times.
+    '''
+    rng = random.Random(BENCHMARK_SEED)
+    cp = synthetic_classperiod("Roster Period", student_count, lt_count)
+    for student in cp.students_in_period:
+        for lt_label in list(student.scores):
+            stu.fix_grade_history(
+                    student, lt_label, [rng.choice(BENCHMARK_SCORES)
+                                        for _ in range(extra_attempts)] +
+                    list(student.scores[lt_label]))
+    working_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            cpm.write_classperiod_to_datafile(cp)
+            index_filename = cp.saved_index_filename
+            loaded, load_seconds = time_call(
+                    cpm.build_classperiod_from_datafile, index_filename)
+            roster, roster_seconds = time_call(cpm.read_roster,
+                                               index_filename)
+            os.remove(cpm.roster_filename(index_filename))
+            headers, header_seconds = time_call(cpm.read_roster,
+                                                index_filename)
+        finally:
+            os.chdir(working_directory)
+    assert [entry.sid for entry in roster] == \
+        [student.sid for student in loaded.students_in_period]
+    assert headers == roster
+    print(f"Listing {student_count} students with about " +
+          f"{extra_attempts + 2} scores per LT:")
+    print(f"\tloading the period:   {load_seconds * 1000:7.2f} ms")
+    print(f"\troster file:          {roster_seconds * 1000:7.2f} ms")
+    print(f"\tdata file headers:    {header_seconds * 1000:7.2f} ms")
+    return load_seconds, roster_seconds, header_seconds
+
+
+def benchmark_reports(period_count=4, students_per_period=150,
+                      lt_count=BENCHMARK_LT_COUNT):
+    '''
+    This function times writing grade reports for period_count synthetic
+    class periods, one report after another and in a pool of processes
+    (see cpm.generate_reports_in_parallel()).
+    It prints the results and returns a tuple of the two times.
+    '''
+    classperiods = [synthetic_classperiod(f"Period {index + 1}",
+                                          students_per_period, lt_count,
+                                          BENCHMARK_SEED + index)
+                    for index in range(period_count)]
+    working_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            _, sequential_seconds = time_call(
+                    lambda: all(cpm.generate_reports(cp)
+                                for cp in classperiods))
+            _, pool_seconds = time_call(cpm.generate_reports_in_parallel,
+                                        classperiods)
+        finally:
+            os.chdir(working_directory)
+    report_count = period_count * students_per_period
+    print(f"Writing {report_count} grade reports ({os.cpu_count()} CPUs):")
+    print(f"\tone at a time:  {sequential_seconds * 1000:7.1f} ms")
+    print(f"\tprocess pool:   {pool_seconds * 1000:7.1f} ms")
+    return sequential_seconds, pool_seconds
+
+
+def benchmark_advice_templates(student_count=1000,
+                               lt_count=BENCHMARK_LT_COUNT):
+    '''
+    This function times rendering each student's advice in a synthetic
+    class period with advice.render_advice(), which compiles the advice
+    template file once, against legacy_render_advice(), which reads the
+    file and replaces each variable for every student.
+    It prints the results and returns a tuple of the two times.
+    '''
+    cp = synthetic_classperiod("Advice", student_count, lt_count)
+    all_values = [advice.template_values(student, cp.course_lts)
+                  for student in cp.students_in_period]
+    section = 'advice_for_B_under_90'
+    advice.load_templates()
+    for render in [legacy_render_advice, advice.render_advice]:
+        assert render(section, all_values[0]) == \
+            advice.render_advice(section, all_values[0])
+    _, legacy_seconds = time_call(
+            lambda: [legacy_render_advice(section, values)
+                     for values in all_values])
+    _, compiled_seconds = time_call(
+            lambda: [advice.render_advice(section, values)
+                     for values in all_values])
+    print(f"Rendering advice for {student_count} students:")
+    print(f"\treread and replace:  {legacy_seconds * 1000:7.1f} ms")
+    print(f"\tcompiled templates:  {compiled_seconds * 1000:7.1f} ms")
+    return legacy_seconds, compiled_seconds
+
+
+def benchmark_report_scaling(student_count=50, lt_counts=(40, 400, 2000)):
+    '''
+    This function times Student.report() for student_count synthetic
+    students in gradebooks of each of the given numbers of LTs, with the
+    LTs in a plain list (so that no LearningTargetList index helps).
+    Since each report sorts the student's LTs into score buckets in a
+    single pass (see Student.score_buckets()), the time per LT should
+    stay about the same as the number of LTs grows.
+    It prints the results and returns a dictionary from LT count to the
+    time per report.
+    '''
+    times = {}
+    for lt_count in lt_counts:
+        students = synthetic_students(student_count, lt_count)
+        lts = list(synthetic_lts(lt_count))
+        _, seconds = time_call(lambda: [student.report(lts, 'piecewise', True)
+                                        for student in students])
+        times[lt_count] = seconds / student_count
+    print(f"Writing grade reports ({student_count} students):")
+    for lt_count, seconds in times.items():
+        print(f"\t{lt_count:5} LTs: {seconds * 1000:7.2f} ms per report, " +
+              f"{seconds * 1e6 / lt_count:5.1f} us per LT")
+    return times
+
+
+def benchmark_report_bundles(period_count=6, students_per_period=150,
+                             lt_count=BENCHMARK_LT_COUNT):
+    '''
+    This function times writing grade reports for period_count synthetic
+    class periods as one .txt file per student (see cpm.generate_reports())
+    against writing them all into a single zip or print bundle
+    (see rb.bundle_reports_from_stream()).
+    It prints the time, number of files and size of each, and returns a
+    dictionary from output mode to time.
+    '''
+    classperiods = [synthetic_classperiod(f"Period {index + 1}",
+                                          students_per_period, lt_count,
+                                          BENCHMARK_SEED + index)
+                    for index in range(period_count)]
+    period_students = lambda: ((cp, student) for cp in classperiods
+                               for student in cp.students_in_period)
+    writers = {
+        'one file per report': lambda: all(cpm.generate_reports(cp)
+                                           for cp in classperiods),
+        'zip bundle': lambda: rb.bundle_reports_from_stream(
+                period_students(), "reports.zip"),
+        'print bundle': lambda: rb.bundle_reports_from_stream(
+                period_students(), "reports.txt")}
+    times = {}
+    print(f"Writing {period_count * students_per_period} grade reports:")
+    for mode, write in writers.items():
+        working_directory = os.getcwd()
+        with tempfile.TemporaryDirectory() as directory:
+            os.chdir(directory)
+            try:
+                result, times[mode] = time_call(write)
+                assert result
+                filenames = [os.path.join(path, name) for path, _, names
+                             in os.walk('.') for name in names]
+                size = sum(os.path.getsize(name) for name in filenames)
+            finally:
+                os.chdir(working_directory)
+        print(f"\t{mode + ':':21}{times[mode] * 1000:7.1f} ms, " +
+              f"{len(filenames):4} files, {size / 2 ** 20:5.2f} MiB")
+    return times
+
+
+def benchmark_incremental_reports(period_count=6, students_per_period=150,
+                                  changed_count=5,
+                                  lt_count=BENCHMARK_LT_COUNT):
+    '''
+    This function writes grade reports for period_count synthetic class
+    periods, changes a score for changed_count students in each, and
+    times writing the reports again with cpm.generate_reports(), which
+    rewrites every report, and with rm.update_reports(), which rewrites
+    only the reports whose inputs changed.
+    It prints the results and returns a tuple of the two times.
+    '''
+    classperiods = [synthetic_classperiod(f"Period {index + 1}",
+                                          students_per_period, lt_count,
+                                          BENCHMARK_SEED + index)
+                    for index in range(period_count)]
+    working_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            for cp in classperiods:
+                assert rm.update_reports(cp) == (True, students_per_period)
+                for student in cp.students_in_period[:changed_count]:
+                    stu.update_grade(student, 'LT01', 4)
+            _, full_seconds = time_call(
+                    lambda: all(cpm.generate_reports(cp)
+                                for cp in classperiods))
+            results, incremental_seconds = time_call(
+                    lambda: [rm.update_reports(cp) for cp in classperiods])
+            assert results == [(True, changed_count)] * period_count
+        finally:
+            os.chdir(working_directory)
+    print(f"Refreshing {period_count * students_per_period} grade reports " +
+          f"after {period_count * changed_count} students changed:")
+    print(f"\trewrite every report:  {full_seconds * 1000:7.1f} ms")
+    print(f"\tchanged reports only:  {incremental_seconds * 1000:7.1f} ms")
+    return full_seconds, incremental_seconds
+
+
+def benchmark_gradebook_pages(page_count=200, student_count=35,
+                              assignment_count=40):
+    '''
+    This function times reading page_count synthetic saved Synergy
+    gradebook pages (see synthetic_gradebook_page()) into ClassPeriods
+    with sh.classperiod_from_gradebook_html().
+    It prints the results and returns the number of pages read per
+    minute.
+    '''
+    pages = [synthetic_gradebook_page(student_count, assignment_count,
+                                      BENCHMARK_SEED + index)
+             for index in range(page_count)]
+    classperiods, seconds = time_call(
+            lambda: [sh.classperiod_from_gradebook_html(page)
+                     for page in pages])
+    assert all(len(cp.students_in_period) == student_count and
+               len(cp.course_lts) == assignment_count // 2
+               for cp in classperiods)
+    size = sum(len(page.encode()) for page in pages)
+    pages_per_minute = page_count * 60 / seconds
+    print(f"Reading {page_count} saved gradebook pages " +
+          f"({student_count} students x {assignment_count} assignments, " +
+          f"{size / 2 ** 20:.1f} MiB):")
+    print(f"\t{seconds * 1000:7.1f} ms, " +
+          f"{seconds * 1000 / page_count:5.1f} ms per page, " +
+          f"{pages_per_minute:8.0f} pages per minute")
+    return pages_per_minute
+
+
+# Run benchmarks
+if __name__ == "__main__":
+    benchmark_memory()
+    benchmark_storage()
+    benchmark_incremental_save()
+    benchmark_load_modes()
+    benchmark_scores_parser()
+    benchmark_snapshots()
+    benchmark_journal()
+    benchmark_school()
+    benchmark_streaming()
+    benchmark_roster()
+    benchmark_reports()
+    benchmark_advice_templates()
+    benchmark_report_scaling()
+    benchmark_report_bundles()
+    benchmark_incremental_reports()
+    benchmark_gradebook_pages()
@@ -6,10 +6,12 @@ This module replaces simple_interface.py.
 
 # import modules
 import classperiod_module as cpm
+import report_manifest as rm
 import sbg_data_methods as dm
 import lt_module as ltm
 import student_module as stu
 import nitty_gritty_of_grading as ngog
+import snapshot_cache as sc
 import sys
 import synergy_to_sbg as synergy
 import user_prefs_module as upm
@@ -77,14 +79,34 @@ def get_float_from_input(prompt):
 
 
 
+def print_report_progress(done, total):
+    '''
+    This function shows how many of a period's reports have been written.
+    '''
+    print(f"\rWrote {done} of {total} reports.",
+          end="\n" if done == total else "", flush=True)
+
+
 def generate_reports_interface(cp):
     '''
     This function generates reports for all students in a period.
     It takes one argument, a ClassPeriod object.
+    Reports that have not changed since they were last generated are
+    not written again (see rm.update_reports()).
+    Large periods are reported on by a pool of processes
+    (see cpm.generate_reports_in_parallel()).
     It returns True on success, False otherwise.
     '''
     print("Generating report files.")
-    successful = cpm.generate_reports(cp)
+    if len(cp.students_in_period) > cpm.REPORT_CHUNK_SIZE:
+        max_workers = None  # One process per CPU
+    else:
+        max_workers = 1
+    successful, count = rm.update_reports(cp, max_workers,
+                                          print_report_progress)
+    unchanged = len(cp.students_in_period) - count
+    if unchanged > 0:
+        print(f"{unchanged} reports were unchanged and were not rewritten.")
     if successful:
         print("Reports generated successfully.")
     else:
@@ -140,12 +162,15 @@ def write_overall_grades_to_synergy(cp, driver):
         (i) a ClassPeriod object
         (ii) driver, a selenium WebDriver object
                 pointed at a Synergy gradebook page.
+    The grades are written in one batch and then read back, with a
+    warning for each student whose grade did not land
+    (see synergy.write_overall_scores()).
     '''
     grades = cp.get_list_of_overall_grades()
-    return synergy.fill_overall_scores(driver,
-                                       grades,
-                                       comments=[],
-                                       keyword=DEFAULT_OVERALL_KEYWORD)
+    return synergy.write_overall_scores(driver,
+                                        grades,
+                                        comments=[],
+                                        keyword=DEFAULT_OVERALL_KEYWORD)
 
 
 def save_and_exit(cp):
@@ -157,7 +182,9 @@ def save_and_exit(cp):
     cpm.write_classperiod_to_datafile()
     except that it also halts program execution after writing to the file.
     '''
-    cpm.write_classperiod_to_datafile(cp)
+    if cpm.write_classperiod_to_datafile(cp):
+        # The files now match cp, so the next launch can skip parsing
+        sc.write_snapshot(cp)
     sys.exit()
 
 
@@ -12,11 +12,28 @@ This module contains functions dealing with the ClassPeriod class
 import lt_module as ltm
 import student_module as stu
 import sbg_data_methods as dm
+import columnar_store as cs
+import csv
 import datetime
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
 from prettytable import PrettyTable
 from string import punctuation
 import os
 
+# Global variables
+# Ways of reading student data files; see student_list_from_datafile_list()
+LOAD_MODES = ('sequential', 'threads', 'lazy')
+# Roster file saved beside a class period's index file; see read_roster()
+ROSTER_EXTENSION = '.roster'
+# Number of students whose reports are sent to a worker process at once;
+# see generate_reports_in_parallel()
+REPORT_CHUNK_SIZE = 16
+# Number of groups of students waiting for or in each worker process;
+# see generate_reports_in_parallel()
+REPORT_JOBS_PER_WORKER = 2
+
 
 class ClassPeriod:
     '''
@@ -45,14 +62,63 @@ class ClassPeriod:
             test_mode: if True, online gradebook will lanuch in test mode
         '''
         self.description = description
+        # Both lists are indexed (by sid and by lt_label and gb_column)
         self.students_in_period = students_in_period
         self.course_lts = course_lts
         self.overall_function = overall_function
         self.d_is_valid = d_is_valid
+        # Optional ColumnarGradebook holding the students' scores;
+        # see use_columnar_store()
+        self.store = None
+        # What the ClassPeriod's files held when last read or written,
+        # so that write_classperiod_to_datafile() can skip unchanged files:
+        # the index file's name and contents, and the LT and roster files'
+        # contents. None if the ClassPeriod has not been read from or
+        # written to files (or, for the roster, if it had no roster file).
+        self.saved_index_filename = None
+        self.saved_index = None
+        self.saved_lts = None
+        self.saved_roster = None
+        # Optional ScoreJournal recording changes as they are made;
+        # see score_journal
+        self.journal = None
         # If ClassPeriod was generated from some data source,
         # remove any exempts
         self.remove_exempts()
 
+    @property
+    def students_in_period(self):
+        '''
+        The Student objects in the class period, as a stu.StudentList
+        '''
+        return self.__students_in_period
+
+    @students_in_period.setter
+    def students_in_period(self, list_of_students):
+        '''
+        Setter that copies any list of Students into a stu.StudentList
+        '''
+        if not isinstance(list_of_students, stu.StudentList):
+            list_of_students = stu.StudentList(list_of_students)
+        self.__students_in_period = list_of_students
+
+    @property
+    def course_lts(self):
+        '''
+        The LearningTarget objects in the course, as an
+        ltm.LearningTargetList
+        '''
+        return self.__course_lts
+
+    @course_lts.setter
+    def course_lts(self, list_of_lts):
+        '''
+        Setter that copies any list of LTs into an ltm.LearningTargetList
+        '''
+        if not isinstance(list_of_lts, ltm.LearningTargetList):
+            list_of_lts = ltm.LearningTargetList(list_of_lts)
+        self.__course_lts = list_of_lts
+
     def __repr__(self):
         '''
         This function returns a string representation of the class period.
@@ -89,20 +155,22 @@ class ClassPeriod:
         can be cast as a bool; that bool evaluates to True
         if the student is present and False if not.
         '''
-        for student in self.students_in_period:
-            if student.sid == search:
-                return student
-        return False
+        return self.students_in_period.find('sid', search)
 
     def has_lt_with_label(self, search):
         '''
         This method returns True if the ClassPeriod has an LT with a specified
         label, False otherwise.
         '''
-        for lt in self.course_lts:
-            if lt.lt_label == search:
-                return True
-        return False
+        return bool(ltm.lt_with_label(search, self.course_lts))
+
+    def find_lt_by_column(self, search):
+        '''
+        This method returns the LearningTarget in the ClassPeriod with
+        gb_column equal to search (an int), or False if there is not
+        exactly one such LT.
+        '''
+        return ltm.find_lt_by_column(search, self.course_lts)
 
     def remove_exempts(self, exempt_code=-1):
         '''
@@ -110,16 +178,51 @@ class ClassPeriod:
         If there is any LT for which the student's most recent score
         is -1 (code for exempt), that LT is removed from the student's
         score dict.
+        Students that have not been loaded yet (see stu.LazyStudent)
+        have their exempts removed when they are loaded.
         '''
         for student in self.students_in_period:
-            for lt in self.course_lts:
-                # Careful! The -1 in the next line refers to
-                # most recent score, not the value of exempt_code!
-                try:
-                    if student.scores[lt.lt_label][-1] == exempt_code:
-                        student.scores.pop(lt.lt_label)
-                except KeyError:
-                    pass
+            if isinstance(student, stu.LazyStudent) and not(student.loaded):
+                student.on_load = lambda loaded_student: \
+                    self.remove_exempts_from_student(loaded_student,
+                                                     exempt_code)
+            else:
+                self.remove_exempts_from_student(student, exempt_code)
+
+    def remove_exempts_from_student(self, student, exempt_code=-1):
+        '''
+        This method removes from one student's score dict any of the
+        ClassPeriod's LTs for which the student's most recent score is
+        exempt_code.
+        '''
+        most_recent_scores = student.scores.most_recent_scores()
+        if exempt_code not in most_recent_scores.values():
+            return
+        for lt in self.course_lts:
+            if most_recent_scores.get(lt.lt_label) == exempt_code:
+                stu.remove_lt(student, lt.lt_label)
+
+    def modified_students(self):
+        '''
+        This method returns a list of the students whose data or scores
+        have changed since they were last read from or written to a file.
+        '''
+        return [student for student in self.students_in_period
+                if student.modified]
+
+    def use_columnar_store(self):
+        '''
+        This method moves the scores of every student in the ClassPeriod
+        into a columnar_store.ColumnarGradebook, saved as self.store.
+        The students' scores are replaced by views of their rows in the
+        store, so Students work as before, while per-LT questions
+        (e.g. self.store.scores_on_lt('LT05')) read contiguous columns.
+        Students added to the ClassPeriod afterwards keep their own
+        scores. The method returns the store.
+        '''
+        self.store = cs.build_store_for_students(self.students_in_period,
+                                                 self.course_lts)
+        return self.store
 
     def get_list_of_overall_grades(self):
         '''
@@ -135,12 +238,33 @@ class ClassPeriod:
         return grades
 
 
-def student_list_from_datafile_list(list_of_datafiles):
+def student_list_from_datafile_list(list_of_datafiles,
+                                    load_mode='sequential',
+                                    max_workers=None):
     '''
     This function takes a list of strings specifying data files,
     one data file per student. It creates a Student object
     from each data file and returns a list of those Students.
+    The optional argument load_mode (one of LOAD_MODES) specifies how:
+        'sequential' reads the files one after another;
+        'threads' reads and parses the files concurrently in a pool of
+            max_workers threads (by default, one per CPU), which hides
+            file system latency (e.g. on network drives);
+        'lazy' reads no files, and instead returns a stu.LazyStudent
+            for each file that is loaded the first time it is used.
+    The Students are in the same order as the files in every mode.
     '''
+    assert load_mode in LOAD_MODES, f"Unknown load mode {load_mode}"
+    if load_mode == 'lazy':
+        return [stu.LazyStudent(filename,
+                                stu.sid_from_datafile_name(filename))
+                for filename in list_of_datafiles]
+    if load_mode == 'threads':
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(stu.make_student_from_datafile,
+                                     list_of_datafiles))
     student_list = []
     for filename in list_of_datafiles:
         next_student = stu.make_student_from_datafile(filename)
@@ -148,7 +272,8 @@ def student_list_from_datafile_list(list_of_datafiles):
     return student_list
 
 
-def build_classperiod_from_data(data_str):
+def build_classperiod_from_data(data_str, columnar=False,
+                                load_mode='sequential'):
     '''
     This function takes a data string that has been read in from
     a file and uses it to build a ClassPeriod.
@@ -156,30 +281,207 @@ def build_classperiod_from_data(data_str):
     The second line should be a filename for a file of learning targets,
     and every subsequent line should contain the filename of a file
     containing student data.
+    If columnar is True, the ClassPeriod's scores are kept in a
+    columnar store (see ClassPeriod.use_columnar_store()).
+    load_mode specifies how student data files are read
+    (see student_list_from_datafile_list()).
     '''
     lines = data_str.split("\n")
     description = lines[0]  # Get description
     list_of_student_files = lines[2:]  # Get list of student data files
     # Generate list of Students
-    student_list = student_list_from_datafile_list(list_of_student_files)
+    student_list = student_list_from_datafile_list(list_of_student_files,
+                                                   load_mode)
     # Get learning target data file
     lt_filename = lines[1]
     # Generate list of LearningTargets
     lt_list = ltm.build_lt_list_from_datafile(lt_filename)
     # Create and return the ClassPeriod
-    return ClassPeriod(description, student_list, lt_list)
+    cp = ClassPeriod(description, student_list, lt_list)
+    if columnar:
+        cp.use_columnar_store()
+    return cp
 
 
-def build_classperiod_from_datafile(filename):
+def build_classperiod_from_datafile(filename, columnar=False,
+                                    load_mode='sequential'):
     '''
     This function creates a class period from a specified data file.
     It assumes that the first line of the file is the ClassPeriod description.
     The second line should be a filename for a file of learning targets,
     and every subsequent line should contain the filename of a file
     containing student data.
+    If columnar is True, the ClassPeriod's scores are kept in a
+    columnar store (see ClassPeriod.use_columnar_store()).
+    load_mode specifies how student data files are read
+    (see student_list_from_datafile_list()).
     '''
     data_str = dm.fetch_data_from_file(filename)
-    return build_classperiod_from_data(data_str)
+    cp = build_classperiod_from_data(data_str, columnar, load_mode)
+    # Record what was read, so that unchanged files are not rewritten
+    cp.saved_index_filename = filename
+    cp.saved_index = data_str
+    cp.saved_lts = dm.lts_to_data_string(cp.course_lts)
+    cp.saved_roster = fetch_roster_data(filename)
+    return cp
+
+
+def roster_filename(index_filename):
+    '''
+    This function returns the name of the roster file saved beside a
+    class period's index file (e.g. "./Period_5/Period_5.roster" for
+    "./Period_5/Period_5.txt").
+    '''
+    return os.path.splitext(index_filename)[0] + ROSTER_EXTENSION
+
+
+def fetch_roster_data(index_filename):
+    '''
+    This function returns the contents of the roster file for a class
+    period's index file, or None if there is no roster file.
+    '''
+    filename = roster_filename(index_filename)
+    if not(os.path.isfile(filename)):
+        return None
+    roster_str = dm.fetch_data_from_file(filename)
+    if roster_str is False:
+        return None
+    return roster_str
+
+
+def roster_to_data_string(list_of_entries):
+    '''
+    This function takes a list of stu.RosterEntry objects and returns
+    the string that represents them in a roster file: one line per
+    student, holding the beginning of the student's data file
+    (see stu.RosterEntry.__repr__()) and the data file's name.
+    '''
+    return "\n".join(f"{entry!r}, file: {entry.filename}"
+                     for entry in list_of_entries)
+
+
+def roster_from_data(data_str):
+    '''
+    This function reverses roster_to_data_string(), returning a
+    stu.Roster. It returns False if any line is invalid.
+    '''
+    roster = stu.Roster()
+    for line in data_str.split("\n"):
+        header, separator, filename = line.rpartition(", file: ")
+        entry = stu.roster_entry_from_data(header, filename)
+        if not(separator) or not(entry):
+            return False
+        roster.append(entry)
+    return roster
+
+
+def read_roster(index_filename):
+    '''
+    This function returns a stu.Roster listing the students in a class
+    period (see build_classperiod_from_datafile()) without reading their
+    scores, in the order of the period's index file.
+    The roster file saved with the period (see roster_filename()) is used
+    if it lists the same data files as the index; otherwise the beginning
+    of each student's data file is read
+    (see stu.read_roster_entry_from_datafile()).
+    The function returns False on an error.
+    '''
+    data_str = dm.fetch_data_from_file(index_filename)
+    if not(data_str):
+        return False
+    student_filenames = data_str.split("\n")[2:]
+    roster_str = fetch_roster_data(index_filename)
+    if roster_str is not None:
+        roster = roster_from_data(roster_str)
+        if roster and [entry.filename for entry in roster] == \
+                student_filenames:
+            return roster
+    roster = stu.Roster()
+    for filename in student_filenames:
+        entry = stu.read_roster_entry_from_datafile(filename)
+        if not(entry):
+            return False
+        roster.append(entry)
+    return roster
+
+
+def iter_period_students(index_filenames, base_directory=None):
+    '''
+    This function is a generator that reads the class periods whose index
+    files are listed (see build_classperiod_from_datafile()) one student
+    at a time. For each student it yields a tuple of
+        (i) a ClassPeriod holding the period's description and LTs, but
+            no students (the same object for every student in a period),
+        (ii) the Student, with exempt LTs removed as in a ClassPeriod.
+    Only one student's data is held at a time, so any number of periods
+    can be processed (e.g. graded or exported) in bounded memory, as long
+    as each student is not kept once it has been used.
+    If base_directory is given, the index files and the data files named
+    in them are relative to it rather than to the working directory.
+    '''
+    def data_path(filename):
+        if base_directory is None:
+            return filename
+        return os.path.join(base_directory, filename)
+
+    for index_filename in index_filenames:
+        data_str = dm.fetch_data_from_file(data_path(index_filename))
+        assert data_str, f"Could not read class period {index_filename}"
+        lines = data_str.split("\n")
+        header = ClassPeriod(lines[0], [],
+                             ltm.build_lt_list_from_datafile(
+                                     data_path(lines[1])))
+        for student_filename in lines[2:]:
+            student = stu.make_student_from_datafile(
+                    data_path(student_filename))
+            header.remove_exempts_from_student(student)
+            yield header, student
+
+
+def iter_students_from_datafile(filename, base_directory=None):
+    '''
+    This function is a generator that reads a class period from a
+    specified data file (see build_classperiod_from_datafile()) one
+    student at a time, and yields each Student
+    (see iter_period_students()).
+    '''
+    for _, student in iter_period_students([filename], base_directory):
+        yield student
+
+
+def overall_grade_rows(period_students):
+    '''
+    This function is a generator that takes an iterable of
+    (ClassPeriod, Student) pairs (e.g. from iter_period_students())
+    and yields a row for each student: the period's description, the
+    student's ID, last name and first name, and their overall grade as
+    a percentage and as a letter.
+    '''
+    for cp, student in period_students:
+        yield (cp.description, student.sid, student.lastname,
+               student.firstname,
+               round(student.calculate_overall_grade(cp.overall_function)
+                     * 100),
+               student.letter_grade(cp.d_is_valid))
+
+
+def export_overall_grades_to_csv(period_students, filename):
+    '''
+    This function takes an iterable of (ClassPeriod, Student) pairs
+    (e.g. from iter_period_students()) and writes each student's overall
+    grade to a CSV file (see overall_grade_rows()), one row at a time.
+    It returns True on success, False on failure.
+    '''
+    try:
+        with open(filename, 'w', newline='') as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(['period', 'sid', 'lastname', 'firstname',
+                             'percent', 'letter'])
+            writer.writerows(overall_grade_rows(period_students))
+            return True
+    except IOError:
+        print(f"Could not open file {filename} for writing.")
+        return False
 
 
 def replace_punctuation_with_underscores(string_to_clean):
@@ -196,15 +498,24 @@ def replace_punctuation_with_underscores(string_to_clean):
     return string_to_clean
 
 
-def write_classperiod_to_datafile(classperiod):
+def write_classperiod_to_datafile(classperiod, only_modified=True):
     '''
     This function creates/overwrites a data file to hold data on a
     class period.
-    It takes a ClassPeriod object as its only argument.
+    It takes a ClassPeriod object as its first argument.
     The data is saved to a folder specified by the ClassPeriod
     description.
     For example, if the description is "Period 5",
     the files are saved in the directory "./Period_5/"
+    If only_modified is True (the default) and the ClassPeriod was last
+    read from or written to the same files, only the files whose contents
+    have changed are written: the data files of modified students, the
+    LT file if the LTs changed, the roster file (see read_roster()) if
+    any student's name or pronoun changed or students were added or
+    removed, and the index file if students were added or removed.
+    Files that the saved index does not name (e.g. if the period was
+    read from data files named differently) are always written.
+    Each file is replaced atomically.
     The function returns True on success, False on failure.
     '''
     # String to identify class period
@@ -213,74 +524,227 @@ def write_classperiod_to_datafile(classperiod):
     if not os.path.exists(stem):
         os.mkdir(stem)
     path_stem = os.path.join('.', stem, stem)
+    filename = path_stem + ".txt"
+    # Files saved elsewhere (or never saved) must all be written
+    if classperiod.saved_index_filename is None or \
+            os.path.normpath(classperiod.saved_index_filename) != \
+            os.path.normpath(filename):
+        only_modified = False
+    # Names of the files listed in the saved index
+    saved_filenames = set()
+    if only_modified and classperiod.saved_index is not None:
+        saved_filenames = set(os.path.normpath(line) for line in
+                              classperiod.saved_index.splitlines()[1:])
     # Create a list of strings to be written.
     # First line: description
     datafile_lines = [classperiod.description]
     # Write learning targets to a file
     lt_filename = path_stem + "_lts.ltdat"
-    lt_write_success = dm.write_lts_in_list_to_datafile(
-            classperiod.course_lts, lt_filename)
-    if not(lt_write_success):
-        print("Error in saving Learning Targets")
-        return False
+    lts_str = dm.lts_to_data_string(classperiod.course_lts)
+    if not(only_modified) or lts_str != classperiod.saved_lts or \
+            os.path.normpath(lt_filename) not in saved_filenames:
+        lt_write_success = dm.write_lts_in_list_to_datafile(
+                classperiod.course_lts, lt_filename)
+        if not(lt_write_success):
+            print("Error in saving Learning Targets")
+            return False
+        classperiod.saved_lts = lts_str
     # Save name of that LT file as second line
     datafile_lines.append(lt_filename)
     # Write student data to files
+    students_and_filenames = []
     for student in classperiod.students_in_period:
         student_filename = (path_stem + "_" +
                             str(student.sid) + ".studat")
-        student_write_success = dm.write_student_data_to_file(
-                student, student_filename)
-        if not(student_write_success):
-            print(f"Error in saving data for student with SID {student.sid}")
-            return False
+        students_and_filenames.append((student, student_filename))
+        if not(only_modified) or student.modified or \
+                os.path.normpath(student_filename) not in saved_filenames:
+            student_write_success = dm.write_student_data_to_file(
+                    student, student_filename)
+            if not(student_write_success):
+                print("Error in saving data for student with " +
+                      f"SID {student.sid}")
+                return False
+            student.mark_saved()
         # Save name of that student data file
         datafile_lines.append(student_filename)
+    # Write the roster (before the index, which it must match)
+    saved_entries = {}
+    if only_modified and classperiod.saved_roster is not None:
+        saved_entries = {entry.filename: entry for entry in
+                         roster_from_data(classperiod.saved_roster) or []}
+    roster_str = roster_to_data_string(
+            [stu.roster_entry(student, student_filename,
+                              saved_entries.get(student_filename))
+             for student, student_filename in students_and_filenames])
+    if not(only_modified) or roster_str != classperiod.saved_roster:
+        if not(dm.write_string_to_file_atomically(
+                roster_str, roster_filename(filename))):
+            return False
+        classperiod.saved_roster = roster_str
     string_to_write = "\n".join(datafile_lines)
-    # Attempt to open file in write mode; create if it doesn't exist yet
+    # Rewrite the index only if the roster changed
+    if only_modified and string_to_write == classperiod.saved_index:
+        return True
+    if not(dm.write_string_to_file_atomically(string_to_write, filename)):
+        return False
+    classperiod.saved_index_filename = filename
+    classperiod.saved_index = string_to_write
+    return True
+
+
+def report_filename(cp, student):
+    '''
+    This function takes a ClassPeriod and one of its Students, and
+    returns the name of the file for the student's grade report,
+    e.g. "2019-10-19_Period 5_sid3_Lastname_Firstname_grade_report.txt".
+    '''
+    date_str = str(datetime.datetime.now()).split(' ')[0]
+    return "_".join([date_str,
+                     cp.description,
+                     "sid" + str(student.sid),
+                     student.lastname,
+                     student.firstname,
+                     "grade_report.txt"])
+
+
+def write_report(cp, student):
+    '''
+    This function takes a ClassPeriod and one of its Students, and
+    writes the student's grade report to a .txt file in the ClassPeriod's
+    directory (which is created if it doesn't exist).
+    The function returns True on success, False on failure.
+    '''
+    directory = replace_punctuation_with_underscores(cp.description)
+    path = os.path.join('.', directory)
+    if not os.path.exists(path):
+        os.mkdir(path)
+    filename = report_filename(cp, student)
+    file_path = os.path.join(path, filename)
     try:
-        filename = path_stem + ".txt"
-        with open(filename, "w+") as data_file:
-            data_file.write(string_to_write)
-            return True
+        with open(file_path, "w+") as student_report_file:
+            student_report_file.write(student.report(cp.course_lts,
+                                                     cp.overall_function,
+                                                     cp.d_is_valid))
     except IOError:
-        print(f"Could not open file {filename}.")
+        print(f"Warning: could not write to file {filename}")
         return False
+    return True
 
 
-def generate_reports(cp):
+def generate_reports(cp, max_workers=1, progress=None):
     '''
     This function takes a ClassPeriod as an argument.
     It then writes grade reports for each Student in the ClassPeriod
     to .txt files.
+    If max_workers is not 1, the reports are written by a pool of
+    max_workers processes (None for one per CPU; see
+    generate_reports_in_parallel()).
+    progress is an optional function that is called as
+    progress(done, total) after each report, in the order of the students.
+    The function returns True on success, False on failure.
+    '''
+    if max_workers != 1:
+        return generate_reports_in_parallel([cp], max_workers, progress)
+    return generate_reports_from_stream(
+            ((cp, student) for student in cp.students_in_period),
+            progress, len(cp.students_in_period))
+
+
+def generate_reports_from_stream(period_students, progress=None,
+                                 total=None):
+    '''
+    This function takes an iterable of (ClassPeriod, Student) pairs
+    (e.g. from iter_period_students()) and writes a grade report for
+    each student (see write_report()), one student at a time.
+    progress is an optional function that is called as
+    progress(done, total) after each report, where total is the number
+    of reports expected (None if unknown).
     The function returns True on success, False on failure.
     '''
     success = True
-    # Make directory for classperiod if it doesn't exist
-    directory = replace_punctuation_with_underscores(cp.description)
-    path = os.path.join('.', directory)
-    if not os.path.exists(path):
-        os.mkdir(path)
-    for student in cp.students_in_period:
-        date_str = str(datetime.datetime.now()).split(' ')[0]
-        filename = "_".join([date_str,
-                             cp.description,
-                             "sid" + str(student.sid),
-                             student.lastname,
-                             student.firstname,
-                             "grade_report.txt"])
-        file_path = os.path.join('.',
-                                 replace_punctuation_with_underscores(
-                                         cp.description),
-                                 filename)
-        try:
-            with open(file_path, "w+") as student_report_file:
-                student_report_file.write(student.report(cp.course_lts,
-                                                         cp.overall_function,
-                                                         cp.d_is_valid))
-        except IOError:
-            print(f"Warning: could not write to file {filename}")
+    done = 0
+    for cp, student in period_students:
+        if not(write_report(cp, student)):
             success = False
+        done += 1
+        if progress is not None:
+            progress(done, total)
+    return success
+
+
+def write_reports_for_students(cp, list_of_students):
+    '''
+    This function writes the grade report of each of a list of Students
+    in a ClassPeriod (see write_report()). It is run in worker processes
+    by generate_reports_in_parallel().
+    It returns a list holding True for each report that was written
+    and False for each that was not.
+    '''
+    return [write_report(cp, student) for student in list_of_students]
+
+
+def report_jobs(classperiods, chunk_size=REPORT_CHUNK_SIZE):
+    '''
+    This function is a generator that divides the students of a list of
+    ClassPeriods into groups of up to chunk_size, and yields a tuple of
+        (i) a ClassPeriod holding a period's description, LTs and grading
+            settings, but no students (so that it is quick to send to
+            another process), and
+        (ii) a list of up to chunk_size of the period's Students.
+    Students that have not been loaded (see stu.LazyStudent) are loaded
+    one group at a time, as the group is yielded.
+    '''
+    for cp in classperiods:
+        header = ClassPeriod(cp.description, [], cp.course_lts,
+                             cp.overall_function, cp.d_is_valid)
+        students = iter(cp.students_in_period)
+        while True:
+            chunk = [student.load() if isinstance(student, stu.LazyStudent)
+                     else student for student in islice(students, chunk_size)]
+            if len(chunk) == 0:
+                break
+            yield header, chunk
+
+
+def generate_reports_in_parallel(classperiods, max_workers=None,
+                                 progress=None, chunk_size=REPORT_CHUNK_SIZE):
+    '''
+    This function writes grade reports for every Student in a list of
+    ClassPeriods (see write_report()), sharing the work among a pool of
+    max_workers processes (by default, one per CPU). Students are sent to
+    the workers in groups of chunk_size (see report_jobs()), so the
+    students of one period can be spread across every worker.
+    progress is an optional function that is called as
+    progress(done, total) after each report, in the order of the
+    students (so it may lag behind reports finished out of order).
+    Only REPORT_JOBS_PER_WORKER groups per worker are sent at a time, so
+    students that have not been loaded are loaded as they are needed.
+    The function returns True on success, False on failure.
+    '''
+    total = sum(len(cp.students_in_period) for cp in classperiods)
+    if total == 0:
+        return True
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    jobs = report_jobs(classperiods, chunk_size)
+    success = True
+    done = 0
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        pending = deque(pool.submit(write_reports_for_students, *job)
+                        for job in islice(jobs,
+                                          REPORT_JOBS_PER_WORKER *
+                                          max_workers))
+        while len(pending) > 0:
+            results = pending.popleft().result()
+            for job in islice(jobs, 1):
+                pending.append(pool.submit(write_reports_for_students,
+                                           *job))
+            for written in results:
+                success = success and written
+                done += 1
+                if progress is not None:
+                    progress(done, total)
     return success
 
 
@@ -304,11 +768,221 @@ if __name__ == "__main__":
     assert cp.find_student(1) == cp.students_in_period[0]  # Aerik == Aerik
     assert cp.find_student(9) == cp.students_in_period[8]  # Ivan == Ivan
     assert cp.find_student(42) is False  # No student with sid==42
+    new_student = stu.Student(42, "Adams", "Douglas")
+    cp.students_in_period.append(new_student)
+    assert cp.find_student(42) is new_student
+    cp.students_in_period.remove(new_student)
+    assert cp.find_student(42) is False
     print("Success!\n\n")
     # Test has_lt_with_label()
     print("Testing has_lt_with_label():")
     assert cp.has_lt_with_label('LT01')  # LT-01 should be present
     assert not(cp.has_lt_with_label('This LT should not exist'))
+    cp.course_lts.append(ltm.LearningTarget('LT99', gb_column=99))
+    assert cp.has_lt_with_label('LT99')
+    assert cp.find_lt_by_column(99).lt_label == 'LT99'
+    cp.course_lts.pop()
+    assert not(cp.has_lt_with_label('LT99'))
+    assert cp.find_lt_by_column(99) is False
+    print("Success!\n\n")
+    # Test use_columnar_store()
+    print("Testing use_columnar_store():")
+    columnar_cp = ClassPeriod("Period X Grades",
+                              dfut.sample_list_of_students(),
+                              dfut.sample_list_of_lts())
+    store = columnar_cp.use_columnar_store()
+    assert columnar_cp.store is store
+    assert columnar_cp.get_list_of_overall_grades() == \
+        cp.get_list_of_overall_grades()
+    assert repr(columnar_cp) == repr(cp)
+    assert store.scores_on_lt('LT05')[1] == 4  # Aerik
+    print("Success!\n\n")
+    # Test that write_classperiod_to_datafile() writes only what changed
+    print("Testing incremental write_classperiod_to_datafile():")
+    import tempfile
+    working_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            saved_cp = ClassPeriod("Period X Grades",
+                                   dfut.sample_list_of_students(),
+                                   dfut.sample_list_of_lts())
+            assert len(saved_cp.modified_students()) == 10
+            assert write_classperiod_to_datafile(saved_cp)
+            assert saved_cp.modified_students() == []
+            index_filename = saved_cp.saved_index_filename
+            reloaded_cp = build_classperiod_from_datafile(index_filename)
+            assert repr(reloaded_cp) == repr(saved_cp)
+            assert reloaded_cp.modified_students() == []
+
+            def modification_times():
+                return {name: os.stat(os.path.join('Period_X_Grades',
+                                                   name)).st_mtime_ns
+                        for name in os.listdir('Period_X_Grades')}
+            # Make sure any rewrite changes the modification time
+            os.utime(index_filename, ns=(0, 0))
+            for name in os.listdir('Period_X_Grades'):
+                os.utime(os.path.join('Period_X_Grades', name), ns=(0, 0))
+            before = modification_times()
+            stu.update_grade(reloaded_cp.find_student(2), 'LT01', 4)
+            assert reloaded_cp.modified_students() == \
+                [reloaded_cp.find_student(2)]
+            assert write_classperiod_to_datafile(reloaded_cp)
+            after = modification_times()
+            assert [name for name in before if before[name] != after[name]] \
+                == ['Period_X_Grades_2.studat']
+            # Adding a student rewrites the index but not the LTs
+            reloaded_cp.students_in_period.append(
+                    stu.Student(42, "Adams", "Douglas"))
+            assert write_classperiod_to_datafile(reloaded_cp)
+            changed = modification_times()
+            assert sorted(name for name in changed
+                          if changed[name] != after.get(name)) == \
+                ['Period_X_Grades.roster', 'Period_X_Grades.txt',
+                 'Period_X_Grades_42.studat']
+            assert not any(name.endswith('.tmp') for name in changed)
+            assert repr(build_classperiod_from_datafile(index_filename)) == \
+                repr(reloaded_cp)
+            # Data files named differently in the index are written under
+            # the new names, so the new index can be read
+            renamed_filename = os.path.join('.', 'Period_X_Grades',
+                                            'Period_X_Grades_bob.studat')
+            os.rename(os.path.join('.', 'Period_X_Grades',
+                                   'Period_X_Grades_2.studat'),
+                      renamed_filename)
+            for name in [index_filename, roster_filename(index_filename)]:
+                with open(name) as file:
+                    data = file.read()
+                with open(name, 'w') as file:
+                    file.write(data.replace('Period_X_Grades_2.studat',
+                                            'Period_X_Grades_bob.studat'))
+            renamed_cp = build_classperiod_from_datafile(index_filename)
+            stu.update_grade(renamed_cp.find_student(1), 'LT01', 3)
+            assert write_classperiod_to_datafile(renamed_cp)
+            assert repr(build_classperiod_from_datafile(index_filename)) == \
+                repr(renamed_cp)
+            os.remove(renamed_filename)
+            reloaded_cp = renamed_cp
+            print("Success!\n\n")
+            # Test the load modes of build_classperiod_from_datafile()
+            print("Testing load modes:")
+            threaded_cp = build_classperiod_from_datafile(index_filename,
+                                                          load_mode='threads')
+            assert repr(threaded_cp) == repr(reloaded_cp)
+            lazy_cp = build_classperiod_from_datafile(index_filename,
+                                                      load_mode='lazy')
+            lazy_students = lazy_cp.students_in_period
+            assert not any(student.loaded for student in lazy_students)
+            assert [student.sid for student in lazy_students] == \
+                [student.sid for student in reloaded_cp.students_in_period]
+            assert lazy_cp.find_student(2) is lazy_students[1]
+            assert lazy_cp.modified_students() == []
+            assert write_classperiod_to_datafile(lazy_cp)  # Nothing to write
+            assert not any(student.loaded for student in lazy_students)
+            assert lazy_students[1].lastname == "Livingston"
+            assert lazy_students[1].loaded and not(lazy_students[0].loaded)
+            stu.update_grade(lazy_students[1], 'LT01', 3)
+            assert lazy_cp.modified_students() == [lazy_students[1]]
+            assert write_classperiod_to_datafile(lazy_cp)
+            assert repr(lazy_cp) == repr(
+                    build_classperiod_from_datafile(index_filename))
+            assert lazy_cp.find_student(2).scores['LT01'][-1] == 3
+            print("Success!\n\n")
+            # Test the streaming functions
+            print("Testing read_roster():")
+            roster = read_roster(index_filename)
+            full_cp = build_classperiod_from_datafile(index_filename)
+            assert [entry.sid for entry in roster] == \
+                [student.sid for student in full_cp.students_in_period]
+            assert roster.find('sid', 2).name_str() == "Bob Livingston"
+            assert full_cp.saved_roster == roster_to_data_string(roster)
+            # Changing a lazily loaded student's pronoun rewrites the
+            # roster without loading the other students
+            lazy_cp = build_classperiod_from_datafile(index_filename,
+                                                      load_mode='lazy')
+            lazy_cp.find_student(2).pronoun = "they"
+            assert write_classperiod_to_datafile(lazy_cp)
+            assert [student.sid for student in lazy_cp.students_in_period
+                    if student.loaded] == [2]
+            roster = read_roster(index_filename)
+            assert roster.find('sid', 2).pronoun == "they"
+            # Without a roster file, the data files are read instead
+            os.remove(roster_filename(index_filename))
+            assert read_roster(index_filename) == roster
+            print("Success!\n\n")
+            print("Testing iter_period_students():")
+            full_cp = build_classperiod_from_datafile(index_filename)
+            count = len(full_cp.students_in_period)
+            streamed_students = list(iter_students_from_datafile(
+                    index_filename))
+            assert [str(student) for student in streamed_students] == \
+                [str(student) for student in full_cp.students_in_period]
+            assert 'LT01' not in streamed_students[9].scores  # Janet exempt
+            pairs = list(iter_period_students([index_filename] * 2))
+            assert len(pairs) == 2 * count
+            assert pairs[0][0] is pairs[count - 1][0]
+            assert pairs[0][0] is not pairs[count][0]
+            assert pairs[0][0].students_in_period == []
+            assert repr(pairs[0][0].course_lts) == repr(full_cp.course_lts)
+            # Read the files from another working directory
+            os.chdir(working_directory)
+            first_student = next(iter_students_from_datafile(index_filename,
+                                                             directory))
+            os.chdir(directory)
+            assert str(first_student) == str(streamed_students[0])
+            assert [row[4] for row in overall_grade_rows(
+                    iter_period_students([index_filename]))] == \
+                full_cp.get_list_of_overall_grades()
+            assert export_overall_grades_to_csv(
+                    iter_period_students([index_filename]), 'grades.csv')
+            with open('grades.csv') as csv_file:
+                lines = csv_file.read().splitlines()
+            assert lines[0] == 'period,sid,lastname,firstname,percent,letter'
+            assert lines[2].startswith('Period X Grades,2,Livingston,Bob,')
+            assert len(lines) == count + 1
+            assert generate_reports_from_stream(
+                    iter_period_students([index_filename]))
+            assert len([name for name in os.listdir('Period_X_Grades')
+                        if name.endswith('grade_report.txt')]) == count
+            print("Success!\n\n")
+            # Test generate_reports() in a process pool
+            print("Testing generate_reports_in_parallel():")
+            report_names = sorted(name for name in
+                                  os.listdir('Period_X_Grades')
+                                  if name.endswith('grade_report.txt'))
+
+            def read_reports():
+                reports = []
+                for name in report_names:
+                    with open(os.path.join('Period_X_Grades', name)) as file:
+                        reports.append(file.read())
+                return reports
+            sequential_reports = read_reports()
+            for name in report_names:
+                os.remove(os.path.join('Period_X_Grades', name))
+            progress_calls = []
+            assert generate_reports(full_cp, max_workers=2,
+                                    progress=lambda done, total:
+                                        progress_calls.append((done, total)))
+            assert progress_calls == [(done, count)
+                                      for done in range(1, count + 1)]
+            assert read_reports() == sequential_reports
+            assert [len(students) for _, students in
+                    report_jobs([full_cp, full_cp], chunk_size=4)] == \
+                [4, 4, count - 8, 4, 4, count - 8]
+            lazy_cp = build_classperiod_from_datafile(index_filename,
+                                                      load_mode='lazy')
+            jobs = report_jobs([lazy_cp], chunk_size=4)
+            next(jobs)  # Only the first group is loaded
+            assert [student.loaded for student in
+                    lazy_cp.students_in_period] == \
+                [True] * 4 + [False] * (count - 4)
+            assert generate_reports_in_parallel([lazy_cp], max_workers=1,
+                                                chunk_size=2)
+            assert read_reports() == sequential_reports
+            assert generate_reports_in_parallel([])
+        finally:
+            os.chdir(working_directory)
     print("Success!\n\n")
     # Test student_list_from_datafile_list
     print("Testing student_list_from_datafile_list():")
@@ -0,0 +1,408 @@
+# -*- coding: utf-8 -*-
+"""
+Description: columnar_store module.
+This module contains the ColumnarGradebook class, an optional backing
+store for the scores in a ClassPeriod. It holds one row per student and
+one column per learning target:
+    * each column keeps every student's most recent score on that LT
+      in one contiguous array, so questions such as "everyone's score on
+      LT05" or "everyone with a 1" read a single array;
+    * older scores are kept per column in ragged per-row arrays;
+    * each row keeps a count of its most recent scores, so grading a
+      student never has to look at the columns at all.
+Students keep working as before: their scores attribute is replaced by a
+StoreRow, a lightweight view of their row in the store.
+"""
+
+# import modules
+from array import array
+import csv
+import nitty_gritty_of_grading as ngog
+import scorebook_module as sbm
+
+# Global variables
+# Code stored in a recent-score column when a student has no score on the LT
+MISSING_CODE = -128
+COUNT_WIDTH = len(sbm.COUNTED_SCORES)
+
+
+class ColumnarGradebook:
+    '''
+    Class to hold the scores of a group of students column by column.
+    Specifically:
+        sids, a list of student ID numbers, one per row,
+        labels, a list of LT labels, one per column,
+        recent, a list (one per column) of arrays holding the code
+            (see scorebook_module.encode_score()) of each row's most
+            recent score, or MISSING_CODE,
+        older, a list (one per column) of lists (one per row) holding
+            an array of the codes of older scores, or None,
+        counts, an array holding COUNT_WIDTH counts of most recent
+            scores per row (see ScoreBook.counts),
+        changes, an array holding the number of changes made to each
+            row since it was added (see ScoreBook.changes).
+    '''
+    def __init__(self):
+        '''
+        Constructor method. Creates an empty store.
+        '''
+        self.sids = []
+        self.row_of_sid = {}
+        self.labels = []
+        self.column_of_label = {}
+        self.recent = []
+        self.older = []
+        self.counts = array('H')
+        self.changes = array('L')
+
+    def add_row(self, sid, scores_dict={}):
+        '''
+        This method adds a row for the student with the given ID,
+        filled from an optional dictionary (or ScoreMapping) of scores,
+        and returns the row index.
+        '''
+        row = len(self.sids)
+        self.sids.append(sid)
+        self.row_of_sid[sid] = row
+        for column in range(len(self.labels)):
+            self.recent[column].append(MISSING_CODE)
+            self.older[column].append(None)
+        self.counts.extend([0] * COUNT_WIDTH)
+        self.changes.append(0)
+        for lt_label, history in scores_dict.items():
+            self.set_history(row, lt_label, history)
+        self.changes[row] = 0  # Copying the scores does not count
+        return row
+
+    def add_column(self, lt_label):
+        '''
+        This method adds an empty column for the given LT label
+        (if there is not one already) and returns the column index.
+        '''
+        if lt_label in self.column_of_label:
+            return self.column_of_label[lt_label]
+        column = len(self.labels)
+        self.labels.append(lt_label)
+        self.column_of_label[lt_label] = column
+        self.recent.append(array('b', [MISSING_CODE]) * len(self.sids))
+        self.older.append([None] * len(self.sids))
+        return column
+
+    def __count_recent(self, row, code, change):
+        '''
+        This method adds change (1 or -1) to a row's count for a most
+        recent score code. Missing and exempt scores are not counted.
+        '''
+        if code != MISSING_CODE and code != sbm.EXEMPT_SCORE_CODE:
+            self.counts[row * COUNT_WIDTH + code] += change
+
+    def __column(self, row, lt_label):
+        '''
+        This method returns the column index for an LT on which the row
+        has a score. It raises a KeyError otherwise.
+        '''
+        column = self.column_of_label.get(lt_label)
+        if column is None or self.recent[column][row] == MISSING_CODE:
+            raise KeyError(lt_label)
+        return column
+
+    def has_score(self, row, lt_label):
+        '''
+        This method returns True if the row has a score on the LT.
+        '''
+        column = self.column_of_label.get(lt_label)
+        return column is not None and \
+            self.recent[column][row] != MISSING_CODE
+
+    def history_codes(self, row, lt_label):
+        '''
+        This method returns an array of the codes of a row's scores on
+        an LT, oldest first.
+        '''
+        column = self.__column(row, lt_label)
+        codes = array('b', self.older[column][row] or [])
+        codes.append(self.recent[column][row])
+        return codes
+
+    def set_history(self, row, lt_label, history):
+        '''
+        This method replaces (or adds) a row's scores on an LT.
+        An empty history removes the LT from the row.
+        '''
+        codes = array('b', [sbm.encode_score(score) for score in history])
+        column = self.add_column(lt_label)
+        self.changes[row] += 1
+        self.__count_recent(row, self.recent[column][row], -1)
+        if len(codes) == 0:
+            self.recent[column][row] = MISSING_CODE
+            self.older[column][row] = None
+            return
+        self.recent[column][row] = codes[-1]
+        self.older[column][row] = codes[:-1] if len(codes) > 1 else None
+        self.__count_recent(row, codes[-1], 1)
+
+    def append_score(self, row, lt_label, score):
+        '''
+        This method appends a new most recent score to a row's history
+        on an LT on which it already has a score.
+        '''
+        code = sbm.encode_score(score)
+        column = self.__column(row, lt_label)
+        previous = self.recent[column][row]
+        self.__count_recent(row, previous, -1)
+        if self.older[column][row] is None:
+            self.older[column][row] = array('b')
+        self.older[column][row].append(previous)
+        self.recent[column][row] = code
+        self.__count_recent(row, code, 1)
+        self.changes[row] += 1
+
+    def delete(self, row, lt_label):
+        '''
+        This method removes a row's scores on an LT.
+        '''
+        self.__column(row, lt_label)  # Raise KeyError if missing
+        self.set_history(row, lt_label, [])
+
+    def labels_in_row(self, row):
+        '''
+        This method returns a list of the LT labels on which a row has
+        scores, in column order.
+        '''
+        return [lt_label for column, lt_label in enumerate(self.labels)
+                if self.recent[column][row] != MISSING_CODE]
+
+    def recent_counts(self, row):
+        '''
+        This method returns a histogram of a row's most recent non-exempt
+        scores, in the form returned by ngog.score_histogram().
+        '''
+        start = row * COUNT_WIDTH
+        return {sbm.decode_score(code): count for code, count in
+                enumerate(self.counts[start:start + COUNT_WIDTH]) if count}
+
+    def scores_on_lt(self, lt_label):
+        '''
+        This method returns a dictionary of student ID -> most recent
+        score on the given LT, for every student with a score on it.
+        '''
+        column = self.column_of_label.get(lt_label)
+        if column is None:
+            return {}
+        return {self.sids[row]: sbm.decode_score(code)
+                for row, code in enumerate(self.recent[column])
+                if code != MISSING_CODE}
+
+    def sids_with_recent_score(self, score, lt_label=None):
+        '''
+        This method returns a list of the IDs of students whose most
+        recent score is the given score, on the given LT or
+        (if lt_label is None) on any LT.
+        '''
+        code = sbm.encode_score(score)
+        if lt_label is None:
+            columns = self.recent
+        elif lt_label in self.column_of_label:
+            columns = [self.recent[self.column_of_label[lt_label]]]
+        else:
+            columns = []
+        rows = set()
+        for recent in columns:
+            start = 0
+            while True:  # array.index() scans in C
+                try:
+                    row = recent.index(code, start)
+                except ValueError:
+                    break
+                rows.add(row)
+                start = row + 1
+        return [self.sids[row] for row in sorted(rows)]
+
+    def grades(self, d_is_valid=True):
+        '''
+        This method returns a list with one ngog.Grades tuple per row,
+        in row order, computed from the rows' counts of recent scores.
+        '''
+        return [ngog.grades_from_histogram(self.recent_counts(row),
+                                           d_is_valid)
+                for row in range(len(self.sids))]
+
+    def write_recent_scores_to_csv(self, filename):
+        '''
+        This method writes every student's most recent scores to a CSV
+        file with a header row ('sid' and one column per LT) and one row
+        per student. Missing scores are left blank.
+        It returns True on success, False on failure.
+        '''
+        columns = [[('' if code == MISSING_CODE else sbm.decode_score(code))
+                    for code in recent] for recent in self.recent]
+        try:
+            with open(filename, 'w', newline='') as csv_file:
+                writer = csv.writer(csv_file)
+                writer.writerow(['sid'] + self.labels)
+                writer.writerows(zip(self.sids, *columns))
+                return True
+        except IOError:
+            print(f"Could not open file {filename} for writing.")
+            return False
+
+
+class StoreRow(sbm.ScoreMapping):
+    '''
+    Class for a lightweight view of one student's row in a
+    ColumnarGradebook. It behaves like a ScoreBook, so it can be used
+    as a Student's scores.
+    '''
+    __slots__ = ('store', 'row')
+
+    def __init__(self, store, row):
+        '''
+        Constructor method
+        '''
+        self.store = store
+        self.row = row
+
+    @property
+    def changes(self):
+        '''
+        The number of changes made to this row (see ScoreBook.changes)
+        '''
+        return self.store.changes[self.row]
+
+    def history_codes(self, lt_label):
+        '''
+        This method returns an array of the score codes on an LT.
+        '''
+        return self.store.history_codes(self.row, lt_label)
+
+    def append_score(self, lt_label, score):
+        '''
+        This method appends a score to the history of an existing LT.
+        '''
+        self.store.append_score(self.row, lt_label, score)
+
+    def recent_counts(self):
+        '''
+        This method returns a histogram of the most recent non-exempt
+        scores, read from the store's counts.
+        '''
+        return self.store.recent_counts(self.row)
+
+    def __setitem__(self, lt_label, history):
+        '''
+        Method that replaces (or adds) the scores on an LT.
+        '''
+        assert len(history) > 0, "Cannot store an empty score history"
+        self.store.set_history(self.row, lt_label, history)
+
+    def __delitem__(self, lt_label):
+        '''
+        Method that removes an LT and its scores.
+        '''
+        self.store.delete(self.row, lt_label)
+
+    def __contains__(self, lt_label):
+        '''
+        Method that returns True if the student has scores on the LT.
+        '''
+        return self.store.has_score(self.row, lt_label)
+
+    def __iter__(self):
+        '''
+        Method that iterates over the LT labels on which the student
+        has scores, in column order.
+        '''
+        return iter(self.store.labels_in_row(self.row))
+
+    def __len__(self):
+        '''
+        Method that returns the number of LTs with scores.
+        '''
+        return len(self.store.labels_in_row(self.row))
+
+
+def build_store_for_students(list_of_students, list_of_lts=[]):
+    '''
+    This function takes a list of Student objects and (optionally)
+    a list of LearningTarget objects. It copies the students' scores
+    into a new ColumnarGradebook (with a column for each LT, in order,
+    plus any other LTs the students have scores on) and replaces each
+    student's scores with a StoreRow view of their row.
+    It returns the ColumnarGradebook.
+    '''
+    store = ColumnarGradebook()
+    for lt in list_of_lts:
+        store.add_column(lt.lt_label)
+    for student in list_of_students:
+        modified = student.modified
+        row = store.add_row(student.sid, student.scores)
+        student.scores = StoreRow(store, row)
+        # The scores have moved but not changed
+        if not(modified):
+            student.mark_saved()
+    return store
+
+
+# Unit tests
+if __name__ == "__main__":
+    import os
+    import tempfile
+    import data_for_unit_testing as dfut
+    students = dfut.sample_list_of_students()
+    lts = dfut.sample_list_of_lts()
+    original_scores = [str(student.scores) for student in students]
+    original_grades = [student.calculate_overall_grade('piecewise')
+                       for student in students]
+    # Test build_store_for_students()
+    print("Testing build_store_for_students():")
+    store = build_store_for_students(students, lts)
+    assert store.labels == [lt.lt_label for lt in lts]
+    assert store.sids == list(range(1, 11))
+    for index, student in enumerate(students):
+        assert type(student.scores) == StoreRow
+        assert str(student.scores) == original_scores[index]
+        assert student.calculate_overall_grade('piecewise') == \
+            original_grades[index]
+    print("Success!")
+    # Test StoreRow changes
+    print("Testing StoreRow:")
+    aerik = students[0]
+    assert aerik.scores['LT01'] == [1, 2, 4]
+    aerik.scores['LT01'].append(3)
+    assert aerik.scores['LT01'] == [1, 2, 4, 3]
+    assert aerik.recent_counts == {4: 4, 3: 6}
+    aerik.scores['LT11'] = [2]  # New column
+    assert store.labels[-1] == 'LT11'
+    assert aerik.scores.pop('LT11') == [2]
+    assert 'LT11' not in aerik.scores
+    assert students[1].scores.get('LT11') is None
+    assert aerik.recent_counts == {4: 4, 3: 6}
+    assert aerik.scores.changes == 3 and students[1].scores.changes == 0
+    print("Success!")
+    # Test column queries
+    print("Testing scores_on_lt() and sids_with_recent_score():")
+    assert store.scores_on_lt('LT01')[1] == 3
+    assert 9 not in store.scores_on_lt('LT01')  # Ivan has no scores
+    assert store.sids_with_recent_score(1, 'LT10') == [5]  # Egbert
+    assert store.sids_with_recent_score(1) == [5, 8]  # Egbert and Henry
+    assert store.sids_with_recent_score(1, 'Not an LT') == []
+    print("Success!")
+    # Test grades()
+    print("Testing grades():")
+    grades = store.grades()
+    # Aerik now has only four 4s, so has dropped to a B
+    assert [g.letter for g in grades] == ['B', 'B', 'A', 'B', 'C',
+                                          'C', 'D', 'F', 'F', 'A']
+    print("Success!")
+    # Test write_recent_scores_to_csv()
+    print("Testing write_recent_scores_to_csv():")
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'recent.csv')
+        assert store.write_recent_scores_to_csv(filename)
+        with open(filename) as csv_file:
+            lines = csv_file.read().splitlines()
+        assert lines[0] == 'sid,' + ','.join(store.labels)
+        assert lines[1] == '1,3,4,4,4,4,3,3,3,3,3,'
+        assert lines[9] == '9,,,,,,,,,,,'  # Ivan
+    print("Success!\n\n")
+    print("All tests were successful.")
@@ -85,6 +85,15 @@ def sample_list_of_students():
     return list_of_students
 
 
+def exit_process(*args):
+    '''
+    This function ends the process that calls it at once, without
+    cleaning up. Tests use it to stand in for a worker process that dies.
+    '''
+    import os
+    os._exit(1)
+
+
 # Make sure that all worked properly
 if __name__ == "__main__":
     print("Printing all LearningTarget objects in sample ClassPeriod:")
@@ -96,3 +105,4 @@ if __name__ == "__main__":
     print("Printing all Student objects in sample ClassPeriod:")
     for student in sample_list_of_students():
         print(student)
+
@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""
+Description: grade_tables module.
+This module precomputes grade lookup tables.
+
+A student's grades depend only on four numbers: how many LTs they have
+been assessed on, how many 4s they have, how many 3s or 3.5s they have,
+and whether they have any 0s or 1s. For a fixed number of LTs, every
+possible combination can be enumerated ahead of time, so that grading
+a student becomes a single index into a table.
+
+Tables are stored as compact arrays of unsigned shorts and can be
+saved to and read from disk.
+
+Once ngog.use_grade_tables() is called with a table directory, every
+grade NGOG calculates (see ngog.grades_from_histogram()) is looked up
+in these tables.
+"""
+
+# import modules
+from array import array
+import os
+import struct
+import sys
+import nitty_gritty_of_grading as ngog
+
+# Global variables
+DEFAULT_TABLE_DIRECTORY = 'grade_tables'
+TABLE_FILE_MAGIC = b'SBGT'
+TABLE_FILE_VERSION = 1
+# Header: magic, version, LT count
+TABLE_HEADER = struct.Struct('<4sHH')
+# Each table entry holds simple, piecewise and sticky grades (in
+# thousandths) and the grade code (as a character code).
+VALUES_PER_ENTRY = 4
+# Stored in place of a grade that fails a validity check in NGOG
+UNDEFINED_GRADE = 0xFFFF
+# Scores that a table can grade (every valid score except exempt)
+TABLE_SCORES = frozenset(ngog.DEFAULT_VALID_SCORES) - {ngog.DEFAULT_X_CODE}
+# Scores accepted by NGOG's simple grade (see ngog.GradeSummary)
+SIMPLE_GRADE_SCORES = frozenset([0, 1, 1.5, 2, 2.5, 3, 3.5, 4])
+
+# Tables that have already been loaded, keyed by (directory, LT count)
+loaded_tables = {}
+
+
+class GradeTable:
+    '''
+    Class to hold the precomputed grades for every possible set of
+    scores on a fixed number of learning targets (lt_count).
+    Entries are indexed by (count_of_4s, count_of_3s, has_0s_or_1s),
+    where count_of_3s counts 3s and 3.5s.
+    '''
+    def __init__(self, lt_count, values):
+        '''
+        Constructor method. Takes the LT count and an array('H') of
+        VALUES_PER_ENTRY values per entry, as built by build_grade_table().
+        '''
+        self.lt_count = lt_count
+        self.values = values
+        assert len(values) == table_entry_count(lt_count) * VALUES_PER_ENTRY
+
+    def __eq__(self, other):
+        '''
+        Method that checks whether two tables hold the same grades.
+        '''
+        if isinstance(other, GradeTable):
+            return (self.lt_count == other.lt_count and
+                    self.values == other.values)
+        return False
+
+    def index(self, count_of_4s, count_of_3s, has_0s_or_1s):
+        '''
+        This method returns the position in self.values of the first
+        value of the entry for the specified counts.
+        '''
+        side = self.lt_count + 1
+        return (((count_of_4s * side + count_of_3s) * 2 + bool(has_0s_or_1s))
+                * VALUES_PER_ENTRY)
+
+    def grades(self, histogram, d_is_valid=True):
+        '''
+        This method takes a histogram of a student's most recent scores
+        (as returned by ngog.score_histogram(), with only TABLE_SCORES)
+        whose counts add up to this table's lt_count, and a bool for
+        whether D is a valid grade.
+        It returns the same ngog.Grades tuple as
+        ngog.grades_from_histogram(), using a single table lookup.
+        '''
+        assert sum(histogram.values()) == self.lt_count
+        assert histogram.keys() <= TABLE_SCORES
+        count_of_4s = histogram.get(4, 0)
+        count_of_3s = histogram.get(3, 0) + histogram.get(3.5, 0)
+        has_0s_or_1s = 0 in histogram or 1 in histogram
+        start = self.index(count_of_4s, count_of_3s, has_0s_or_1s)
+        simple, piecewise, sticky, code = \
+            self.values[start:start + VALUES_PER_ENTRY]
+        grade_code = chr(code)
+        # simple_grade() (and everything built on it) rejects some scores
+        # that piecewise_grade() accepts; see ngog.GradeSummary.
+        if not(histogram.keys() <= SIMPLE_GRADE_SCORES):
+            simple = sticky = UNDEFINED_GRADE
+        if simple == UNDEFINED_GRADE:
+            letter = None
+        elif grade_code == 'D' and not(d_is_valid):
+            letter = 'F'
+        else:
+            letter = grade_code
+        return ngog.Grades(grade_code,
+                           decode_grade(simple),
+                           decode_grade(piecewise),
+                           decode_grade(sticky),
+                           letter)
+
+
+def table_entry_count(lt_count):
+    '''
+    This function returns the number of entries in a GradeTable
+    for the given number of LTs.
+    '''
+    return (lt_count + 1) * (lt_count + 1) * 2
+
+
+def encode_grade(grade):
+    '''
+    This function converts a grade between 0 and 1 (or None, for a
+    grade that could not be calculated) to an int for storage in a table.
+    '''
+    if grade is None:
+        return UNDEFINED_GRADE
+    return round(grade * 1000)
+
+
+def decode_grade(value):
+    '''
+    This function reverses encode_grade().
+    '''
+    if value == UNDEFINED_GRADE:
+        return None
+    return value / 1000
+
+
+def build_grade_table(lt_count):
+    '''
+    This function takes a number of learning targets and returns a
+    GradeTable holding the grades for every possible set of scores
+    on that many LTs. Entries for impossible combinations
+    (e.g. more 4s than LTs) are filled with UNDEFINED_GRADE.
+    '''
+    values = array('H', [UNDEFINED_GRADE]) * (table_entry_count(lt_count) *
+                                              VALUES_PER_ENTRY)
+    table = GradeTable(lt_count, values)
+    for count_of_4s in range(lt_count + 1):
+        for count_of_3s in range(lt_count + 1 - count_of_4s):
+            for has_0s_or_1s in [False, True]:
+                # LTs that are neither met nor 0s/1s are filled with 2s
+                count_of_2s = lt_count - count_of_4s - count_of_3s
+                if has_0s_or_1s:
+                    if count_of_2s == 0:
+                        continue  # No room for a 1
+                    count_of_2s -= 1
+                histogram = {4: count_of_4s, 3: count_of_3s,
+                             1: int(has_0s_or_1s), 2: count_of_2s}
+                histogram = {score: count
+                             for score, count in histogram.items() if count}
+                # Not ngog.grades_from_histogram(), which may read tables
+                grades = ngog.cached_grades(
+                        ngog.canonical_histogram(histogram), True)
+                start = table.index(count_of_4s, count_of_3s, has_0s_or_1s)
+                values[start:start + VALUES_PER_ENTRY] = array(
+                        'H', [encode_grade(grades.simple),
+                              encode_grade(grades.piecewise),
+                              encode_grade(grades.sticky),
+                              ord(grades.grade_code)])
+    return table
+
+
+def write_grade_table_to_file(table, filename):
+    '''
+    This function writes a GradeTable to a binary file.
+    It returns True on success, False on failure.
+    '''
+    values = array('H', table.values)
+    if sys.byteorder == 'big':  # Files are always little-endian
+        values.byteswap()
+    try:
+        with open(filename, 'wb') as table_file:
+            table_file.write(TABLE_HEADER.pack(TABLE_FILE_MAGIC,
+                                               TABLE_FILE_VERSION,
+                                               table.lt_count))
+            values.tofile(table_file)
+            return True
+    except IOError:
+        print(f"Could not open file {filename} for writing.")
+        return False
+
+
+def read_grade_table_from_file(filename):
+    '''
+    This function reads a GradeTable written by write_grade_table_to_file().
+    It returns False if the file cannot be read or is not a valid table.
+    '''
+    try:
+        with open(filename, 'rb') as table_file:
+            header = table_file.read(TABLE_HEADER.size)
+            magic, version, lt_count = TABLE_HEADER.unpack(header)
+            if magic != TABLE_FILE_MAGIC or version != TABLE_FILE_VERSION:
+                print(f"Warning: {filename} is not a grade table.")
+                return False
+            values = array('H')
+            values.fromfile(table_file,
+                            table_entry_count(lt_count) * VALUES_PER_ENTRY)
+    except (IOError, EOFError, struct.error):
+        print(f"Warning: could not read grade table {filename}")
+        return False
+    if sys.byteorder == 'big':
+        values.byteswap()
+    return GradeTable(lt_count, values)
+
+
+def grade_table_filename(lt_count, directory=DEFAULT_TABLE_DIRECTORY):
+    '''
+    This function returns the file name used to store the table
+    for the given number of LTs.
+    '''
+    return os.path.join(directory, f"grade_table_{lt_count}.sbgt")
+
+
+def get_grade_table(lt_count, directory=DEFAULT_TABLE_DIRECTORY):
+    '''
+    This function returns the GradeTable for the given number of LTs.
+    The table is read from the directory if it has been saved there;
+    otherwise it is built and saved. Tables are kept in memory once loaded.
+    '''
+    if (directory, lt_count) in loaded_tables:
+        return loaded_tables[(directory, lt_count)]
+    filename = grade_table_filename(lt_count, directory)
+    table = False
+    if os.path.isfile(filename):
+        table = read_grade_table_from_file(filename)
+    if not(table):
+        table = build_grade_table(lt_count)
+        if not os.path.exists(directory):
+            os.mkdir(directory)
+        write_grade_table_to_file(table, filename)
+    loaded_tables[(directory, lt_count)] = table
+    return table
+
+
+def grades_from_table(histogram, d_is_valid=True,
+                      directory=DEFAULT_TABLE_DIRECTORY):
+    '''
+    This function takes a histogram of a student's most recent scores
+    (e.g. Student.recent_counts) and a bool for whether D is a valid grade.
+    It returns the student's ngog.Grades, looked up in the precomputed
+    table for their number of LTs. Histograms that a table cannot hold
+    (those with exempt or invalid scores) are graded by
+    ngog.cached_grades() instead.
+    '''
+    if not(histogram.keys() <= TABLE_SCORES):
+        return ngog.cached_grades(ngog.canonical_histogram(histogram),
+                                  bool(d_is_valid))
+    table = get_grade_table(sum(histogram.values()), directory)
+    return table.grades(histogram, d_is_valid)
+
+
+# Unit tests
+if __name__ == "__main__":
+    import itertools
+    import tempfile
+    # Test build_grade_table() against NGOG for every histogram
+    # of up to 8 LTs
+    print("Testing build_grade_table() and GradeTable.grades():")
+    scores = [0, 0.5, 1, 1.5, 2, 2.5, 3, 3.5, 4]
+    for lt_count in range(9):
+        table = build_grade_table(lt_count)
+        for combo in itertools.combinations_with_replacement(scores,
+                                                             lt_count):
+            histogram = ngog.score_histogram(combo)
+            for d_is_valid in [True, False]:
+                assert table.grades(histogram, d_is_valid) == \
+                    ngog.grades_from_histogram(histogram, d_is_valid)
+    print("Success!")
+    # Test write_grade_table_to_file() and read_grade_table_from_file()
+    print("Testing write_grade_table_to_file() and " +
+          "read_grade_table_from_file():")
+    with tempfile.TemporaryDirectory() as directory:
+        table = build_grade_table(30)
+        filename = grade_table_filename(30, directory)
+        assert write_grade_table_to_file(table, filename)
+        assert read_grade_table_from_file(filename) == table
+        print(f"Table for 30 LTs: {os.path.getsize(filename)} bytes")
+        # Test get_grade_table() and grades_from_table()
+        print("Testing get_grade_table():")
+        assert get_grade_table(30, directory) is get_grade_table(30,
+                                                                 directory)
+        other_directory = os.path.join(directory, 'other')
+        assert get_grade_table(30, other_directory) is not \
+            get_grade_table(30, directory)
+        assert os.path.isfile(grade_table_filename(30, other_directory))
+        assert grades_from_table({4: 20, 3: 10}, True, directory) == \
+            ngog.grades_from_histogram({4: 20, 3: 10})
+        for histogram in [{4: 2, -1: 1}, {5: 1}]:  # Not held in tables
+            assert grades_from_table(histogram, True, directory) == \
+                ngog.grades_from_histogram(histogram)
+        assert os.path.isfile(grade_table_filename(12, directory)) is False
+        get_grade_table(12, directory)
+        assert os.path.isfile(grade_table_filename(12, directory))
+        print("Success!")
+        # Test ngog.use_grade_tables()
+        print("Testing ngog.use_grade_tables():")
+        ngog.use_grade_tables(directory)
+        try:
+            table = get_grade_table(10, directory)
+            ngog.clear_grade_cache()
+            assert ngog.grades_from_histogram({4: 5, 3: 4, 2: 1}) == \
+                table.grades({4: 5, 3: 4, 2: 1})
+            assert ngog.grade_cache_info().misses == 0
+            assert ngog.grades_from_histogram({4: 1, -1: 1}).simple is None
+        finally:
+            ngog.use_grade_tables(None)
+    print("Success!\n\n")
+    print("All tests were successful.")
@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+"""
+Description: indexed_list module.
+This module contains the IndexedList class, a list that keeps
+dictionaries from the values of some attributes of its items
+(e.g. a Student's sid or a LearningTarget's lt_label) to the items,
+so that items can be found without scanning the whole list.
+"""
+
+
+class IndexedList(list):
+    '''
+    Class for a list of objects that can be looked up by attribute.
+    Subclasses set indexed_attributes to a tuple of attribute names.
+    For each of those attributes, self.indexes holds a dictionary from
+    each value of the attribute to a list of the items that have that
+    value, in list order.
+    The indexes are kept up to date by every method that changes the
+    list. If an attribute of an item in the list is changed, reindex()
+    must be called.
+    '''
+    indexed_attributes = ()
+
+    def __init__(self, items=()):
+        '''
+        Constructor method. Takes an optional iterable of items.
+        '''
+        super().__init__(items)
+        self.reindex()
+
+    def reindex(self):
+        '''
+        This method rebuilds all of the indexes from the list.
+        '''
+        self.indexes = {attribute: {} for attribute in self.indexed_attributes}
+        self.__index_items(self)
+
+    def __index_items(self, items):
+        '''
+        This method adds items that were added to the end of the list
+        to the indexes.
+        '''
+        for item in items:
+            for attribute, index in self.indexes.items():
+                index.setdefault(getattr(item, attribute), []).append(item)
+
+    def find_all(self, attribute, value):
+        '''
+        This method returns a list of the items whose attribute
+        is equal to value (an empty list if there are none).
+        '''
+        return list(self.indexes[attribute].get(value, []))
+
+    def find(self, attribute, value):
+        '''
+        This method returns the first item whose attribute is equal to
+        value, or False if there is none.
+        '''
+        matches = self.indexes[attribute].get(value)
+        if matches:
+            return matches[0]
+        return False
+
+    def __reduce__(self):
+        '''
+        Method used by pickle (e.g. to send a list to another process).
+        The indexes are rebuilt from the items rather than copied.
+        '''
+        return (type(self), (list(self),))
+
+    # Adding to the end of the list updates the indexes in place
+    def append(self, item):
+        super().append(item)
+        self.__index_items([item])
+
+    def extend(self, items):
+        items = list(items)
+        super().extend(items)
+        self.__index_items(items)
+
+    def __iadd__(self, items):
+        self.extend(items)
+        return self
+
+    # Any other change may reorder items, so the indexes are rebuilt
+    def insert(self, position, item):
+        super().insert(position, item)
+        self.reindex()
+
+    def remove(self, item):
+        super().remove(item)
+        self.reindex()
+
+    def pop(self, position=-1):
+        item = super().pop(position)
+        self.reindex()
+        return item
+
+    def clear(self):
+        super().clear()
+        self.reindex()
+
+    def sort(self, *args, **kwargs):
+        super().sort(*args, **kwargs)
+        self.reindex()
+
+    def reverse(self):
+        super().reverse()
+        self.reindex()
+
+    def __setitem__(self, position, value):
+        super().__setitem__(position, value)
+        self.reindex()
+
+    def __delitem__(self, position):
+        super().__delitem__(position)
+        self.reindex()
+
+    def __imul__(self, count):
+        super().__imul__(count)
+        self.reindex()
+        return self
+
+
+# Unit tests
+if __name__ == "__main__":
+    from collections import namedtuple
+    Item = namedtuple('Item', ['key', 'group'])
+
+    class ItemList(IndexedList):
+        indexed_attributes = ('key', 'group')
+
+    a, b, c, d = Item(1, 'x'), Item(2, 'y'), Item(3, 'x'), Item(4, 'z')
+    # Test find() and find_all()
+    print("Testing find() and find_all():")
+    items = ItemList([a, b, c])
+    assert items == [a, b, c]
+    assert items.find('key', 2) == b
+    assert items.find('key', 42) is False
+    assert items.find_all('group', 'x') == [a, c]
+    assert items.find_all('group', 'q') == []
+    print("Success!")
+    # Test that the indexes follow changes to the list
+    print("Testing changes to the list:")
+    items.append(d)
+    assert items.find('group', 'z') == d
+    items.remove(a)
+    assert items.find('key', 1) is False
+    assert items.find('group', 'x') == c
+    items.insert(0, a)
+    assert items.find_all('group', 'x') == [a, c]
+    items += [Item(5, 'x')]
+    assert items.find('key', 5).group == 'x'
+    del items[1:3]
+    assert items.find('key', 2) is False and items.find('key', 3) is False
+    items[0] = b
+    assert items.find('key', 1) is False and items.find('key', 2) == b
+    assert items.pop() == Item(5, 'x') and items.find('key', 5) is False
+    items.sort(key=lambda item: -item.key)
+    assert items == [d, b] and items.find_all('group', 'y') == [b]
+    items.clear()
+    assert items.find('key', 4) is False
+    print("Success!")
+    # Test pickling
+    print("Testing pickling:")
+    import pickle
+    items = ItemList([a, b, c])
+    unpickled_items = pickle.loads(pickle.dumps(items))
+    assert type(unpickled_items) == ItemList and unpickled_items == items
+    assert unpickled_items.find_all('group', 'x') == [a, c]
+    print("Success!\n\n")
+    print("All tests were successful.")
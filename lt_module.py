@@ -10,6 +10,7 @@ This module contains functions dealing with the LearningTarget class
 
 # import modules
 import sbg_data_methods as dm
+from indexed_list import IndexedList
 
 
 class LearningTarget:
@@ -28,6 +29,8 @@ class LearningTarget:
             to the nonsensical -1.
 
     '''
+    __slots__ = ('lt_label', 'brief', 'description', 'gb_column')
+
     def __init__(self, lt_label,
                  brief="(no description)",
                  description="(no description)",
@@ -92,6 +95,16 @@ class LearningTarget:
         return not (':::' in self.lt_label + self.brief + self.description)
 
 
+class LearningTargetList(IndexedList):
+    '''
+    Class for a list of LearningTarget objects that keeps indexes
+    by lt_label and by gb_column (see indexed_list.IndexedList),
+    so that lt_with_label() and find_lt_by_column() do not need to
+    scan the list.
+    '''
+    indexed_attributes = ('lt_label', 'gb_column')
+
+
 def lt_with_label(search, list_of_lts):
     '''
     This function takes two arguments:
@@ -100,13 +113,34 @@ def lt_with_label(search, list_of_lts):
     It returns a LearningTarget object from the list whose label is equal to
     the string. If no corresponding LearningTarget is found,
     the function returns false.
+    If the list is a LearningTargetList, its index is used.
     '''
+    if isinstance(list_of_lts, LearningTargetList):
+        return list_of_lts.find('lt_label', search)
     for lt in list_of_lts:
         if lt.lt_label == search:
             return lt
     return False
 
 
+def lt_label_lookup(list_of_lts):
+    '''
+    This function takes a list of LearningTarget objects and returns a
+    function that takes an LT label and returns the LearningTarget in the
+    list with that label, or False if there is none (as lt_with_label()
+    does).
+    The labels of a plain list are indexed once, so that looking up many
+    labels takes one pass over the list instead of one pass per label.
+    If the list is a LearningTargetList, its index is used.
+    '''
+    if isinstance(list_of_lts, LearningTargetList):
+        return lambda search: list_of_lts.find('lt_label', search)
+    lts_by_label = {}
+    for lt in list_of_lts:
+        lts_by_label.setdefault(lt.lt_label, lt)  # Keep the first match
+    return lambda search: lts_by_label.get(search, False)
+
+
 def build_lt_list_from_data(data_str):
     '''
     This function takes a string argument that has been read from a data file.
@@ -136,7 +170,7 @@ def build_lt_list_from_data(data_str):
         if part_count >= 3:
             new_lt.description = parts[2]
         lt_list.append(new_lt)
-    return lt_list
+    return LearningTargetList(lt_list)
 
 
 def build_lt_list_from_datafile(filename):
@@ -174,7 +208,15 @@ def find_lt_by_column(search, list_of_lts):
     with gb_column equal to search (an int).
     If no LTs or multiple LTs are found with that value,
     the function returns False.
+    If the list is a LearningTargetList, its index is used.
     '''
+    if isinstance(list_of_lts, LearningTargetList):
+        matches = list_of_lts.find_all('gb_column', search)
+        if len(matches) > 1:
+            print("Warning: " +
+                  f"multiple LTs found with gb_column == {search}")
+            return False
+        return matches[0] if matches else False
     match_count = 0
     for lt in list_of_lts:
         if lt.gb_column == search:
@@ -251,11 +293,28 @@ if __name__ == "__main__":
     assert lt_with_label('LT01', list_of_all_lts) == list_of_all_lts[0]
     assert lt_with_label('LT02', list_of_all_lts) != list_of_all_lts[0]
     assert lt_with_label('Invalid Label', list_of_all_lts) is False
+    indexed_lts = LearningTargetList(list_of_all_lts)
+    assert lt_with_label('LT02', indexed_lts) is list_of_all_lts[1]
+    assert lt_with_label('Invalid Label', indexed_lts) is False
+    print("Success!")
+    # Test find_lt_by_column
+    print("Testing find_lt_by_column():")
+    columned_lts = [LearningTarget('A', gb_column=3),
+                    LearningTarget('B', gb_column=5),
+                    LearningTarget('C', gb_column=5)]
+    for lts in [columned_lts, LearningTargetList(columned_lts)]:
+        assert find_lt_by_column(3, lts) is columned_lts[0]
+        assert find_lt_by_column(4, lts) is False
+        assert find_lt_by_column(5, lts) is False  # Two LTs in column 5
+    indexed_lts = LearningTargetList(columned_lts)
+    indexed_lts.remove(columned_lts[2])
+    assert find_lt_by_column(5, indexed_lts) is columned_lts[1]
     print("Success!")
     # Test build_lt_list_from_data
     print("Testing build_lt_list_from_data():")
     # Check case where all data is provided
     alpha_lts = build_lt_list_from_data("A:::B:::C\nD:::E:::F")
+    assert isinstance(alpha_lts, LearningTargetList)
     assert len(alpha_lts) == 2
     assert alpha_lts[0] == LearningTarget('A', 'B', 'C')
     assert alpha_lts[1] == LearningTarget('D', 'E', 'F')
@@ -276,6 +335,14 @@ if __name__ == "__main__":
     alpha_lts_2 = build_lt_list_from_datafile("alpha_lts.ltdat")
     assert alpha_lts == alpha_lts_2
     print("Success!")
+    # Test lt_label_lookup()
+    print("Testing lt_label_lookup():")
+    for lts in [list_of_all_lts, LearningTargetList(list_of_all_lts)]:
+        lookup = lt_label_lookup(lts)
+        assert lookup('LT03') is lt_with_label('LT03', lts)
+        assert lookup('LT03').lt_label == 'LT03'
+        assert lookup('No such LT') is False
+    print("Success!")
     # Test def rows_of_lt_briefs()
     print("Testing def rows_of_lt_briefs():")
     lt_abc = alpha_lts[0]  # LT containing 'A', 'B', 'C'
@@ -9,9 +9,23 @@ This file is a module of functions for calculating grades
 according to a standards-based system
 """
 
+# import modules
+from collections import namedtuple
+from functools import lru_cache
+
 # Global variables
 DEFAULT_X_CODE = -1
 DEFAULT_VALID_SCORES = [-1, 0, 0.5, 1, 1.5, 2, 2.5, 3, 3.5, 4]
+# Percentages returned by simple_grade() for each letter
+SIMPLE_GRADES = {'A': .95, 'B': .85, 'C': .75, 'D': .65, 'F': .50}
+# Maximum number of distinct score histograms held in the grade cache
+GRADE_CACHE_SIZE = 4096
+# Every grade that can be read off one histogram; see cached_grades()
+Grades = namedtuple('Grades',
+                    ['grade_code', 'simple', 'piecewise', 'sticky', 'letter'])
+# Directory of precomputed grade tables, or None to calculate every grade
+# (see use_grade_tables())
+grade_table_directory = None
 
 def list_of_most_recent_scores(dict_of_all_scores, exempt_code=DEFAULT_X_CODE):
     '''
@@ -137,7 +151,15 @@ def curved_pct_of_lts_met(list_of_scores):
 
     Note that 50% is the lowest F assigned by this function.
     '''
-    pct = pct_of_lts_met(list_of_scores)
+    return curve_pct(pct_of_lts_met(list_of_scores))
+
+
+def curve_pct(pct):
+    '''
+    This function applies the piecewise curve described in
+    curved_pct_of_lts_met() to a percentage of learning targets met
+    (a float between 0 and 1) and returns the curved percentage.
+    '''
     if pct >= 0.8:
         curved = pct
     elif pct >= 0.5:
@@ -155,9 +177,8 @@ def has_A_from_LTs(list_of_scores):
         (ii) is exceeding standard (4) on at least 50% of the learning targets
         (iii) has no 0s or 1s
     '''
-    return (pct_of_lts_met(list_of_scores) >= 0.9 and
-            count_of(4, list_of_scores) >= (lt_count(list_of_scores) / 2) and
-            free_of_zeroes_and_ones(list_of_scores))
+    return grades_from_histogram(
+            score_histogram(list_of_scores)).grade_code == 'A'
 
 
 def has_B_from_LTs(list_of_scores):
@@ -167,9 +188,8 @@ def has_B_from_LTs(list_of_scores):
         (i) is meeting standard on 80% of the learning targets
         (ii) has no 0s or 1s
     '''
-    return (not(has_A_from_LTs(list_of_scores)) and
-            pct_of_lts_met(list_of_scores) >= 0.8 and
-            free_of_zeroes_and_ones(list_of_scores))
+    return grades_from_histogram(
+            score_histogram(list_of_scores)).grade_code == 'B'
 
 
 def has_C_from_LTs(list_of_scores):
@@ -177,9 +197,8 @@ def has_C_from_LTs(list_of_scores):
     This function returns True if a student does not qualify for an A
     or a B, and is meeting standard on at least 65% of the learning targets.
     '''
-    return (not(has_A_from_LTs(list_of_scores)) and
-            not(has_B_from_LTs(list_of_scores)) and
-            pct_of_lts_met(list_of_scores) >= 0.65)
+    return grades_from_histogram(
+            score_histogram(list_of_scores)).grade_code == 'C'
 
 
 def has_D_from_LTs(list_of_scores):
@@ -188,10 +207,8 @@ def has_D_from_LTs(list_of_scores):
     an A, B, or C, and is meeting standard on at least 50% of the learning
     targets.
     '''
-    return (not(has_A_from_LTs(list_of_scores)) and
-            not(has_B_from_LTs(list_of_scores)) and
-            not(has_C_from_LTs(list_of_scores)) and
-            pct_of_lts_met(list_of_scores) >= 0.5)
+    return grades_from_histogram(
+            score_histogram(list_of_scores)).grade_code == 'D'
 
 
 def has_F_from_LTs(list_of_scores):
@@ -199,10 +216,8 @@ def has_F_from_LTs(list_of_scores):
     This function returns True if a student does not qualify for
     an A, B, C, or D.
     '''
-    return (not(has_A_from_LTs(list_of_scores)) and
-            not(has_B_from_LTs(list_of_scores)) and
-            not(has_C_from_LTs(list_of_scores)) and
-            not(has_D_from_LTs(list_of_scores)))
+    return grades_from_histogram(
+            score_histogram(list_of_scores)).grade_code == 'F'
 
 
 def simple_grade(list_of_scores):
@@ -214,18 +229,9 @@ def simple_grade(list_of_scores):
     used in most cases, but can be useful as a point of comparison
     for more complicated functions such as piecewise_grade.
     '''
-    assert list_is_valid(list_of_scores, [0, 1, 1.5, 2, 2.5, 3, 3.5, 4])
-    if has_A_from_LTs(list_of_scores):
-        return .95
-    elif has_B_from_LTs(list_of_scores):
-        return .85
-    elif has_C_from_LTs(list_of_scores):
-        return .75
-    elif has_D_from_LTs(list_of_scores):
-        return .65
-    else:
-        assert has_F_from_LTs(list_of_scores)
-        return .50
+    grades = grades_from_histogram(score_histogram(list_of_scores))
+    assert grades.simple is not None
+    return grades.simple
 
 
 def letter_grade(list_of_scores, d_is_valid):
@@ -233,22 +239,10 @@ def letter_grade(list_of_scores, d_is_valid):
     This function takes a list of student scores and returns
     the student's letter grade (char).
     '''
-    simple_pct = simple_grade(list_of_scores)
-    if simple_pct == .95:
-        return 'A'
-    elif simple_pct == .85:
-        return 'B'
-    elif simple_pct == .75:
-        return 'C'
-    elif simple_pct == .65:
-        if d_is_valid:
-            return 'D'
-        else:
-            return 'F'
-    elif simple_pct == .50:
-        return 'F'
-    else:  # Something bad happened
-        return 'X'
+    grades = grades_from_histogram(score_histogram(list_of_scores),
+                                   d_is_valid)
+    assert grades.letter is not None
+    return grades.letter
 
 
 def piecewise_grade(list_of_scores):
@@ -262,32 +256,219 @@ def piecewise_grade(list_of_scores):
         - If a student is earning more than 80% of LTs but has a C,
                 their grade is returned as 79%.
     '''
-    assert list_is_valid(list_of_scores)
-    cpoltm = curved_pct_of_lts_met(list_of_scores)
-    if has_A_from_LTs(list_of_scores):
-        grade = cpoltm
-    elif has_B_from_LTs(list_of_scores):
-        if cpoltm >= 0.9:  # Student has not earned enough 4s for an A
-            grade = 0.89
-        else:  # Student has not met standard on 90% of LTs
-            grade = cpoltm
-    elif has_C_from_LTs(list_of_scores):
-        if cpoltm >= 0.8:  # Student has 0s or 1s
-            grade = 0.79
-        else:
-            grade = cpoltm
-    else:
-        assert has_D_from_LTs(list_of_scores) or has_F_from_LTs(list_of_scores)
-        assert cpoltm < 0.7
-        grade = cpoltm
-    return round(grade, 3)
+    grades = grades_from_histogram(score_histogram(list_of_scores))
+    assert grades.piecewise is not None
+    return grades.piecewise
 
 
 def sticky_grade(list_of_scores):
     '''
     This function returns the smaller of piecewise_grade and simple_grade.
     '''
-    return min(simple_grade(list_of_scores), piecewise_grade(list_of_scores))
+    grades = grades_from_histogram(score_histogram(list_of_scores))
+    assert grades.sticky is not None
+    return grades.sticky
+
+
+def score_histogram(list_of_scores):
+    '''
+    This function takes a list of scores and returns a dictionary
+    mapping each score to the number of times it occurs in the list.
+    For example, [3, 4, 3, 2.5] gives {3: 2, 4: 1, 2.5: 1}.
+    The list is scanned exactly once.
+    '''
+    histogram = {}
+    for score in list_of_scores:
+        histogram[score] = histogram.get(score, 0) + 1
+    return histogram
+
+
+def histogram_of_most_recent_scores(dict_of_all_scores,
+                                    exempt_code=DEFAULT_X_CODE):
+    '''
+    This function takes a dictionary of student scores for all learning
+    targets (as in list_of_most_recent_scores()) and returns the
+    score_histogram() of the most recent scores, skipping exempt scores.
+    It builds the histogram directly, without building a list first.
+    '''
+    histogram = {}
+    for history in dict_of_all_scores.values():
+        recent = history[-1]
+        if recent != exempt_code:
+            histogram[recent] = histogram.get(recent, 0) + 1
+    return histogram
+
+
+def canonical_histogram(histogram):
+    '''
+    This function takes a histogram as returned by score_histogram()
+    and returns it as a tuple of (score, count) pairs sorted by score.
+    Two students with the same multiset of scores have equal canonical
+    histograms, so the result can be used as a dictionary or cache key.
+    '''
+    return tuple(sorted(histogram.items()))
+
+
+def grades_from_histogram(histogram, d_is_valid=True):
+    '''
+    This function takes a histogram as returned by score_histogram()
+    and a bool for whether D is a valid grade, and returns the
+    corresponding Grades (see cached_grades()).
+    This is the entry point that all the grading functions go through.
+    If use_grade_tables() has been called, the grades are looked up in
+    the precomputed tables instead (see grade_tables).
+    '''
+    if grade_table_directory is not None:
+        # Imported here, since grade_tables imports this module
+        import grade_tables
+        return grade_tables.grades_from_table(histogram, d_is_valid,
+                                              grade_table_directory)
+    return cached_grades(canonical_histogram(histogram), bool(d_is_valid))
+
+
+def use_grade_tables(directory):
+    '''
+    This function takes a directory of precomputed grade tables (see
+    grade_tables), which are built and saved there as needed, and makes
+    grades_from_histogram() look grades up in them. Pass None to go back
+    to calculating grades (through cached_grades()).
+    '''
+    global grade_table_directory
+    grade_table_directory = directory
+
+
+@lru_cache(maxsize=GRADE_CACHE_SIZE)
+def cached_grades(canonical, d_is_valid):
+    '''
+    This function takes a canonical histogram (see canonical_histogram())
+    and a bool for whether D is a valid grade. It returns a Grades tuple
+    holding the grade_code and the simple, piecewise, sticky and letter
+    grades for those scores.
+    A grade that cannot be calculated because the scores fail that
+    function's validity check is returned as None.
+    Results are kept in a bounded least-recently-used cache, since the
+    number of distinct histograms in a school is small; see
+    grade_cache_info().
+    '''
+    summary = GradeSummary(dict(canonical))
+    grades = {}
+    for function in ['simple', 'piecewise', 'sticky']:
+        try:
+            grades[function] = getattr(summary, function + '_grade')()
+        except AssertionError:
+            grades[function] = None
+    try:
+        letter = summary.letter_grade(d_is_valid)
+    except AssertionError:
+        letter = None
+    return Grades(summary.grade_code, grades['simple'],
+                  grades['piecewise'], grades['sticky'], letter)
+
+
+def grade_cache_info():
+    '''
+    This function returns the hit/miss statistics of the grade cache
+    as a named tuple (hits, misses, maxsize, currsize).
+    '''
+    return cached_grades.cache_info()
+
+
+def clear_grade_cache():
+    '''
+    This function empties the grade cache and resets its statistics.
+    '''
+    cached_grades.cache_clear()
+
+
+class GradeSummary:
+    '''
+    Class to hold everything needed to grade one student, derived from
+    a single score_histogram() of their most recent scores.
+    The counts, the percentage of LTs met, the curved percentage and
+    the grade letter (grade_code) are all computed once, in the
+    constructor, so that the grading functions never rescan the scores.
+    grade_code is one of 'A', 'B', 'C', 'D', 'F'; it is the letter that
+    simple_grade() corresponds to, before d_is_valid is taken into account.
+    '''
+    def __init__(self, histogram, exempt_code=DEFAULT_X_CODE):
+        '''
+        Constructor method. Takes a histogram as returned by
+        score_histogram().
+        '''
+        self.histogram = histogram
+        self.lt_count = (sum(histogram.values()) -
+                         histogram.get(exempt_code, 0))
+        self.count_of_4s = histogram.get(4, 0)
+        self.count_of_lts_met = (histogram.get(3, 0) +
+                                 histogram.get(3.5, 0) +
+                                 self.count_of_4s)
+        self.free_of_zeroes_and_ones = not(0 in histogram or 1 in histogram)
+        if self.lt_count == 0:  # Avoid division by 0!
+            self.pct_of_lts_met = 0
+        else:
+            self.pct_of_lts_met = self.count_of_lts_met / self.lt_count
+        self.curved_pct_of_lts_met = curve_pct(self.pct_of_lts_met)
+        # Same cascade as has_A_from_LTs() ... has_F_from_LTs()
+        pct = self.pct_of_lts_met
+        if (pct >= 0.9 and self.count_of_4s >= (self.lt_count / 2) and
+                self.free_of_zeroes_and_ones):
+            self.grade_code = 'A'
+        elif pct >= 0.8 and self.free_of_zeroes_and_ones:
+            self.grade_code = 'B'
+        elif pct >= 0.65:
+            self.grade_code = 'C'
+        elif pct >= 0.5:
+            self.grade_code = 'D'
+        else:
+            self.grade_code = 'F'
+
+    def scores_are_valid(self, valid_scores=DEFAULT_VALID_SCORES):
+        '''
+        This method returns True if every score in the histogram is in
+        valid_scores, False otherwise (cf. list_is_valid()).
+        '''
+        return list_is_valid(self.histogram, valid_scores)
+
+    def simple_grade(self):
+        '''
+        This method returns the student's grade as .50 (F), .65 (D),
+        .75 (C), .85 (B), or .95 (A). See simple_grade().
+        '''
+        assert self.scores_are_valid([0, 1, 1.5, 2, 2.5, 3, 3.5, 4])
+        return SIMPLE_GRADES[self.grade_code]
+
+    def letter_grade(self, d_is_valid):
+        '''
+        This method returns the student's letter grade (char).
+        A D is reported as an F if d_is_valid is False.
+        '''
+        self.simple_grade()  # Same validity check as simple_grade()
+        if self.grade_code == 'D' and not(d_is_valid):
+            return 'F'
+        return self.grade_code
+
+    def piecewise_grade(self):
+        '''
+        This method returns the student's grade per the piecewise
+        function. See piecewise_grade().
+        '''
+        assert self.scores_are_valid()
+        cpoltm = self.curved_pct_of_lts_met
+        if self.grade_code == 'B' and cpoltm >= 0.9:
+            grade = 0.89  # Student has not earned enough 4s for an A
+        elif self.grade_code == 'C' and cpoltm >= 0.8:
+            grade = 0.79  # Student has 0s or 1s
+        else:
+            assert self.grade_code in 'ABC' or cpoltm < 0.7
+            grade = cpoltm
+        return round(grade, 3)
+
+    def sticky_grade(self):
+        '''
+        This method returns the smaller of piecewise_grade and simple_grade.
+        '''
+        return min(self.simple_grade(), self.piecewise_grade())
+
 
 # Unit tests
 if __name__ == "__main__":
@@ -443,8 +624,10 @@ if __name__ == "__main__":
     print("Success!")
     # Test letter_grade()
     print("Testing letter_grade():")
-    letter_grades = list(map(letter_grade, most_recent_scores))
+    letter_grades = list(map(lambda x: letter_grade(x, True),
+                             most_recent_scores))
     assert letter_grades == ['A', 'B', 'A', 'B', 'C', 'C', 'D', 'F', 'F', 'A']
+    assert letter_grade(most_recent_scores[6], False) == 'F'  # No Ds
     print("Success!")
     # Test piecewise_grade()
     print("Testing piecewise_grade():")
@@ -454,4 +637,49 @@ if __name__ == "__main__":
     print("Testing sticky_grade():")
     sticky_grades = list(map(sticky_grade, most_recent_scores))
     assert sticky_grades == [.95, .85, .9, .8, .75, .73, .65, .5, .5, .95]
+    print("Success!")
+    # Test score_histogram()
+    print("Testing score_histogram():")
+    assert score_histogram([3, 4, 3, 2.5]) == {3: 2, 4: 1, 2.5: 1}
+    assert score_histogram([]) == {}
+    print("Success!")
+    # Test histogram_of_most_recent_scores()
+    print("Testing histogram_of_most_recent_scores():")
+    assert histogram_of_most_recent_scores(students[0].scores) == {4: 5,
+                                                                   3: 5}
+    assert histogram_of_most_recent_scores(students[9].scores) == {4: 1}
+    print("Success!")
+    # Test GradeSummary
+    print("Testing GradeSummary:")
+    summaries = [GradeSummary(score_histogram(scores))
+                 for scores in most_recent_scores]
+    assert [s.grade_code for s in summaries] == ['A', 'B', 'A', 'B', 'C',
+                                                 'C', 'D', 'F', 'F', 'A']
+    assert [s.curved_pct_of_lts_met for s in summaries] == curved_scores
+    assert [s.piecewise_grade() for s in summaries] == piecewise_grades
+    assert [s.sticky_grade() for s in summaries] == sticky_grades
+    assert summaries[8].lt_count == 0  # Ivan
+    assert summaries[8].pct_of_lts_met == 0
+    print("Success!")
+    # Test canonical_histogram()
+    print("Testing canonical_histogram():")
+    assert canonical_histogram({4: 1, 2.5: 2}) == ((2.5, 2), (4, 1))
+    assert canonical_histogram(score_histogram([3, 4, 3])) == \
+        canonical_histogram(score_histogram([4, 3, 3]))
+    print("Success!")
+    # Test the grade cache
+    print("Testing cached_grades():")
+    clear_grade_cache()
+    assert grade_cache_info().currsize == 0
+    assert simple_grade([4, 3, 4]) == .95
+    assert grade_cache_info().misses == 1
+    assert piecewise_grade([3, 4, 4]) == 1  # Same histogram: cache hit
+    assert grade_cache_info().hits == 1
+    assert grades_from_histogram({4: 2, 3: 1}, False) == \
+        Grades('A', .95, 1.0, .95, 'A')
+    assert grade_cache_info().misses == 2  # New d_is_valid: new entry
+    # simple_grade() rejects 0.5 even though piecewise_grade() accepts it
+    assert grades_from_histogram({0.5: 1}).simple is None
+    assert piecewise_grade([0.5]) == 0.5
+    print("Success!")
     print("All tests were successful.")
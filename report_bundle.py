@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""
+Description: report_bundle module.
+This module writes the grade reports of a class period, or of a whole
+school, into a single file rather than one .txt file per student
+(see cpm.generate_reports()). A bundle is either
+    *a zip archive with one entry per report, laid out as
+        cpm.write_report() would lay out the files, or
+    *a print file, in which each report starts on a new page (the
+        reports are separated by form feeds).
+Both kinds of bundle have a table of contents listing every report.
+
+Reports are written to the bundle one at a time as they are rendered,
+so only one report (and one line of the table of contents per report)
+is held in memory. A bundle is written under a temporary name and only
+given its own name once it is complete.
+"""
+
+# import modules
+import os
+import shutil
+import zipfile
+import classperiod_module as cpm
+import school_module as scm
+
+# Global variables
+BUNDLE_FORMATS = ('zip', 'print')
+# Name of the table of contents in a zip bundle
+CONTENTS_FILENAME = 'contents.txt'
+# Form feed: starts a new page when a print bundle is printed
+PAGE_SEPARATOR = '\f'
+# Suffix of a bundle that is still being written
+PARTIAL_SUFFIX = '.partial'
+
+
+class ReportBundle:
+    '''
+    Class for a single file that grade reports are written into, one at
+    a time (see add_report()). close() writes the table of contents and
+    gives the bundle its name; abort() throws the bundle away.
+    A ReportBundle can be used in a with statement, in which case it is
+    closed at the end of the block, or aborted if an exception occurred.
+    '''
+
+    def __init__(self, filename, bundle_format=None, title="Grade Reports"):
+        '''
+        Constructor method. Takes the name of the bundle file and an
+        optional format, 'zip' or 'print' (by default, 'zip' if the name
+        ends in ".zip" and 'print' otherwise), and an optional title
+        for the table of contents.
+        '''
+        if bundle_format is None:
+            if filename.lower().endswith('.zip'):
+                bundle_format = 'zip'
+            else:
+                bundle_format = 'print'
+        if bundle_format not in BUNDLE_FORMATS:
+            raise ValueError(f"Invalid bundle format {bundle_format}; " +
+                             f"expected one of {BUNDLE_FORMATS}")
+        # Absolute, in case the working directory changes while writing
+        self.filename = os.path.abspath(filename)
+        self.bundle_format = bundle_format
+        self.title = title
+        # One (period description, student name, entry name) per report
+        self.contents = []
+        self.partial_filename = self.filename + PARTIAL_SUFFIX
+        if bundle_format == 'zip':
+            self.file = zipfile.ZipFile(self.partial_filename, 'w',
+                                        zipfile.ZIP_DEFLATED)
+        else:
+            self.file = open(self.partial_filename, 'w')
+
+    def add_report(self, cp, student):
+        '''
+        This method takes a ClassPeriod and one of its Students, and
+        writes the student's grade report to the bundle.
+        It returns True on success, False on failure.
+        '''
+        entry_name = "/".join([
+                cpm.replace_punctuation_with_underscores(cp.description),
+                cpm.report_filename(cp, student)])
+        report = student.report(cp.course_lts, cp.overall_function,
+                                cp.d_is_valid)
+        try:
+            if self.bundle_format == 'zip':
+                self.file.writestr(entry_name, report)
+            else:
+                self.file.write(PAGE_SEPARATOR + report + "\n")
+        except (IOError, ValueError):  # ValueError: bundle already closed
+            print(f"Warning: could not write report {entry_name} " +
+                  f"to {self.filename}")
+            return False
+        self.contents.append((cp.description,
+                              f"{student.lastname}, {student.firstname}",
+                              entry_name))
+        return True
+
+    def table_of_contents(self):
+        '''
+        This method returns the table of contents as a string, with one
+        numbered line per report in the order the reports were added.
+        In a zip bundle, each line gives the name of the report's entry.
+        '''
+        lines = [self.title, "Contents", ""]
+        width = len(str(len(self.contents)))
+        for number, (description, name, entry_name) in enumerate(
+                self.contents, 1):
+            line = f"{number:>{width}}. {description}: {name}"
+            if self.bundle_format == 'zip':
+                line += f" ({entry_name})"
+            lines.append(line)
+        return "\n".join(lines) + "\n"
+
+    def close(self):
+        '''
+        This method writes the table of contents and gives the bundle its
+        name. In a print bundle, the table of contents is the first page,
+        so the reports are copied after it in fixed-size blocks.
+        It returns True on success, False on failure.
+        '''
+        try:
+            if self.bundle_format == 'zip':
+                self.file.writestr(CONTENTS_FILENAME,
+                                   self.table_of_contents())
+                self.file.close()
+                os.replace(self.partial_filename, self.filename)
+            else:
+                self.file.close()
+                with open(self.filename + '.contents', 'w') as bundle:
+                    bundle.write(self.table_of_contents())
+                    with open(self.partial_filename, 'r') as reports:
+                        shutil.copyfileobj(reports, bundle)
+                os.replace(self.filename + '.contents', self.filename)
+                os.remove(self.partial_filename)
+        except (IOError, ValueError):
+            print(f"Warning: could not write to file {self.filename}")
+            self.abort()
+            return False
+        return True
+
+    def abort(self):
+        '''
+        This method closes the bundle and deletes what was written of it.
+        '''
+        self.file.close()
+        for filename in [self.partial_filename, self.filename + '.contents']:
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def __enter__(self):
+        '''
+        Method called at the start of a with statement.
+        '''
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        '''
+        Method called at the end of a with statement. The bundle is
+        closed, or aborted if an exception was raised.
+        '''
+        if exception_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+    def __len__(self):
+        '''
+        Method that returns the number of reports in the bundle.
+        '''
+        return len(self.contents)
+
+    def __repr__(self):
+        '''
+        Method that returns a string representation of the bundle.
+        '''
+        return (f"ReportBundle({self.filename}, {self.bundle_format}: " +
+                f"{len(self)} reports)")
+
+
+def bundle_reports_from_stream(period_students, filename,
+                               bundle_format=None, progress=None,
+                               total=None, title="Grade Reports"):
+    '''
+    This function takes an iterable of (ClassPeriod, Student) pairs
+    (e.g. from cpm.iter_period_students()) and writes a grade report for
+    each student into one bundle file (see ReportBundle), one student at
+    a time.
+    progress is an optional function that is called as
+    progress(done, total) after each report, where total is the number
+    of reports expected (None if unknown).
+    The function returns True on success, False on failure (in which
+    case no bundle is left behind).
+    '''
+    done = 0
+    bundle = ReportBundle(filename, bundle_format, title)
+    try:
+        for cp, student in period_students:
+            if not(bundle.add_report(cp, student)):
+                bundle.abort()
+                return False
+            done += 1
+            if progress is not None:
+                progress(done, total)
+    except BaseException:
+        bundle.abort()
+        raise
+    return bundle.close()
+
+
+def bundle_period_reports(cp, filename, bundle_format=None, progress=None):
+    '''
+    This function writes the grade reports of every Student in a
+    ClassPeriod into one bundle file (see bundle_reports_from_stream()),
+    titled with the period's description.
+    It returns True on success, False on failure.
+    '''
+    return bundle_reports_from_stream(
+            ((cp, student) for student in cp.students_in_period),
+            filename, bundle_format, progress,
+            len(cp.students_in_period), f"Grade Reports: {cp.description}")
+
+
+def bundle_school_reports(root, filename, bundle_format=None,
+                          progress=None):
+    '''
+    This function writes the grade reports of every student in every
+    class period in a school's directory tree into one bundle file
+    (see bundle_reports_from_stream()). The students are read one at a
+    time (see scm.iter_school_students()), so the school is never held
+    in memory at once.
+    It returns True on success, False on failure.
+    '''
+    return bundle_reports_from_stream(scm.iter_school_students(root),
+                                      filename, bundle_format, progress,
+                                      title="Grade Reports")
+
+
+# Unit tests
+if __name__ == "__main__":
+    import tempfile
+    import data_for_unit_testing as dfut
+    cp = cpm.ClassPeriod("Period 1", dfut.sample_list_of_students(),
+                         dfut.sample_list_of_lts())
+    expected_reports = [student.report(cp.course_lts, cp.overall_function,
+                                       cp.d_is_valid)
+                        for student in cp.students_in_period]
+    with tempfile.TemporaryDirectory() as directory:
+        # Test bundle_period_reports() with a zip bundle
+        print("Testing bundle_period_reports() (zip):")
+        filename = os.path.join(directory, "reports.zip")
+        progress_calls = []
+        assert bundle_period_reports(
+                cp, filename,
+                progress=lambda done, total: progress_calls.append(
+                    (done, total)))
+        assert progress_calls[-1] == (10, 10)
+        assert os.listdir(directory) == ["reports.zip"]
+        with zipfile.ZipFile(filename) as archive:
+            names = archive.namelist()
+            assert len(names) == 11 and names[-1] == CONTENTS_FILENAME
+            assert names[0].startswith("Period_1/")
+            assert names[0].endswith(
+                    "_Period 1_sid1_Frank_Aerik_grade_report.txt")
+            assert [archive.read(name).decode() for name in names[:-1]] \
+                == expected_reports
+            contents = archive.read(CONTENTS_FILENAME).decode()
+        assert contents.startswith("Grade Reports: Period 1\nContents\n")
+        assert " 1. Period 1: Frank, Aerik (Period_1/" in contents
+        assert len(contents.strip().split("\n")) == 13
+        print("Success!")
+        # Test bundle_period_reports() with a print bundle
+        print("Testing bundle_period_reports() (print):")
+        filename = os.path.join(directory, "reports.txt")
+        assert bundle_period_reports(cp, filename)
+        with open(filename, 'r') as file:
+            pages = file.read().split(PAGE_SEPARATOR)
+        assert len(pages) == 11
+        assert pages[0].startswith("Grade Reports: Period 1\nContents\n")
+        assert "10. Period 1: " in pages[0]
+        assert [page[:-1] for page in pages[1:]] == expected_reports
+        assert not(os.path.exists(filename + PARTIAL_SUFFIX))
+        print("Success!")
+        # Test ReportBundle
+        print("Testing ReportBundle:")
+        try:
+            ReportBundle(filename, 'pdf')
+            assert False, "Invalid formats should raise a ValueError"
+        except ValueError:
+            pass
+        filename = os.path.join(directory, "aborted.zip")
+        try:
+            with ReportBundle(filename) as bundle:
+                assert bundle.add_report(cp, cp.students_in_period[0])
+                assert len(bundle) == 1
+                raise KeyboardInterrupt
+        except KeyboardInterrupt:
+            pass
+        assert not(os.path.exists(filename))
+        assert not(os.path.exists(filename + PARTIAL_SUFFIX))
+        print("Success!")
+        # Test bundle_school_reports()
+        print("Testing bundle_school_reports():")
+        school = os.path.join(directory, "school")
+        os.mkdir(school)
+        working_directory = os.getcwd()
+        os.chdir(school)
+        try:
+            for description in ["Period 1", "Period 2"]:
+                assert cpm.write_classperiod_to_datafile(cpm.ClassPeriod(
+                        description, dfut.sample_list_of_students(),
+                        dfut.sample_list_of_lts()))
+        finally:
+            os.chdir(working_directory)
+        filename = os.path.join(directory, "school.txt")
+        assert bundle_school_reports(school, filename)
+        with open(filename, 'r') as file:
+            pages = file.read().split(PAGE_SEPARATOR)
+        assert len(pages) == 21
+        assert "20. Period 2: " in pages[0]
+        assert pages[11].startswith("Grade Report for Aerik Frank")
+    print("Success!\n\n")
+    print("All tests were successful.")
@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+"""
+Description: report_manifest module.
+This module keeps a manifest of the grade reports written for a class
+period, so that reports are only written again for students whose
+reports would change (see update_reports()).
+
+For each student, the manifest holds a hash of everything the student's
+report is made from, together with the name of the report file that was
+written. The hash covers
+    *the student's data (ID, name and scores),
+    *the brief descriptions of the LTs the student has been assessed on,
+    *the period's description, overall function and whether D is valid,
+    *the version of the advice template file
+        (see advice.template_version()), and
+    *REPORT_FORMAT_VERSION.
+The date printed on a report is not part of the hash, so an unchanged
+report keeps the date on which it was written.
+
+The manifest is saved beside the reports, in the class period's
+directory (e.g. "Period_5/Period_5.manifest"), one line per student:
+    sid:::hash:::report file name
+"""
+
+# import modules
+import hashlib
+import os
+import advice
+import classperiod_module as cpm
+import lt_module as ltm
+import sbg_data_methods as dm
+
+# Global variables
+MANIFEST_EXTENSION = '.manifest'
+SEPARATOR = ':::'
+# Increase this when the layout of Student.report() changes, so that
+# every report is written again
+REPORT_FORMAT_VERSION = 1
+
+
+class ReportHasher:
+    '''
+    Class that hashes the inputs of the grade report of each student in
+    a ClassPeriod (see student_hash()). The inputs shared by the whole
+    period are hashed once, when the ReportHasher is created.
+    '''
+
+    def __init__(self, cp, template_version=None):
+        '''
+        Constructor method. Takes a ClassPeriod and, optionally, the
+        version of the advice template file (by default, the current
+        version; see advice.template_version()).
+        '''
+        if template_version is None:
+            template_version = advice.template_version()
+        self.find_lt = ltm.lt_label_lookup(cp.course_lts)
+        # Brief string of each LT label, looked up once per period
+        self.briefs = {}
+        self.period_hash = hashlib.sha256("\n".join([
+                str(REPORT_FORMAT_VERSION), template_version,
+                cp.description, str(cp.overall_function),
+                str(bool(cp.d_is_valid))]).encode())
+
+    def student_hash(self, student):
+        '''
+        This method returns a hash (a hex string) of the inputs of a
+        student's grade report: the period's inputs, the student's data
+        and the brief descriptions of the LTs the student has been
+        assessed on.
+        '''
+        briefs = [repr(student)]
+        for lt_label in student.scores:
+            if lt_label not in self.briefs:
+                lt = self.find_lt(lt_label)
+                self.briefs[lt_label] = (lt.brief_string() if lt is not False
+                                         else lt_label)
+            briefs.append(self.briefs[lt_label])
+        student_hash = self.period_hash.copy()
+        student_hash.update("\n".join(briefs).encode())
+        return student_hash.hexdigest()
+
+
+def report_directory(cp):
+    '''
+    This function returns the directory in which a ClassPeriod's reports
+    are written (see cpm.write_report()).
+    '''
+    return os.path.join('.',
+                        cpm.replace_punctuation_with_underscores(
+                                cp.description))
+
+
+def manifest_filename(cp):
+    '''
+    This function returns the name of a ClassPeriod's report manifest.
+    '''
+    directory = report_directory(cp)
+    return os.path.join(directory,
+                        os.path.basename(directory) + MANIFEST_EXTENSION)
+
+
+def read_manifest(cp):
+    '''
+    This function reads a ClassPeriod's report manifest and returns a
+    dictionary from student ID to a tuple of (hash, report file name).
+    It returns an empty dictionary if there is no manifest. Lines that
+    cannot be read are skipped, so those students' reports are written
+    again.
+    '''
+    manifest = {}
+    try:
+        with open(manifest_filename(cp), 'r') as file:
+            lines = file.read().splitlines()
+    except (IOError, UnicodeDecodeError):
+        return manifest
+    for line in lines:
+        fields = line.split(SEPARATOR)
+        if len(fields) != 3:
+            continue
+        try:
+            manifest[int(fields[0])] = (fields[1], fields[2])
+        except ValueError:
+            continue
+    return manifest
+
+
+def write_manifest(cp, manifest):
+    '''
+    This function takes a ClassPeriod and a dictionary from student ID to
+    (hash, report file name), and writes it to the period's report
+    manifest (see dm.write_string_to_file_atomically()).
+    It returns True on success, False on failure.
+    '''
+    filename = manifest_filename(cp)
+    lines = [SEPARATOR.join([str(sid), student_hash, report_filename])
+             for sid, (student_hash, report_filename) in manifest.items()]
+    try:
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+    except OSError:
+        print(f"Warning: could not write to file {filename}")
+        return False
+    return dm.write_string_to_file_atomically("\n".join(lines), filename)
+
+
+def changed_students(cp, manifest, hasher=None):
+    '''
+    This function takes a ClassPeriod and its report manifest (see
+    read_manifest()), and returns a list of (Student, hash) tuples for
+    the students whose reports need to be written: those whose hash has
+    changed, who are not in the manifest, or whose report file is missing.
+    '''
+    if hasher is None:
+        hasher = ReportHasher(cp)
+    directory = report_directory(cp)
+    changed = []
+    for student in cp.students_in_period:
+        student_hash = hasher.student_hash(student)
+        entry = manifest.get(student.sid)
+        if (entry is None or entry[0] != student_hash or
+                not(os.path.exists(os.path.join(directory, entry[1])))):
+            changed.append((student, student_hash))
+    return changed
+
+
+def remove_report(directory, report_filename):
+    '''
+    This function removes a report file from a directory, if it exists.
+    '''
+    path = os.path.join(directory, report_filename)
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def update_reports(cp, max_workers=1, progress=None, force=False):
+    '''
+    This function writes grade reports (see cpm.generate_reports()) only
+    for the students in a ClassPeriod whose reports would change since
+    they were last written (see changed_students()), or for every student
+    if force is True. It then updates the period's report manifest.
+    When a student's report is written under a new name (e.g. on a new
+    date), the student's previous report file is removed, as are the
+    reports of students who are no longer in the period.
+    max_workers and progress are as in cpm.generate_reports(); progress
+    is called for the reports that are written.
+    The function returns a tuple of
+        (i) True on success, False on failure, and
+        (ii) the number of reports that needed to be written.
+    '''
+    manifest = read_manifest(cp)
+    if force:
+        hasher = ReportHasher(cp)
+        changed = [(student, hasher.student_hash(student))
+                   for student in cp.students_in_period]
+    else:
+        changed = changed_students(cp, manifest)
+    # Keep the entries of current students whose reports are unchanged
+    changed_sids = set(student.sid for student, _ in changed)
+    new_manifest = {student.sid: manifest[student.sid]
+                    for student in cp.students_in_period
+                    if student.sid not in changed_sids}
+    changed_cp = cpm.ClassPeriod(cp.description,
+                                 [student for student, _ in changed],
+                                 cp.course_lts, cp.overall_function,
+                                 cp.d_is_valid)
+    success = cpm.generate_reports(changed_cp, max_workers, progress)
+    directory = report_directory(cp)
+    current_sids = set(student.sid for student in cp.students_in_period)
+    for sid, (_, report_filename) in manifest.items():
+        if sid not in current_sids:
+            remove_report(directory, report_filename)
+    for student, student_hash in changed:
+        old_entry = manifest.get(student.sid)
+        if not(success):  # Write these reports again next time
+            if old_entry is not None:
+                new_manifest[student.sid] = ('', old_entry[1])
+            continue
+        report_filename = cpm.report_filename(cp, student)
+        if old_entry is not None and old_entry[1] != report_filename:
+            remove_report(directory, old_entry[1])
+        new_manifest[student.sid] = (student_hash, report_filename)
+    if len(new_manifest) > 0 or len(manifest) > 0:
+        success = write_manifest(cp, new_manifest) and success
+    return success, len(changed)
+
+
+# Unit tests
+if __name__ == "__main__":
+    import tempfile
+    import data_for_unit_testing as dfut
+    import student_module as stu
+
+    def report_files():
+        return sorted(name for name in os.listdir('Period_1')
+                      if name.endswith('grade_report.txt'))
+
+    working_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            cp = cpm.ClassPeriod("Period 1", dfut.sample_list_of_students(),
+                                 dfut.sample_list_of_lts())
+            # Test ReportHasher
+            print("Testing ReportHasher:")
+            hasher = ReportHasher(cp)
+            bob = cp.find_student(2)
+            assert hasher.student_hash(bob) == ReportHasher(
+                    cp).student_hash(bob)
+            assert hasher.student_hash(bob) != hasher.student_hash(
+                    cp.find_student(3))
+            assert hasher.student_hash(bob) != ReportHasher(
+                    cp, "another template").student_hash(bob)
+            cp.d_is_valid = False
+            assert hasher.student_hash(bob) != ReportHasher(
+                    cp).student_hash(bob)
+            cp.d_is_valid = True
+            print("Success!")
+            # Test update_reports()
+            print("Testing update_reports():")
+            assert update_reports(cp) == (True, 10)
+            assert len(report_files()) == 10
+            assert len(read_manifest(cp)) == 10
+            assert manifest_filename(cp) == os.path.join(
+                    '.', 'Period_1', 'Period_1.manifest')
+            # Nothing has changed, so nothing is written
+            for name in report_files():
+                os.utime(os.path.join('Period_1', name), ns=(0, 0))
+            assert update_reports(cp) == (True, 0)
+            assert all(os.stat(os.path.join('Period_1', name)).st_mtime_ns
+                       == 0 for name in report_files())
+            # Only changed students are written
+            stu.update_grade(bob, 'LT01', 2)
+            progress_calls = []
+            assert update_reports(
+                    cp, progress=lambda done, total:
+                        progress_calls.append((done, total))) == (True, 1)
+            assert progress_calls == [(1, 1)]
+            changed = [name for name in report_files() if os.stat(
+                    os.path.join('Period_1', name)).st_mtime_ns != 0]
+            assert len(changed) == 1 and "_sid2_" in changed[0]
+            # Changing an LT's brief changes the reports that show it
+            cp.course_lts[9].set_brief("A new brief for LT10")
+            assert update_reports(cp) == (True, 8)  # Not Ivan or Janet
+            # A missing report is written again
+            os.remove(os.path.join('Period_1', report_files()[0]))
+            assert update_reports(cp) == (True, 1)
+            # A report written on a new date replaces the old one
+            manifest = read_manifest(cp)
+            old_name = "2000-01-01" + manifest[3][1][10:]
+            os.rename(os.path.join('Period_1', manifest[3][1]),
+                      os.path.join('Period_1', old_name))
+            manifest[3] = (manifest[3][0], old_name)
+            assert write_manifest(cp, manifest)
+            cp.find_student(3).firstname = "Cat"
+            assert update_reports(cp) == (True, 1)
+            assert len(report_files()) == 10 and old_name not in \
+                report_files()
+            # Students who leave are dropped, with their reports
+            departed_report = read_manifest(cp)[10][1]
+            cp.students_in_period.remove(cp.find_student(10))
+            assert update_reports(cp) == (True, 0)
+            assert 10 not in read_manifest(cp)
+            assert report_files() == sorted(
+                    entry[1] for entry in read_manifest(cp).values())
+            assert departed_report not in report_files()
+            assert not(os.path.exists(manifest_filename(cp) + '.tmp'))
+            assert update_reports(cp, force=True) == (True, 9)
+            # A damaged manifest only means more reports are written
+            with open(manifest_filename(cp), 'a') as file:
+                file.write("\nnot a manifest line")
+            assert update_reports(cp) == (True, 0)
+            with open(manifest_filename(cp), 'w') as file:
+                file.write("x:::y:::z")
+            assert update_reports(cp, max_workers=2) == (True, 9)
+        finally:
+            os.chdir(working_directory)
+    print("Success!\n\n")
+    print("All tests were successful.")
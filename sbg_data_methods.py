@@ -11,6 +11,22 @@ interpreting data from data files.
 
 # import modules
 import os
+import re
+
+# Global variables
+# One "label: [scores]" item of a scores dict, followed by ',' or '}'.
+# Labels may be quoted with ' or " or unquoted (but cannot contain ':').
+SCORES_ITEM_PATTERN = re.compile(
+        r"""\s*(?:'([^']*)'|"([^"]*)"|([^\s'":\[\]{},][^:\[\]{},]*?))"""
+        r"""\s*:\s*\[([^\[\]]*)\]\s*([,}])""")
+WHITESPACE_PATTERN = re.compile(r"\s*")
+SCORE_TOKEN_PATTERN = re.compile(r"\s*(-?(?:\d+\.?\d*|\.\d+))\s*")
+# Scores that appear in almost every file, converted ahead of time,
+# as they appear between commas in a list (e.g. "[1, 2.5]")
+KNOWN_SCORE_TOKENS = {space + token: score
+                      for score in [-1, 0, 0.5, 1, 1.5, 2, 2.5, 3, 3.5, 4]
+                      for token in [str(score), f"{score:.1f}"]
+                      for space in ['', ' ']}
 
 
 def no_taboos(string_to_check, verbose=False):
@@ -85,37 +101,75 @@ def build_scores_dict_from_data(data_str):
     and returns a dictionary built from that representation.
     The dictionary is assumed to have key-value pairs of the form
     {string, list_of_floats}
+    The representation is read in a single pass without copying it.
+    A ValueError giving the position of the problem is raised if it is
+    malformed.
     '''
+    start = data_str.find("scores: ")
+    if start == -1:
+        raise ValueError("No scores found in data")
+    position = WHITESPACE_PATTERN.match(data_str, start + 8).end()
+    if data_str[position:position + 1] != '{':
+        raise ValueError(f"Expected '{{' at position {position}")
+    position = WHITESPACE_PATTERN.match(data_str, position + 1).end()
     scores_dict = {}
-    dict_string = data_str.split("scores: ")[1].strip()
-    # Remove '{' and '}' surrounding dict.
-    assert dict_string[0] == '{' and dict_string[-1] == '}'
-    dict_string = dict_string[1:-1]
-    assert no_taboos(dict_string)  # Check for reserved strings
     # If dictionary is empty, return empty dictionary
-    if dict_string.strip() == '':
-        return {}
-    # Otherwise, parse items
-    # Create a list, items, whose entries are of the form
-    # lt_label: [score1, score2, etc.]
-    # For example:
-    # ["'LT1A': [3, 4]", "'LT1B': [2, 3]", "'LT1C': [4]"]
-    items = dict_string.split('],')
-    for item in items:
-        pair = item.strip().split(':')
-        # Parse out the label and remove any quote marks bookending it.
-        label = pair[0]
-        if label[0] == "'" or label[0] == '"':
-            label = label[1:]
-        if label[-1] == "'" or label[-1] == '"':
-            label = label[:-1]
-        # Parse out the list of scores
-        list_of_scores = str_to_list(pair[1].strip())
-        # Add key-value pair (label, list_of_scores) to dictionary
-        scores_dict[label] = list_of_scores
+    if data_str[position:position + 1] == '}':
+        end = position + 1
+    else:
+        end = None
+    while end is None:
+        item = SCORES_ITEM_PATTERN.match(data_str, position)
+        if item is None:
+            position = WHITESPACE_PATTERN.match(data_str, position).end()
+            raise ValueError("Expected 'label: [scores]' at position " +
+                             str(position))
+        single_quoted, double_quoted, unquoted, scores_str, separator = \
+            item.groups()
+        label = single_quoted if single_quoted is not None else \
+            double_quoted if double_quoted is not None else unquoted
+        scores = list(map(KNOWN_SCORE_TOKENS.get, scores_str.split(',')))
+        if None in scores:
+            scores = scores_from_tokens(scores_str, item.start(4))
+        scores_dict[label] = scores
+        position = item.end()
+        if separator == '}':
+            end = position
+    end = WHITESPACE_PATTERN.match(data_str, end).end()
+    if end != len(data_str):
+        raise ValueError(f"Unexpected data after scores at position {end}")
+    # Check for reserved strings
+    if not(no_taboos(": ".join(scores_dict) + ": ")):
+        raise ValueError("Reserved string found in LT labels")
     return scores_dict
 
 
+def scores_from_tokens(scores_str, offset=0):
+    '''
+    This function takes the inside of a list of scores
+    (e.g. "2.5, 3, 4") and returns the list of scores, as ints where
+    possible (e.g. [2.5, 3, 4]), like str_to_list().
+    It raises a ValueError, giving the position of the bad score
+    (plus offset), if any entry is not a number.
+    '''
+    scores = []
+    position = 0
+    for token in scores_str.split(','):
+        score = KNOWN_SCORE_TOKENS.get(token.strip())
+        if score is None:
+            number = SCORE_TOKEN_PATTERN.fullmatch(token)
+            if number is None:
+                indent = len(token) - len(token.lstrip())
+                raise ValueError(f"Invalid score {token.strip()!r} at " +
+                                 f"position {offset + position + indent}")
+            score = float(number.group(1))
+            if score % 1 == 0:
+                score = int(score)
+        scores.append(score)
+        position += len(token) + 1
+    return scores
+
+
 def write_student_data_to_file(student, filename):
     '''
     This function takes two arguments:
@@ -130,29 +184,41 @@ def write_student_data_to_file(student, filename):
         print("Error: student data contains reserved substrings.")
         print("Cancelling write.")
         return False
-    # Attempt to open file in write mode; create if it doesn't exist yet
+    return write_string_to_file_atomically(str(student), filename)
+
+
+def write_string_to_file_atomically(string_to_write, filename):
+    '''
+    This function writes a string to a file, creating or replacing it.
+    The string is first written to a temporary file in the same directory,
+    which is then renamed over the target, so the file is never left
+    partly written (e.g. if the program is interrupted mid-save).
+    The function returns True on success, False on failure.
+    '''
+    temp_filename = filename + ".tmp"
     try:
-        with open(filename, "w+") as data_file:
-            data_file.write(str(student))
-            return True
-    except IOError:
-        print(f"Could not open file {filename} for writing.")
+        with open(temp_filename, "w") as data_file:
+            data_file.write(string_to_write)
+            data_file.flush()
+            os.fsync(data_file.fileno())
+        os.replace(temp_filename, filename)
+        return True
+    except OSError:
+        print(f"Could not write to file {filename}.")
+        try:
+            os.remove(temp_filename)
+        except OSError:
+            pass
         return False
 
 
-def write_lts_in_list_to_datafile(list_of_lts, filename):
+def lts_to_data_string(list_of_lts):
     '''
-    This function takes a list of LearningTarget objects
-    and exports them to a data file.
-    It takes two arguments:
-        (i) a list of LearningTarget objects
-        (ii) a string holding the filename of the datafile to write.
-    It returns True on success, False on failure.
+    This function takes a list of LearningTarget objects and returns
+    the string that represents them in a data file (one LT per line; see
+    LearningTarget.string_for_datafile()).
+    It returns False if any LT contains the illegal combination ':::'.
     '''
-    # If no LTs, write an empty string to file.
-    if bool(list_of_lts) is False:
-        print("Warning: no LTs specified to write; creating blank file.")
-
     string_to_write = ""
     # Make sure LT descriptions do not contain ":::"
     if bool(list_of_lts):  # Code executes only if there are LTs present
@@ -164,11 +230,51 @@ def write_lts_in_list_to_datafile(list_of_lts, filename):
                 return False
             else:  # If LT strings are valid
                 string_to_write += lt.string_for_datafile() + "\n"
-    # Attempt to open file in write mode; create if it doesn't exist yet
-    try:
-        with open(filename, "w+") as data_file:
-            data_file.write(string_to_write)
-            return True
-    except IOError:
-        print(f"Could not open file {filename}.")
+    return string_to_write
+
+
+def write_lts_in_list_to_datafile(list_of_lts, filename):
+    '''
+    This function takes a list of LearningTarget objects
+    and exports them to a data file.
+    It takes two arguments:
+        (i) a list of LearningTarget objects
+        (ii) a string holding the filename of the datafile to write.
+    It returns True on success, False on failure.
+    '''
+    # If no LTs, write an empty string to file.
+    if bool(list_of_lts) is False:
+        print("Warning: no LTs specified to write; creating blank file.")
+    string_to_write = lts_to_data_string(list_of_lts)
+    if string_to_write is False:
         return False
+    return write_string_to_file_atomically(string_to_write, filename)
+
+
+# Unit tests
+if __name__ == "__main__":
+    # Test build_scores_dict_from_data()
+    print("Testing build_scores_dict_from_data():")
+    data_str = ("sid: 1, lastname: Frank, firstname: Aerik, pronoun: they, " +
+                "scores: {'LT01': [1, 2, 4], 'LT02': [2.5, 4.0], " +
+                "\"LT 3\": [-1], LT04:[3.50,0]}\n")
+    scores_dict = build_scores_dict_from_data(data_str)
+    assert scores_dict == {'LT01': [1, 2, 4], 'LT02': [2.5, 4],
+                           'LT 3': [-1], 'LT04': [3.5, 0]}
+    assert [type(score) for score in scores_dict['LT02']] == [float, int]
+    assert build_scores_dict_from_data("sid: 1, scores: {}") == {}
+    assert build_scores_dict_from_data("sid: 1, scores: { } ") == {}
+    # Malformed data is rejected with the position of the problem
+    for bad_scores, position in [("{'LT01': [1, 2", 9),
+                                 ("{'LT01': [1, x]}", 21),
+                                 ("{'LT01': []}", 18),
+                                 ("{'LT01': [1]} extra", 22),
+                                 ("['LT01', [1]]", 8),
+                                 ("{'LT01': [1], }", 22)]:
+        try:
+            build_scores_dict_from_data("scores: " + bad_scores)
+            assert False, f"{bad_scores} should be rejected"
+        except ValueError as error:
+            assert str(error).endswith(f"position {position}"), str(error)
+    print("Success!\n\n")
+    print("All tests were successful.")
@@ -0,0 +1,439 @@
+# -*- coding: utf-8 -*-
+"""
+Description: school_module module.
+This module loads every class period in a school at once. A school is a
+directory tree of period folders, each laid out as
+cpm.write_classperiod_to_datafile() saves a class period (e.g.
+"Period_5/Period_5.txt" with its LT and student files beside it).
+
+Periods are loaded in a pool of processes, so that many periods are
+parsed at the same time, and each period is reported as soon as it has
+loaded (see iter_load_school()), so that grading and reporting on the
+first periods can start before the slowest period has finished.
+
+Data file names in a period's index file are relative to the directory
+that the period was written from, i.e. the one holding the period's
+folder (e.g. "./Period_5/Period_5_1.studat"), wherever that folder is in
+the school's tree. Each period is therefore loaded (and its journal,
+snapshot and reports found) from the directory holding its folder
+(see period_location()).
+"""
+
+# import modules
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import os
+import time
+import classperiod_module as cpm
+import report_manifest as rm
+import score_journal as sj
+import snapshot_cache as sc
+
+# Global variables
+INDEX_EXTENSION = '.txt'
+
+
+class PeriodLoad:
+    '''
+    Class for the result of loading one class period of a school:
+    the name of its index file (relative to the school's root),
+    the ClassPeriod (None if it could not be loaded), the number of
+    seconds that loading took, and an error message (None on success).
+    '''
+
+    def __init__(self, index_filename, classperiod=None, seconds=0.0,
+                 error=None):
+        '''
+        Constructor method.
+        '''
+        self.index_filename = index_filename
+        self.classperiod = classperiod
+        self.seconds = seconds
+        self.error = error
+
+    @property
+    def succeeded(self):
+        '''
+        True if the class period was loaded.
+        '''
+        return self.error is None
+
+    def __repr__(self):
+        '''
+        Method that returns a string representation of the result.
+        '''
+        if self.succeeded:
+            return (f"{self.index_filename}: loaded " +
+                    f"{len(self.classperiod.students_in_period)} students " +
+                    f"in {self.seconds * 1000:.1f} ms")
+        return f"{self.index_filename}: failed ({self.error})"
+
+
+class School:
+    '''
+    Class for all of the class periods loaded from a school's directory
+    tree (see load_school()). loads is a list of PeriodLoad objects in
+    the order in which the periods finished loading.
+    '''
+
+    def __init__(self, root, loads=[]):
+        '''
+        Constructor method. Takes the school's root directory and an
+        optional list of PeriodLoad objects.
+        '''
+        self.root = root
+        self.loads = list(loads)
+
+    @property
+    def classperiods(self):
+        '''
+        List of the ClassPeriods that were loaded, sorted by index file.
+        '''
+        return [load.classperiod for load in
+                sorted(self.loads, key=lambda load: load.index_filename)
+                if load.succeeded]
+
+    @property
+    def errors(self):
+        '''
+        Dictionary from index file to error message for each period
+        that could not be loaded.
+        '''
+        return {load.index_filename: load.error for load in self.loads
+                if not(load.succeeded)}
+
+    @property
+    def timings(self):
+        '''
+        Dictionary from index file to the seconds spent loading it.
+        '''
+        return {load.index_filename: load.seconds for load in self.loads}
+
+    def find_classperiod(self, description):
+        '''
+        This method returns the ClassPeriod with the given description,
+        or False if there is none.
+        '''
+        for cp in self.classperiods:
+            if cp.description == description:
+                return cp
+        return False
+
+    def __iter__(self):
+        '''
+        Method that iterates over the ClassPeriods that were loaded.
+        '''
+        return iter(self.classperiods)
+
+    def __len__(self):
+        '''
+        Method that returns the number of ClassPeriods that were loaded.
+        '''
+        return len(self.classperiods)
+
+    def __repr__(self):
+        '''
+        Method that returns a summary of the school's periods, with the
+        time each took to load and any errors.
+        '''
+        lines = [f"School at {self.root}: {len(self)} periods loaded, " +
+                 f"{len(self.errors)} failed"]
+        for load in sorted(self.loads, key=lambda load: load.index_filename):
+            lines.append("\t" + repr(load))
+        return "\n".join(lines)
+
+
+def find_period_index_files(root):
+    '''
+    This function takes the root directory of a school and returns a
+    sorted list of the index files of the class periods found in its
+    directory tree, relative to the root (e.g. "./Period_5/Period_5.txt").
+    A directory holds a class period if it contains an index file with
+    the same name as the directory.
+    '''
+    index_filenames = []
+    for directory, _, filenames in os.walk(root):
+        name = os.path.basename(directory)
+        if name + INDEX_EXTENSION in filenames:
+            index_filename = os.path.join(os.path.relpath(directory, root),
+                                          name + INDEX_EXTENSION)
+            index_filenames.append(os.path.join(
+                    '.', os.path.normpath(index_filename)))
+    return sorted(index_filenames)
+
+
+def period_location(index_filename):
+    '''
+    This function takes the name of a period's index file (relative to
+    the working directory) and returns a tuple of
+        (i) the directory holding the period's folder, to which the file
+            names in the index file are relative
+            (see cpm.write_classperiod_to_datafile()), and
+        (ii) the name of the index file relative to that directory
+             (e.g. "./Period_5/Period_5.txt").
+    '''
+    period_directory = os.path.dirname(os.path.abspath(index_filename))
+    return (os.path.dirname(period_directory),
+            os.path.join('.', os.path.basename(period_directory),
+                         os.path.basename(index_filename)))
+
+
+def load_period(index_filename):
+    '''
+    This function loads one class period (from its snapshot if possible;
+    see sc.load_classperiod()) and replays its journal (see
+    sj.replay_journal()), from the directory holding the period's folder
+    (see period_location()). The working directory is restored
+    afterwards.
+    It is run in a worker process by iter_load_school().
+    It returns a PeriodLoad, with an error message if the period could
+    not be loaded.
+    '''
+    start = time.perf_counter()
+    working_directory = os.getcwd()
+    directory, local_filename = period_location(index_filename)
+    try:
+        os.chdir(directory)
+        cp = sc.load_classperiod(local_filename)
+        sj.replay_journal(cp)
+    except Exception as error:  # Report any problem with this period
+        return PeriodLoad(index_filename,
+                          seconds=time.perf_counter() - start,
+                          error=f"{type(error).__name__}: {error}")
+    finally:
+        os.chdir(working_directory)
+    return PeriodLoad(index_filename, cp, time.perf_counter() - start)
+
+
+def iter_load_school(root, max_workers=None):
+    '''
+    This function loads every class period in a school's directory tree
+    (see find_period_index_files()) in a pool of max_workers processes
+    (by default, one per CPU).
+    It is a generator: it yields a PeriodLoad for each period as soon as
+    that period has finished loading (or failed to load).
+    '''
+    index_filenames = find_period_index_files(root)
+    if len(index_filenames) == 0:
+        return
+    with ProcessPoolExecutor(max_workers=max_workers,
+                             initializer=os.chdir,
+                             initargs=(os.path.abspath(root),)) as pool:
+        futures = {pool.submit(load_period, index_filename): index_filename
+                   for index_filename in index_filenames}
+        for future in as_completed(futures):
+            try:
+                yield future.result()
+            except Exception as error:  # e.g. a worker process died
+                yield PeriodLoad(futures[future],
+                                 error=f"{type(error).__name__}: {error}")
+
+
+def load_school(root, max_workers=None, on_period=None):
+    '''
+    This function loads every class period in a school's directory tree
+    (see iter_load_school()) and returns a School object holding them.
+    on_period is an optional function that is called with each PeriodLoad
+    as soon as its period has loaded, so that work on early periods can
+    start while the others are loading.
+    '''
+    school = School(root)
+    for load in iter_load_school(root, max_workers):
+        school.loads.append(load)
+        if on_period is not None:
+            on_period(load)
+    return school
+
+
+def write_period_reports(index_filename, only_changed=False):
+    '''
+    This function loads one class period (see load_period()) and writes
+    a grade report for each of its students (see cpm.generate_reports())
+    in the period's folder. If only_changed is True, only the reports
+    that would change are written (see rm.update_reports()).
+    It is run in a worker process by generate_school_reports().
+    It returns a tuple of the number of reports written and an error
+    message (None on success).
+    '''
+    load = load_period(index_filename)
+    if not(load.succeeded):
+        return 0, load.error
+    cp = load.classperiod
+    working_directory = os.getcwd()
+    try:
+        os.chdir(period_location(index_filename)[0])
+        if only_changed:
+            success, count = rm.update_reports(cp)
+        else:
+            success = cpm.generate_reports(cp)
+            count = len(cp.students_in_period)
+    except Exception as error:  # Report any problem with this period
+        return 0, f"{type(error).__name__}: {error}"
+    finally:
+        os.chdir(working_directory)
+    if not(success):
+        return count, "Not every report was written"
+    return count, None
+
+
+def generate_school_reports(root, max_workers=None, progress=None,
+                            only_changed=False):
+    '''
+    This function writes grade reports for every student in every class
+    period in a school's directory tree (see find_period_index_files()).
+    Each period is loaded and reported on by one of a pool of max_workers
+    processes (by default, one per CPU), so periods are reported on at
+    the same time. Reports are saved in each period's directory.
+    If only_changed is True, only the reports that would change since
+    they were last written are written (see rm.update_reports()).
+    progress is an optional function that is called as
+    progress(done, total, index_filename) after each period, in the
+    order of the index files, with the number of periods done so far.
+    The function returns a dictionary from index file to error message
+    for each period whose reports were not all written (so an empty
+    dictionary on success).
+    '''
+    index_filenames = find_period_index_files(root)
+    errors = {}
+    if len(index_filenames) == 0:
+        return errors
+    with ProcessPoolExecutor(max_workers=max_workers,
+                             initializer=os.chdir,
+                             initargs=(os.path.abspath(root),)) as pool:
+        futures = [pool.submit(write_period_reports, index_filename,
+                               only_changed)
+                   for index_filename in index_filenames]
+        for done, (index_filename, future) in enumerate(
+                zip(index_filenames, futures), 1):
+            try:
+                _, error = future.result()
+            except Exception as exception:  # e.g. a worker process died
+                error = f"{type(exception).__name__}: {exception}"
+            if error is not None:
+                errors[index_filename] = error
+            if progress is not None:
+                progress(done, len(index_filenames), index_filename)
+    return errors
+
+
+def iter_school_students(root):
+    '''
+    This function is a generator that reads every class period in a
+    school's directory tree (see find_period_index_files()) one student
+    at a time, in this process, and yields a (ClassPeriod, Student) pair
+    for each student (see cpm.iter_period_students()).
+    Unlike load_school(), it holds only one student's data at a time,
+    so it can be used on archives too large to load at once.
+    '''
+    for index_filename in find_period_index_files(root):
+        directory, local_filename = period_location(
+                os.path.join(root, index_filename))
+        yield from cpm.iter_period_students([local_filename], directory)
+
+
+# Unit tests
+if __name__ == "__main__":
+    import tempfile
+    import data_for_unit_testing as dfut
+    working_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            for description in ["Period 1", "Period 2", "Period 3"]:
+                cp = cpm.ClassPeriod(description,
+                                     dfut.sample_list_of_students(),
+                                     dfut.sample_list_of_lts())
+                assert cpm.write_classperiod_to_datafile(cp)
+            # Period 3 is missing a student file
+            os.remove(os.path.join("Period_3", "Period_3_5.studat"))
+            # Period 5 is one level down, with a score in its journal
+            os.mkdir("teacherA")
+            os.chdir("teacherA")
+            cp = cpm.ClassPeriod("Period 5", dfut.sample_list_of_students(),
+                                 dfut.sample_list_of_lts())
+            assert cpm.write_classperiod_to_datafile(cp)
+            sj.open_journal(cp)
+            sj.update_grade(cp, cp.find_student(2), 'LT01', 0)
+            sj.close_journal(cp)
+        finally:
+            os.chdir(working_directory)
+        # Test find_period_index_files()
+        print("Testing find_period_index_files():")
+        assert find_period_index_files(directory) == [
+                os.path.join('.', 'Period_1', 'Period_1.txt'),
+                os.path.join('.', 'Period_2', 'Period_2.txt'),
+                os.path.join('.', 'Period_3', 'Period_3.txt'),
+                os.path.join('.', 'teacherA', 'Period_5', 'Period_5.txt')]
+        assert find_period_index_files(os.path.join(directory,
+                                                    "Period_1")) == \
+            [os.path.join('.', 'Period_1.txt')]
+        print("Success!")
+        # Test load_school()
+        print("Testing load_school():")
+        streamed = []
+        school = load_school(directory, max_workers=2,
+                             on_period=streamed.append)
+        assert streamed == school.loads and len(streamed) == 4
+        assert len(school) == 3
+        assert [cp.description for cp in school] == ["Period 1", "Period 2",
+                                                     "Period 5"]
+        assert list(school.errors) == [
+                os.path.join('.', 'Period_3', 'Period_3.txt')]
+        assert 'Period_3_5.studat' in list(school.errors.values())[0]
+        assert len(school.timings) == 4
+        assert school.find_classperiod("Period 5").find_student(
+                2).scores['LT01'][-1] == 0  # Replayed from the journal
+        assert os.getcwd() == working_directory
+        assert load_period(os.path.join(directory, 'teacherA', 'Period_5',
+                                        'Period_5.txt')).succeeded
+        assert os.getcwd() == working_directory
+        cp = school.find_classperiod("Period 2")
+        assert cp.find_student(2).lastname == "Livingston"
+        assert cp.modified_students() == []
+        assert repr(cp) == repr(cpm.ClassPeriod(
+                "Period 2", dfut.sample_list_of_students(),
+                dfut.sample_list_of_lts()))
+        assert school.find_classperiod("Period 3") is False
+        assert "3 periods loaded, 1 failed" in repr(school)
+        # Test generate_school_reports()
+        print("Testing generate_school_reports():")
+        progress_calls = []
+        errors = generate_school_reports(
+                directory, max_workers=2,
+                progress=lambda done, total, index_filename:
+                    progress_calls.append((done, total)))
+        assert progress_calls == [(1, 4), (2, 4), (3, 4), (4, 4)]
+        assert list(errors) == [os.path.join('.', 'Period_3', 'Period_3.txt')]
+        for period in ["Period_1", "Period_2",
+                       os.path.join("teacherA", "Period_5")]:
+            assert len([name for name in
+                        os.listdir(os.path.join(directory, period))
+                        if name.endswith('grade_report.txt')]) == 10
+        # With only_changed, unchanged reports are not written again
+        assert generate_school_reports(directory, max_workers=2,
+                                       only_changed=True) == errors
+        os.chdir(directory)
+        try:
+            assert write_period_reports(
+                    os.path.join('.', 'Period_1', 'Period_1.txt'),
+                    only_changed=True) == (0, None)
+        finally:
+            os.chdir(working_directory)
+        # A worker process that dies is reported as an error, not raised
+        import school_module as scm
+        scm.write_period_reports = dfut.exit_process
+        errors = scm.generate_school_reports(directory, max_workers=1)
+        assert len(errors) == 4
+        assert all('BrokenProcessPool' in error for error in errors.values())
+        print("Success!")
+        # Test iter_school_students()
+        print("Testing iter_school_students():")
+        os.remove(os.path.join(directory, "Period_3", "Period_3.txt"))
+        streamed_sids = [(cp.description, student.sid) for cp, student in
+                         iter_school_students(directory)]
+        assert len(streamed_sids) == 30
+        assert streamed_sids[10] == ("Period 2", 1)
+        assert streamed_sids[20] == ("Period 5", 1)
+        assert load_school(os.path.join(directory, "Period_3",
+                                        "nowhere")).loads == []
+    print("Success!\n\n")
+    print("All tests were successful.")
@@ -0,0 +1,459 @@
+# -*- coding: utf-8 -*-
+"""
+Description: score_journal module.
+This module keeps an append-only journal of the changes made to a
+ClassPeriod (new scores, new learning targets and new students), so that
+each change reaches the disk as soon as it is made without rewriting the
+class period's data files.
+
+The journal for a class period is kept in its directory (e.g.
+"./Period_5/Period_5.journal"). Each change is appended to it as one
+line and flushed to disk. When a class period is loaded (see
+load_classperiod()), any changes in its journal are replayed on top of
+the data files. Every so often (and when the user saves), the journal is
+compacted: the changed data files are written and the journal is emptied.
+
+Each line records the result of a change rather than the change itself
+(e.g. a student's whole score history on an LT, not just the new score),
+so replaying a journal on data files that already include some of its
+changes gives the same class period. A line that was cut short (e.g. by
+a crash mid-write) fails its checksum and is dropped, along with
+anything after it.
+"""
+
+# import modules
+import os
+import zlib
+import classperiod_module as cpm
+import lt_module as ltm
+import student_module as stu
+import sbg_data_methods as dm
+import snapshot_cache as sc
+
+# Global variables
+JOURNAL_EXTENSION = '.journal'
+# Number of changes after which the journal is compacted
+DEFAULT_COMPACT_EVERY = 200
+SEPARATOR = ':::'
+# Kinds of record
+HISTORY = 'H'  # A student's score history on an LT
+REMOVAL = 'R'  # A student no longer has scores on an LT
+NEW_LT = 'L'  # A learning target was added to the class period
+NEW_STUDENT = 'S'  # A student was added to the class period
+
+
+class ScoreJournal:
+    '''
+    Class for an open journal file belonging to a ClassPeriod.
+    compact_every is the number of records after which the journal is
+    compacted (see compact()), or None to compact only when asked.
+    '''
+
+    def __init__(self, filename, compact_every=DEFAULT_COMPACT_EVERY):
+        '''
+        Constructor method. Takes the name of the journal file, which
+        must hold only complete records (see read_journal()).
+        '''
+        self.filename = filename
+        self.compact_every = compact_every
+        self.record_count = len(read_journal(filename)[0])
+        self.file = open(filename, 'a', encoding='utf-8', newline='\n')
+
+    def append_record(self, *fields):
+        '''
+        This method appends a record to the journal and flushes it to
+        disk. The fields are strings, the first giving the kind of record.
+        It returns True on success, False on failure.
+        '''
+        payload = SEPARATOR.join(fields)
+        if '\n' in payload:
+            print("Error: cannot journal data containing a newline.")
+            return False
+        checksum = zlib.crc32(payload.encode('utf-8'))
+        try:
+            self.file.write(f"{checksum:08x} {payload}\n")
+            self.file.flush()
+            os.fsync(self.file.fileno())
+        except OSError:
+            print(f"Could not write to journal {self.filename}.")
+            return False
+        self.record_count += 1
+        return True
+
+    def clear(self):
+        '''
+        This method empties the journal (once its changes are saved in
+        the data files).
+        '''
+        self.file.truncate(0)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.record_count = 0
+
+    def close(self):
+        '''
+        This method closes the journal file.
+        '''
+        self.file.close()
+
+    def __repr__(self):
+        '''
+        Method that returns a string representation of the journal.
+        '''
+        return f"ScoreJournal({self.filename!r}, {self.record_count} records)"
+
+
+def journal_filename(cp):
+    '''
+    This function returns the name of the journal file for a ClassPeriod,
+    in the directory that cpm.write_classperiod_to_datafile() saves it to.
+    '''
+    stem = cpm.replace_punctuation_with_underscores(cp.description)
+    return os.path.join('.', stem, stem + JOURNAL_EXTENSION)
+
+
+def parse_record(line):
+    '''
+    This function takes a line read from a journal file and returns its
+    record as a list of fields, or False if the line is incomplete or
+    fails its checksum.
+    '''
+    if not(line.endswith('\n')) or line[8:9] != ' ':
+        return False
+    payload = line[9:-1]
+    try:
+        checksum = int(line[:8], 16)
+    except ValueError:
+        return False
+    if checksum != zlib.crc32(payload.encode('utf-8')):
+        return False
+    return payload.split(SEPARATOR)
+
+
+def read_journal(filename):
+    '''
+    This function reads a journal file and returns a tuple of
+        (i) a list of its records (see parse_record()), and
+        (ii) the length in bytes of the part of the file holding them.
+    Reading stops at the first incomplete or damaged record.
+    A missing journal has no records.
+    '''
+    records = []
+    length = 0
+    try:
+        with open(filename, 'rb') as journal_file:
+            for line in journal_file:
+                try:
+                    record = parse_record(line.decode('utf-8'))
+                except UnicodeDecodeError:
+                    record = False
+                if not(record):
+                    print(f"Warning: ignoring damaged end of {filename}")
+                    break
+                records.append(record)
+                length += len(line)
+    except FileNotFoundError:
+        pass
+    return records, length
+
+
+def apply_record(cp, record):
+    '''
+    This function applies a journal record to a ClassPeriod.
+    Applying a record again has no further effect.
+    The function returns True on success, False if the record could
+    not be applied.
+    '''
+    kind = record[0]
+    try:
+        if kind == NEW_LT:
+            new_lt = ltm.build_lt_list_from_data(
+                    SEPARATOR.join(record[1:]))[0]
+            if not(cp.has_lt_with_label(new_lt.lt_label)):
+                cp.course_lts.append(new_lt)
+            return True
+        if kind == NEW_STUDENT:
+            data_str = SEPARATOR.join(record[1:])
+            new_student = stu.make_scoreless_student_from_data(data_str)
+            if not(new_student):
+                return False
+            if not(cp.find_student(new_student.sid)):
+                new_student.scores = dm.build_scores_dict_from_data(data_str)
+                cp.students_in_period.append(new_student)
+            return True
+        sid, lt_label = int(record[1]), record[2]
+        student = cp.find_student(sid)
+        if not(student):
+            return False
+        if kind == HISTORY:
+            history = dm.scores_from_tokens(record[3])
+            if lt_label not in student.scores or \
+                    list(student.scores[lt_label]) != history:
+                stu.fix_grade_history(student, lt_label, history)
+            return True
+        if kind == REMOVAL:
+            if lt_label in student.scores:
+                stu.remove_lt(student, lt_label)
+            return True
+    except (ValueError, IndexError, AssertionError):
+        pass
+    return False
+
+
+def replay_journal(cp, filename=None):
+    '''
+    This function applies the records in a ClassPeriod's journal
+    (by default, the file named by journal_filename()) to the ClassPeriod.
+    Students changed by the journal are marked as modified.
+    The function returns the number of records replayed.
+    '''
+    if filename is None:
+        filename = journal_filename(cp)
+    records = read_journal(filename)[0]
+    for record in records:
+        if not(apply_record(cp, record)):
+            print("Warning: could not replay journal record " +
+                  SEPARATOR.join(record))
+    return len(records)
+
+
+def open_journal(cp, compact_every=DEFAULT_COMPACT_EVERY):
+    '''
+    This function opens a ClassPeriod's journal so that changes made
+    through this module are recorded in it, and stores it as cp.journal.
+    Any damaged record at the end of the journal is removed.
+    The journal's records should already have been replayed
+    (see replay_journal()).
+    The function returns the ScoreJournal.
+    '''
+    filename = journal_filename(cp)
+    os.makedirs(os.path.dirname(filename), exist_ok=True)
+    length = read_journal(filename)[1]
+    if os.path.exists(filename) and os.path.getsize(filename) != length:
+        with open(filename, 'r+b') as journal_file:
+            journal_file.truncate(length)
+    cp.journal = ScoreJournal(filename, compact_every)
+    return cp.journal
+
+
+def close_journal(cp):
+    '''
+    This function closes a ClassPeriod's journal, if it has one.
+    Later changes are not recorded.
+    '''
+    if cp.journal is not None:
+        cp.journal.close()
+        cp.journal = None
+
+
+def compact(cp):
+    '''
+    This function saves a ClassPeriod's changes to its data files
+    (see cpm.write_classperiod_to_datafile(), which writes only the files
+    that changed) and its snapshot, and then empties its journal.
+    If saving fails, the journal is kept.
+    The function returns True on success, False on failure.
+    '''
+    if not(cpm.write_classperiod_to_datafile(cp)):
+        return False
+    # The files now match cp, so the next launch can skip parsing
+    sc.write_snapshot(cp)
+    if cp.journal is not None:
+        cp.journal.clear()
+    return True
+
+
+def record(cp, *fields):
+    '''
+    This function appends a record to a ClassPeriod's journal (if it has
+    one open), compacting the journal if it has grown long enough.
+    It returns True on success, False on failure.
+    '''
+    journal = cp.journal
+    if journal is None:
+        return True
+    if not(journal.append_record(*fields)):
+        return False
+    if journal.compact_every is not None and \
+            journal.record_count >= journal.compact_every:
+        return compact(cp)
+    return True
+
+
+def record_history(cp, student, lt_label):
+    '''
+    This function records a student's current scores on an LT
+    in a ClassPeriod's journal.
+    It returns True on success, False on failure.
+    '''
+    if lt_label not in student.scores:
+        return record(cp, REMOVAL, str(student.sid), lt_label)
+    history = ", ".join(str(score) for score in student.scores[lt_label])
+    return record(cp, HISTORY, str(student.sid), lt_label, history)
+
+
+def update_grade(cp, student, lt_label, new_score):
+    '''
+    This function is like stu.update_grade(), but also records the change
+    in the journal of the ClassPeriod cp, which the student belongs to.
+    It returns the updated Student object.
+    '''
+    stu.update_grade(student, lt_label, new_score)
+    record_history(cp, student, lt_label)
+    return student
+
+
+def fix_grade_history(cp, student, lt_label, score_history):
+    '''
+    This function is like stu.fix_grade_history(), but also records the
+    change in the journal of the ClassPeriod cp, which the student
+    belongs to.
+    It returns the updated Student object.
+    '''
+    stu.fix_grade_history(student, lt_label, score_history)
+    record_history(cp, student, lt_label)
+    return student
+
+
+def add_lt(cp, student, lt_label, score):
+    '''
+    This function is like stu.add_lt(), but also records the change in
+    the journal of the ClassPeriod cp, which the student belongs to.
+    It returns the updated Student object.
+    '''
+    stu.add_lt(student, lt_label, score)
+    record_history(cp, student, lt_label)
+    return student
+
+
+def remove_lt(cp, student, lt_label):
+    '''
+    This function is like stu.remove_lt(), but also records the change
+    in the journal of the ClassPeriod cp, which the student belongs to.
+    It returns the updated Student object.
+    '''
+    stu.remove_lt(student, lt_label)
+    record_history(cp, student, lt_label)
+    return student
+
+
+def add_course_lt(cp, new_lt):
+    '''
+    This function adds a LearningTarget to a ClassPeriod's LTs and records
+    the change in its journal.
+    It returns the updated ClassPeriod.
+    '''
+    cp.course_lts.append(new_lt)
+    record(cp, NEW_LT, new_lt.string_for_datafile())
+    return cp
+
+
+def add_student(cp, new_student):
+    '''
+    This function adds a Student to a ClassPeriod and records the change
+    in its journal.
+    It returns the updated ClassPeriod.
+    '''
+    cp.students_in_period.append(new_student)
+    record(cp, NEW_STUDENT, str(new_student))
+    return cp
+
+
+def load_classperiod(index_filename, compact_every=DEFAULT_COMPACT_EVERY,
+                     load_mode='sequential'):
+    '''
+    This function returns the ClassPeriod whose index file is
+    index_filename (see sc.load_classperiod()), with the changes in its
+    journal replayed and its journal open for further changes.
+    '''
+    cp = sc.load_classperiod(index_filename, load_mode=load_mode)
+    replay_journal(cp)
+    open_journal(cp, compact_every)
+    return cp
+
+
+# Unit tests
+if __name__ == "__main__":
+    import tempfile
+    import data_for_unit_testing as dfut
+    working_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            cp = cpm.ClassPeriod("Period X Grades",
+                                 dfut.sample_list_of_students(),
+                                 dfut.sample_list_of_lts())
+            assert cpm.write_classperiod_to_datafile(cp)
+            index_filename = cp.saved_index_filename
+            # Test parse_record()
+            print("Testing parse_record():")
+            line = f"{zlib.crc32(b'H:::1:::LT01:::4'):08x} H:::1:::LT01:::4\n"
+            assert parse_record(line) == ['H', '1', 'LT01', '4']
+            assert parse_record(line[:-1]) is False  # Cut short
+            assert parse_record(line.replace('4\n', '3\n')) is False
+            print("Success!")
+            # Test that changes are journaled and replayed
+            print("Testing update_grade() and replay_journal():")
+            cp = load_classperiod(index_filename)
+            assert cp.journal.record_count == 0
+            student = cp.find_student(2)
+            update_grade(cp, student, 'LT01', 2.5)
+            update_grade(cp, student, 'LT01', 3.5)
+            add_course_lt(cp, ltm.LearningTarget('LT11', 'Brief', 'Long'))
+            new_student = stu.Student(42, "Lovelace", "Ada", "she")
+            add_student(cp, new_student)
+            add_lt(cp, new_student, 'LT11', 4)
+            remove_lt(cp, cp.find_student(3), 'LT02')
+            assert cp.journal.record_count == 6
+            expected = repr(cp)
+            expected_students = [str(s) for s in cp.students_in_period]
+            # A crash now loses nothing
+            cp.journal.close()
+            reloaded_cp = load_classperiod(index_filename)
+            assert repr(reloaded_cp) == expected
+            assert [str(s) for s in reloaded_cp.students_in_period] == \
+                expected_students
+            assert [student.sid for student in
+                    reloaded_cp.modified_students()] == [2, 3, 42]
+            # Replaying the same journal again changes nothing
+            assert replay_journal(reloaded_cp) == 6
+            assert repr(reloaded_cp) == expected
+            print("Success!")
+            # A record cut short is dropped
+            print("Testing a damaged journal:")
+            reloaded_cp.journal.close()
+            with open(journal_filename(cp), 'a') as journal_file:
+                journal_file.write("0123abcd H:::2:::LT0")
+            reloaded_cp = load_classperiod(index_filename)
+            assert repr(reloaded_cp) == expected
+            assert os.path.getsize(journal_filename(cp)) == \
+                read_journal(journal_filename(cp))[1]
+            update_grade(reloaded_cp, reloaded_cp.find_student(1), 'LT02', 4)
+            assert len(read_journal(journal_filename(cp))[0]) == 7
+            print("Success!")
+            # Test compact()
+            print("Testing compact():")
+            assert compact(reloaded_cp)
+            assert reloaded_cp.journal.record_count == 0
+            assert os.path.getsize(journal_filename(cp)) == 0
+            assert reloaded_cp.modified_students() == []
+            expected_students = [str(s) for s in
+                                 reloaded_cp.students_in_period]
+            reloaded_cp.journal.close()
+            compacted_cp = load_classperiod(index_filename, compact_every=2)
+            assert [str(s) for s in compacted_cp.students_in_period] == \
+                expected_students
+            # Compaction also happens every compact_every records
+            update_grade(compacted_cp, compacted_cp.find_student(1),
+                         'LT01', 4)
+            assert compacted_cp.journal.record_count == 1
+            update_grade(compacted_cp, compacted_cp.find_student(1),
+                         'LT01', 3)
+            assert compacted_cp.journal.record_count == 0
+            assert compacted_cp.modified_students() == []
+            close_journal(compacted_cp)
+            assert compacted_cp.journal is None
+        finally:
+            os.chdir(working_directory)
+    print("Success!\n\n")
+    print("All tests were successful.")
@@ -0,0 +1,568 @@
+# -*- coding: utf-8 -*-
+"""
+Description: scorebook_module.
+This module contains the ScoreBook class, a compact store for one
+student's scores, its base class ScoreMapping, and the ScoreHistory
+class, a list-like view of the scores on one learning target.
+
+Valid scores are multiples of 0.5 (plus the exempt code, -1), so each
+score is stored as a small integer (twice the score) in an array
+rather than as a Python int or float object. Only scores in
+ngog.DEFAULT_VALID_SCORES can be stored.
+A ScoreBook behaves like the dictionary {lt_label: [score1, score2, ...]}
+that it replaces: it can be indexed, iterated, printed and compared
+with a dictionary, and histories can be appended to.
+"""
+
+# import modules
+from abc import abstractmethod
+from array import array
+from collections.abc import MutableMapping
+from functools import lru_cache
+import sys
+import nitty_gritty_of_grading as ngog
+
+# Global variables
+# Scores that are counted in ScoreBook.recent_counts(), in code order
+COUNTED_SCORES = [0, 0.5, 1, 1.5, 2, 2.5, 3, 3.5, 4]
+EXEMPT_SCORE_CODE = ngog.DEFAULT_X_CODE * 2
+# Number of orders of LT labels whose index is kept (see label_index())
+LABEL_INDEX_CACHE_SIZE = 4096
+
+
+def encode_score(score):
+    '''
+    This function converts a valid score (see ngog.DEFAULT_VALID_SCORES)
+    to the small integer used to store it, i.e. twice the score.
+    It raises a ValueError if the score is not valid.
+    '''
+    if not ngog.score_is_valid(score):
+        raise ValueError(f"Invalid score {score}")
+    return int(score * 2)
+
+
+def decode_score(code):
+    '''
+    This function reverses encode_score(). Whole-number scores are
+    returned as ints, and others as floats (e.g. 6 -> 3, 5 -> 2.5).
+    '''
+    if code % 2 == 0:
+        return code // 2
+    return code / 2
+
+
+# Codes of every valid score (see encode_score())
+VALID_SCORE_CODES = {encode_score(score)
+                     for score in ngog.DEFAULT_VALID_SCORES}
+
+
+@lru_cache(maxsize=LABEL_INDEX_CACHE_SIZE)
+def label_index(labels):
+    '''
+    This function takes a tuple of LT labels and returns a tuple of
+    (labels, positions), where positions is a dictionary from each label
+    to its position in labels.
+    The result is cached, so ScoreBooks whose LTs were added in the same
+    order (as in most of a class period) share one index. Neither the
+    tuple nor the dictionary may be changed.
+    '''
+    labels = tuple(sys.intern(lt_label) for lt_label in labels)
+    return labels, {lt_label: index for index, lt_label in enumerate(labels)}
+
+
+class ScoreMapping(MutableMapping):
+    '''
+    Abstract base class for objects that hold one student's scores and
+    behave like the dictionary {lt_label: [score1, score2, ...]}.
+    Subclasses store the scores as codes (see encode_score()) and must
+    provide history_codes(), append_score() and recent_counts(), as well
+    as the abstract methods of MutableMapping (__setitem__, __delitem__,
+    __iter__ and __len__), and a changes attribute counting the changes
+    made to the scores (used to tell whether a Student has been modified).
+    '''
+    __slots__ = ()
+
+    @abstractmethod
+    def history_codes(self, lt_label):
+        '''
+        This method returns an array of the score codes on an LT.
+        It raises a KeyError if the LT has no scores.
+        '''
+
+    @abstractmethod
+    def append_score(self, lt_label, score):
+        '''
+        This method appends a score to the history of an existing LT.
+        '''
+
+    @abstractmethod
+    def recent_counts(self):
+        '''
+        This method returns a histogram of the most recent non-exempt
+        scores, in the form returned by ngog.score_histogram().
+        '''
+
+    def most_recent_scores(self):
+        '''
+        This method returns a dictionary from each LT label to the most
+        recent score on that LT (including exempt scores).
+        '''
+        recent_scores = {}
+        for lt_label in self:
+            codes = self.history_codes(lt_label)
+            if len(codes) > 0:
+                recent_scores[lt_label] = decode_score(codes[-1])
+        return recent_scores
+
+    def score_histories(self):
+        '''
+        This method returns a dictionary from each LT label to the list
+        of scores on that LT, like dict(self) but with plain lists.
+        '''
+        return {lt_label: [decode_score(code) for code in
+                           self.history_codes(lt_label)]
+                for lt_label in self}
+
+    def __getitem__(self, lt_label):
+        '''
+        Method that returns a ScoreHistory view of the scores on an LT.
+        '''
+        if lt_label not in self:
+            raise KeyError(lt_label)
+        return ScoreHistory(self, lt_label)
+
+    def pop(self, lt_label, *default):
+        '''
+        Method that removes an LT and returns its scores as a list
+        (or default, if given and the LT is missing), like dict.pop().
+        '''
+        if lt_label not in self and len(default) > 0:
+            return default[0]
+        history = list(self[lt_label])
+        del self[lt_label]
+        return history
+
+    def popitem(self):
+        '''
+        Method that removes the last LT and returns a tuple of its label
+        and its scores as a list.
+        '''
+        if len(self) == 0:
+            raise KeyError('popitem(): no scores')
+        lt_label = list(self)[-1]
+        return lt_label, self.pop(lt_label)
+
+    def __repr__(self):
+        '''
+        Method that returns the same string as the equivalent dictionary,
+        e.g. "{'LT01': [1, 2, 4], 'LT02': [2.5]}"
+        '''
+        return repr(self.score_histories())
+
+
+class ScoreBook(ScoreMapping):
+    '''
+    Class to hold all of one student's scores compactly.
+    Specifically:
+        labels, a tuple of LT labels in the order they were added,
+        positions, a dictionary from each LT label to its position in
+            labels, so that an LT is found without a scan. The labels
+            and positions are shared with other ScoreBooks holding the
+            same LTs (see label_index()), so they are replaced, never
+            changed,
+        starts, an array holding the position in codes of the first
+            score on each LT,
+        lengths, an array holding the number of scores on each LT,
+        codes, an array holding every score (see encode_score()).
+            Each LT's scores are kept together, but a score appended to
+            an LT that is not at the end of codes moves that LT's scores
+            to the end, leaving their old place unused (see spare),
+        spare, the number of unused places in codes. When more than half
+            of codes is unused, the scores are packed again
+            (see compact()),
+        counts, an array holding the number of LTs whose most recent
+            score is each of COUNTED_SCORES. It is kept up to date on
+            every change, so grading never needs to scan the scores.
+        changes, the number of changes made since the ScoreBook was
+            created.
+    '''
+    __slots__ = ('labels', 'positions', 'starts', 'lengths', 'codes',
+                 'spare', 'counts', 'changes')
+
+    def __init__(self, scores_dict={}):
+        '''
+        Constructor method. Takes an optional dictionary (or other
+        mapping) of scores to copy.
+        '''
+        self.labels, self.positions = label_index(())
+        self.starts = array('I')
+        self.lengths = array('H')
+        self.codes = array('b')
+        self.spare = 0
+        self.counts = array('H', bytes(2 * len(COUNTED_SCORES)))
+        self.changes = 0
+        for lt_label, history in scores_dict.items():
+            self[lt_label] = history
+        self.changes = 0  # Copying the scores does not count as changes
+
+    def __locate(self, lt_label):
+        '''
+        This method returns a tuple of the position of an LT in
+        self.labels and the position of its first score in self.codes.
+        It raises a KeyError if the LT has no scores.
+        '''
+        index = self.positions[lt_label]
+        return index, self.starts[index]
+
+    def __count_recent(self, code, change):
+        '''
+        This method adds change (1 or -1) to the count for a most
+        recent score code. Exempt scores are not counted.
+        '''
+        if code != EXEMPT_SCORE_CODE:
+            self.counts[code] += change
+
+    def __store(self, index, codes):
+        '''
+        This method replaces the score codes of the LT at a position in
+        self.labels. The codes are written in place if they fit (or if
+        the LT is at the end of self.codes), and otherwise after every
+        other score.
+        '''
+        start = self.starts[index]
+        length = self.lengths[index]
+        if start + length == len(self.codes):
+            self.codes[start:] = codes
+        elif len(codes) <= length:
+            self.codes[start:start + len(codes)] = codes
+            self.spare += length - len(codes)
+        else:
+            self.spare += length
+            self.starts[index] = len(self.codes)
+            self.codes.extend(codes)
+        self.lengths[index] = len(codes)
+        if self.spare > len(self.codes) // 2:
+            self.compact()
+
+    def compact(self):
+        '''
+        This method packs the score codes so that there are no unused
+        places and the LTs' scores are in the order of self.labels.
+        '''
+        codes = array('b')
+        for index, length in enumerate(self.lengths):
+            start = self.starts[index]
+            self.starts[index] = len(codes)
+            codes.extend(self.codes[start:start + length])
+        self.codes = codes
+        self.spare = 0
+
+    def stored_form(self):
+        '''
+        This method returns the ScoreBook's scores as a tuple of
+        (labels, lengths, codes), with the codes packed in the order of
+        the labels (see compact()), as read by scorebook_from_codes().
+        '''
+        self.compact()
+        return self.labels, self.lengths, self.codes
+
+    def history_codes(self, lt_label):
+        '''
+        This method returns an array of the score codes on an LT.
+        '''
+        index, start = self.__locate(lt_label)
+        return self.codes[start:start + self.lengths[index]]
+
+    def most_recent(self, lt_label):
+        '''
+        This method returns the most recent score on an LT,
+        or None if the LT has an empty history.
+        '''
+        index, start = self.__locate(lt_label)
+        if self.lengths[index] == 0:
+            return None
+        return decode_score(self.codes[start + self.lengths[index] - 1])
+
+    def most_recent_scores(self):
+        '''
+        This method returns a dictionary from each LT label to the most
+        recent score on that LT (including exempt scores), in one pass.
+        '''
+        recent_scores = {}
+        for lt_label, start, length in zip(self.labels, self.starts,
+                                           self.lengths):
+            if length > 0:
+                recent_scores[lt_label] = decode_score(
+                        self.codes[start + length - 1])
+        return recent_scores
+
+    def score_histories(self):
+        '''
+        This method returns a dictionary from each LT label to the list
+        of scores on that LT, in one pass.
+        '''
+        return {lt_label: [decode_score(code) for code in
+                           self.codes[start:start + length]]
+                for lt_label, start, length in zip(self.labels, self.starts,
+                                                   self.lengths)}
+
+    def append_score(self, lt_label, score):
+        '''
+        This method appends a score to the history of an existing LT.
+        '''
+        code = encode_score(score)
+        index, start = self.__locate(lt_label)
+        end = start + self.lengths[index]
+        if self.lengths[index] > 0:
+            self.__count_recent(self.codes[end - 1], -1)
+        if end == len(self.codes):
+            self.codes.append(code)
+            self.lengths[index] += 1
+        else:
+            history = self.codes[start:end]
+            history.append(code)
+            self.__store(index, history)
+        self.__count_recent(code, 1)
+        self.changes += 1
+
+    def recent_counts(self):
+        '''
+        This method returns a histogram of the most recent non-exempt
+        scores, in the form returned by ngog.score_histogram().
+        '''
+        return {decode_score(code): count
+                for code, count in enumerate(self.counts) if count}
+
+    def __setitem__(self, lt_label, history):
+        '''
+        Method that replaces (or adds) the scores on an LT.
+        '''
+        codes = array('b', [encode_score(score) for score in history])
+        if lt_label in self.positions:
+            index, start = self.__locate(lt_label)
+            if self.lengths[index] > 0:
+                self.__count_recent(
+                        self.codes[start + self.lengths[index] - 1], -1)
+            self.__store(index, codes)
+        else:
+            self.labels, self.positions = label_index(self.labels +
+                                                      (lt_label,))
+            self.starts.append(len(self.codes))
+            self.lengths.append(len(codes))
+            self.codes.extend(codes)
+        if len(codes) > 0:
+            self.__count_recent(codes[-1], 1)
+        self.changes += 1
+
+    def __delitem__(self, lt_label):
+        '''
+        Method that removes an LT and its scores.
+        '''
+        index, start = self.__locate(lt_label)
+        end = start + self.lengths[index]
+        if self.lengths[index] > 0:
+            self.__count_recent(self.codes[end - 1], -1)
+        if end == len(self.codes):
+            del self.codes[start:]
+        else:
+            self.spare += self.lengths[index]
+        del self.starts[index]
+        del self.lengths[index]
+        self.labels, self.positions = label_index(self.labels[:index] +
+                                                  self.labels[index + 1:])
+        if self.spare > len(self.codes) // 2:
+            self.compact()
+        self.changes += 1
+
+    def __contains__(self, lt_label):
+        '''
+        Method that returns True if the LT has scores in this ScoreBook.
+        '''
+        return lt_label in self.positions
+
+    def __iter__(self):
+        '''
+        Method that iterates over LT labels in the order they were added.
+        '''
+        return iter(self.labels)
+
+    def __len__(self):
+        '''
+        Method that returns the number of LTs with scores.
+        '''
+        return len(self.labels)
+
+
+def scorebook_from_codes(labels, lengths, codes):
+    '''
+    This function builds a ScoreBook directly from its stored form
+    (a list of LT labels, and arrays of history lengths and score codes
+    packed in the order of the labels, as returned by
+    ScoreBook.stored_form()), without re-encoding each score.
+    It raises a ValueError if the arrays are inconsistent.
+    '''
+    book = ScoreBook()
+    book.labels, book.positions = label_index(tuple(labels))
+    book.lengths = array('H', lengths)
+    book.codes = array('b', codes)
+    if len(book.labels) != len(book.lengths) or \
+            sum(book.lengths) != len(book.codes):
+        raise ValueError("Score codes do not match history lengths")
+    if len(book.positions) != len(book.labels):
+        raise ValueError("Repeated LT label")
+    if not(set(book.codes) <= VALID_SCORE_CODES):
+        raise ValueError("Invalid score code")
+    end = 0
+    for length in book.lengths:
+        book.starts.append(end)
+        end += length
+        if length > 0:
+            code = book.codes[end - 1]
+            if code != EXEMPT_SCORE_CODE:
+                book.counts[code] += 1
+    return book
+
+
+class ScoreHistory:
+    '''
+    Class for a list-like view of a student's scores on one LT,
+    most recent last. Changes made through the view (e.g. append())
+    are made to the underlying ScoreMapping (book).
+    '''
+    __slots__ = ('book', 'lt_label')
+
+    def __init__(self, book, lt_label):
+        '''
+        Constructor method
+        '''
+        self.book = book
+        self.lt_label = lt_label
+
+    def __iter__(self):
+        '''
+        Method that iterates over the scores, oldest first.
+        '''
+        return map(decode_score, self.book.history_codes(self.lt_label))
+
+    def __len__(self):
+        '''
+        Method that returns the number of scores.
+        '''
+        return len(self.book.history_codes(self.lt_label))
+
+    def __getitem__(self, index):
+        '''
+        Method that returns a score, or a list of scores for a slice.
+        '''
+        if isinstance(index, slice):
+            return list(self)[index]
+        return decode_score(self.book.history_codes(self.lt_label)[index])
+
+    def __eq__(self, other):
+        '''
+        Method that compares the scores with another ScoreHistory,
+        list or tuple.
+        '''
+        if isinstance(other, (ScoreHistory, list, tuple)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        '''
+        Method that returns the same string as the equivalent list.
+        '''
+        return repr(list(self))
+
+    def append(self, score):
+        '''
+        Method that adds a new most recent score.
+        '''
+        self.book.append_score(self.lt_label, score)
+
+
+# Unit tests
+if __name__ == "__main__":
+    # Test encode_score() and decode_score()
+    print("Testing encode_score() and decode_score():")
+    for score in ngog.DEFAULT_VALID_SCORES:
+        assert decode_score(encode_score(score)) == score
+        assert type(decode_score(encode_score(score))) == type(score)
+    assert decode_score(encode_score(3.0)) == 3
+    for score in [2.7, 5, -0.5]:
+        try:
+            encode_score(score)
+            assert False, f"{score} should not be storable"
+        except ValueError:
+            pass
+    print("Success!")
+    # Test ScoreBook
+    print("Testing ScoreBook:")
+    scores_dict = {'LT01': [1, 2, 4], 'LT02': [2.5], 'LT03': [-1]}
+    book = ScoreBook(scores_dict)
+    assert book == scores_dict
+    assert str(book) == str(scores_dict)
+    assert list(book) == ['LT01', 'LT02', 'LT03']
+    assert book['LT01'][-1] == 4 and book['LT01'][:-1] == [1, 2]
+    assert 'LT02' in book and 'LT04' not in book
+    assert book.recent_counts() == {4: 1, 2.5: 1}  # Exempt not counted
+    assert book.most_recent_scores() == {'LT01': 4, 'LT02': 2.5, 'LT03': -1}
+    assert book.score_histories() == {key: list(value) for key, value in
+                                      book.items()}
+    assert ScoreMapping.score_histories(book) == book.score_histories()
+    book['LT02'].append(3.5)
+    assert book['LT02'] == [2.5, 3.5]
+    assert book.recent_counts() == {4: 1, 3.5: 1}
+    book['LT01'] = [0]
+    book['LT04'] = [3]
+    del book['LT03']
+    assert book == {'LT01': [0], 'LT02': [2.5, 3.5], 'LT04': [3]}
+    assert book.recent_counts() == {0: 1, 3.5: 1, 3: 1}
+    assert book.changes == 4
+    assert book.pop('LT02') == [2.5, 3.5]
+    assert book.changes == 5
+    assert book.recent_counts() == ngog.histogram_of_most_recent_scores(book)
+    assert ScoreBook() == {} and str(ScoreBook()) == '{}'
+    try:
+        ScoreMapping()
+        assert False, "ScoreMapping should be abstract"
+    except TypeError:
+        pass
+    # Appending to an LT that is not at the end moves its scores there
+    book = ScoreBook({'LT01': [1, 2], 'LT02': [3], 'LT03': [4, 4]})
+    book.append_score('LT01', 3)
+    assert book.starts[0] == 5 and book.spare == 2
+    assert book == {'LT01': [1, 2, 3], 'LT02': [3], 'LT03': [4, 4]}
+    book.append_score('LT01', 4)  # Now at the end, so appended in place
+    assert book.starts[0] == 5 and len(book.codes) == 9
+    book['LT03'] = [1]  # Shorter, so overwritten in place
+    assert book.spare == 3 and book['LT03'] == [1]
+    del book['LT02']
+    assert book.spare == 4 and book.positions == {'LT01': 0, 'LT03': 1}
+    assert book.positions is ScoreBook({'LT01': [], 'LT03': []}).positions
+    book['LT02'] = []
+    del book['LT03']  # More than half unused, so packed again
+    assert book.spare == 0 and list(book.codes) == [2, 4, 6, 8]
+    assert book.positions == {'LT01': 0, 'LT02': 1}
+    assert book == {'LT01': [1, 2, 3, 4], 'LT02': []}
+    assert book.recent_counts() == {4: 1}
+    # Test scorebook_from_codes()
+    book.append_score('LT01', 2)
+    book.append_score('LT02', 0)
+    copied_book = scorebook_from_codes(*book.stored_form())
+    assert copied_book == book and copied_book.counts == book.counts
+    assert list(copied_book.starts) == [0, 5]
+    try:
+        scorebook_from_codes(['LT01', 'LT01'], array('H', [1, 1]),
+                             array('b', [1, 2]))
+        assert False, "Repeated labels should raise a ValueError"
+    except ValueError:
+        pass
+    try:
+        book['LT05']
+        assert False, "LT05 should not be found"
+    except KeyError:
+        pass
+    print("Success!\n\n")
+    print("All tests were successful.")
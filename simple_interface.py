@@ -10,10 +10,12 @@ for a few sbgrader functions
 
 # import modules
 import classperiod_module as cpm
+import report_manifest as rm
 import sbg_data_methods as dm
 import lt_module as ltm
 import student_module as stu
 import nitty_gritty_of_grading as ngog
+import score_journal as sj
 import sys
 import synergy_to_sbg as synergy
 from os import path
@@ -23,13 +25,21 @@ DEFAULT_CP_DESCRIPTION = 'sample_classperiod'
 DEFAULT_OVERALL_KEYWORD = 'ignore'
 
 
-def load_sample_classperiod(description=DEFAULT_CP_DESCRIPTION):
+def load_sample_classperiod(description=DEFAULT_CP_DESCRIPTION,
+                            load_mode='threads'):
     '''
     This function loads a sample ClassPeriod file whose description
     is given as an argument. It looks for a file with the name
     {description}.txt (e.g. "sample_classperiod.txt")
     If that file does not exist, an empty ClassPeriod is created
     with the given description
+    Student files are read as specified by load_mode
+    (see cpm.student_list_from_datafile_list()), unless nothing has
+    changed since the last launch, in which case the period is read
+    from its snapshot (see snapshot_cache).
+    Changes that were not saved when the program last stopped are
+    replayed from the period's journal, which records further changes
+    (see score_journal).
     The function returns the resulting ClassPeriod object.
     '''
     filename = path.join('.', description, description + ".txt")
@@ -38,9 +48,12 @@ def load_sample_classperiod(description=DEFAULT_CP_DESCRIPTION):
     file_exists = bool(data_str)
     # If file exists, try to use it to build a sample.
     if file_exists:
-        return cpm.build_classperiod_from_data(data_str)
+        return sj.load_classperiod(filename, load_mode=load_mode)
     else:  # If file does not exist, return empty ClassPeriod
-        return cpm.ClassPeriod(DEFAULT_CP_DESCRIPTION)
+        cp = cpm.ClassPeriod(DEFAULT_CP_DESCRIPTION)
+        sj.replay_journal(cp)
+        sj.open_journal(cp)
+        return cp
 
 
 def get_string_from_input(prompt, illegal_substring=':::'):
@@ -92,7 +105,7 @@ def add_lt_interface(cp):
             "Verbose description of new Learning Target > ", ":::")
     new_lt = ltm.LearningTarget(lt_label, brief, description)
     # Add LT to ClassPeriod object
-    cp.course_lts.append(new_lt)
+    sj.add_course_lt(cp, new_lt)
     # Add LT to each student
     for student in cp.students_in_period:
         student_score = -1  # invalid score
@@ -100,7 +113,7 @@ def add_lt_interface(cp):
             student_score = get_float_from_input(
                     f"Enter score for {student.name_str()} > ")
             if ngog.score_is_valid(student_score):
-                stu.add_lt(student, lt_label, student_score)
+                sj.add_lt(cp, student, lt_label, student_score)
                 break
             else:
                 print("Error: invalid score entered.")
@@ -135,7 +148,7 @@ def add_student_interface(cp):
     firstname = get_string_from_input("Student first name > ", ":")
     pronoun = get_string_from_input("Student preferred pronoun > ", ":")
     new_student = stu.Student(sid, lastname, firstname, pronoun)
-    cp.students_in_period.append(new_student)
+    sj.add_student(cp, new_student)
     return cp
 
 
@@ -171,18 +184,44 @@ def update_score_interface(cp):
         score_valid = ngog.score_is_valid(score)
         if not(score_valid):
             print(f"Error: invalid score {score}")
-    student_to_update = stu.update_grade(student_to_update, lt_label, score)
+    student_to_update = sj.update_grade(cp, student_to_update,
+                                        lt_label, score)
+    # The student's grade is kept up to date, so this is instant.
+    print(f"New overall grade for {student_to_update.name_str()}: " +
+          student_to_update.letter_grade(cp.d_is_valid) + " (" +
+          str(round(100 * student_to_update.calculate_overall_grade(
+                  cp.overall_function))) + "%)")
     return cp
 
 
+def print_report_progress(done, total):
+    '''
+    This function shows how many of a period's reports have been written.
+    '''
+    print(f"\rWrote {done} of {total} reports.",
+          end="\n" if done == total else "", flush=True)
+
+
 def generate_reports_interface(cp):
     '''
     This function generates reports for all students in a period.
     It takes one argument, a ClassPeriod object.
+    Reports that have not changed since they were last generated are
+    not written again (see rm.update_reports()).
+    Large periods are reported on by a pool of processes
+    (see cpm.generate_reports_in_parallel()).
     It returns True on success, False otherwise.
     '''
     print("Generating report files.")
-    successful = cpm.generate_reports(cp)
+    if len(cp.students_in_period) > cpm.REPORT_CHUNK_SIZE:
+        max_workers = None  # One process per CPU
+    else:
+        max_workers = 1
+    successful, count = rm.update_reports(cp, max_workers,
+                                          print_report_progress)
+    unchanged = len(cp.students_in_period) - count
+    if unchanged > 0:
+        print(f"{unchanged} reports were unchanged and were not rewritten.")
     if successful:
         print("Reports generated successfully.")
     else:
@@ -208,12 +247,15 @@ def write_overall_grades_to_synergy(cp, driver):
         (i) a ClassPeriod object
         (ii) driver, a selenium WebDriver object
                 pointed at a Synergy gradebook page.
+    The grades are written in one batch and then read back, with a
+    warning for each student whose grade did not land
+    (see synergy.write_overall_scores()).
     '''
     grades = cp.get_list_of_overall_grades()
-    return synergy.fill_overall_scores(driver,
-                                       grades,
-                                       comments=[],
-                                       keyword=DEFAULT_OVERALL_KEYWORD)
+    return synergy.write_overall_scores(driver,
+                                        grades,
+                                        comments=[],
+                                        keyword=DEFAULT_OVERALL_KEYWORD)
 
 
 def save_and_exit(cp):
@@ -223,9 +265,10 @@ def save_and_exit(cp):
 
     This function is almost exactly equivalent to
     cpm.write_classperiod_to_datafile()
-    except that it also halts program execution after writing to the file.
+    except that it also halts program execution after writing to the file
+    (and empties the ClassPeriod's journal; see sj.compact()).
     '''
-    cpm.write_classperiod_to_datafile(cp)
+    sj.compact(cp)
     sys.exit()
 
 
@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+"""
+Description: snapshot_cache module.
+This module keeps a binary snapshot of each ClassPeriod that has been
+read from text data files, so that later loads can skip parsing.
+
+A snapshot is written next to the class period's directory (e.g.
+"./Period_5.sbsnap" for "./Period_5/Period_5.txt"). It records the
+modification time, size and content hash of the index file, the LT file
+and every student file. A snapshot is only used if every one of those
+files is unchanged: files whose modification time and size match are
+trusted, and any other file is hashed and compared. Otherwise the
+period is parsed from the text files as usual and the snapshot is
+rewritten.
+
+Snapshots hold only plain data (strings, numbers and the packed score
+arrays of each ScoreBook) encoded with marshal, so reading one never
+runs code.
+"""
+
+# import modules
+from array import array
+import hashlib
+import marshal
+import os
+import struct
+import classperiod_module as cpm
+import lt_module as ltm
+import student_module as stu
+import scorebook_module as sbm
+import sbg_data_methods as dm
+
+# Global variables
+SNAPSHOT_EXTENSION = '.sbsnap'
+SNAPSHOT_MAGIC = b'SBSN'
+SNAPSHOT_VERSION = 2
+# Header: magic, snapshot version, marshal version
+SNAPSHOT_HEADER = struct.Struct('<4sHH')
+
+
+def snapshot_filename(index_filename):
+    '''
+    This function returns the name of the snapshot file for the class
+    period whose index file is index_filename: the period's directory
+    with SNAPSHOT_EXTENSION appended.
+    '''
+    directory = os.path.dirname(os.path.abspath(index_filename))
+    return directory + SNAPSHOT_EXTENSION
+
+
+def hash_file(filename):
+    '''
+    This function returns a hash of a file's contents (as bytes).
+    '''
+    with open(filename, 'rb') as data_file:
+        return hashlib.blake2b(data_file.read(), digest_size=16).digest()
+
+
+def file_key(filename):
+    '''
+    This function returns a tuple identifying the current version of a
+    file: (filename, modification time in ns, size, content hash).
+    '''
+    status = os.stat(filename)
+    return (filename, status.st_mtime_ns, status.st_size, hash_file(filename))
+
+
+def data_filenames(cp):
+    '''
+    This function returns a list of the data files that a ClassPeriod
+    was read from: its index file, LT file and student files, as named
+    in its index (see cpm.build_classperiod_from_datafile()).
+    '''
+    lines = cp.saved_index.split("\n")
+    return [cp.saved_index_filename] + lines[1:]
+
+
+def file_is_unchanged(key):
+    '''
+    This function takes a tuple returned by file_key() and returns True
+    if the file still has the same contents.
+    '''
+    filename, mtime_ns, size, content_hash = key
+    try:
+        status = os.stat(filename)
+        if status.st_size != size:
+            return False
+        if status.st_mtime_ns == mtime_ns:
+            return True
+        return hash_file(filename) == content_hash
+    except OSError:
+        return False
+
+
+def classperiod_to_data(cp):
+    '''
+    This function returns a tuple of plain data (which marshal can
+    encode) holding everything needed to rebuild a ClassPeriod.
+    '''
+    lts = tuple((lt.lt_label, lt.brief, lt.description, lt.gb_column)
+                for lt in cp.course_lts)
+    students = []
+    for student in cp.students_in_period:
+        book = student.scores
+        if not isinstance(book, sbm.ScoreBook):
+            book = sbm.ScoreBook(book)
+        labels, lengths, codes = book.stored_form()
+        students.append((student.sid, student.lastname, student.firstname,
+                         student.pronoun, tuple(labels), lengths.tobytes(),
+                         codes.tobytes(), student.modified))
+    return (cp.description, cp.overall_function, cp.d_is_valid,
+            cp.saved_index_filename, cp.saved_index, cp.saved_lts,
+            cp.saved_roster, lts, tuple(students))
+
+
+def classperiod_from_data(data):
+    '''
+    This function reverses classperiod_to_data().
+    '''
+    (description, overall_function, d_is_valid, saved_index_filename,
+     saved_index, saved_lts, saved_roster, lts, students) = data
+    lt_list = ltm.LearningTargetList(ltm.LearningTarget(*lt) for lt in lts)
+    student_list = stu.StudentList()
+    for (sid, lastname, firstname, pronoun, labels, lengths, codes,
+         modified) in students:
+        student = stu.Student(sid, lastname, firstname, pronoun)
+        lengths_array = array('H')
+        lengths_array.frombytes(lengths)
+        codes_array = array('b')
+        codes_array.frombytes(codes)
+        student.scores = sbm.scorebook_from_codes(labels, lengths_array,
+                                                  codes_array)
+        if not(modified):
+            student.mark_saved()
+        student_list.append(student)
+    cp = cpm.ClassPeriod(description, student_list, lt_list,
+                         overall_function, d_is_valid)
+    cp.saved_index_filename = saved_index_filename
+    cp.saved_index = saved_index
+    cp.saved_lts = saved_lts
+    cp.saved_roster = saved_roster
+    return cp
+
+
+def write_snapshot(cp, keys=None):
+    '''
+    This function writes a snapshot of a ClassPeriod that was read from
+    (or has just been written to) text data files, whose state matches
+    those files except for changes tracked by Student.modified.
+    keys is an optional list of file_key() tuples for the data files,
+    taken before they were read; if any file has changed since, no
+    snapshot is written.
+    The function returns True on success, False otherwise.
+    '''
+    if cp.saved_index_filename is None:
+        print("Warning: cannot snapshot a class period with no data files.")
+        return False
+    if any(isinstance(student, stu.LazyStudent) and not(student.loaded)
+           for student in cp.students_in_period):
+        return False  # Snapshotting would load every student
+    try:
+        current_keys = [file_key(filename) for filename in data_filenames(cp)]
+    except OSError:
+        return False
+    if keys is not None and keys != current_keys:
+        return False  # A file changed while it was being read
+    payload = marshal.dumps((tuple(current_keys), classperiod_to_data(cp)))
+    header = SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION,
+                                  marshal.version)
+    filename = snapshot_filename(cp.saved_index_filename)
+    temp_filename = filename + ".tmp"
+    try:
+        with open(temp_filename, 'wb') as snapshot_file:
+            snapshot_file.write(header + payload)
+        os.replace(temp_filename, filename)
+        return True
+    except OSError:
+        print(f"Warning: could not write snapshot {filename}")
+        return False
+
+
+def read_snapshot(index_filename):
+    '''
+    This function returns the ClassPeriod stored in the snapshot for the
+    given index file, or False if there is no usable snapshot (it is
+    missing, unreadable, or any of the data files has changed).
+    '''
+    try:
+        with open(snapshot_filename(index_filename), 'rb') as snapshot_file:
+            contents = snapshot_file.read()
+        magic, version, marshal_version = \
+            SNAPSHOT_HEADER.unpack_from(contents)
+        if (magic, version, marshal_version) != \
+                (SNAPSHOT_MAGIC, SNAPSHOT_VERSION, marshal.version):
+            return False
+        keys, data = marshal.loads(contents[SNAPSHOT_HEADER.size:])
+        if keys[0][0] != index_filename:
+            return False
+        if not all(file_is_unchanged(key) for key in keys):
+            return False
+        return classperiod_from_data(data)
+    except (OSError, EOFError, ValueError, TypeError, IndexError,
+            struct.error, AssertionError):
+        return False
+
+
+def load_classperiod(index_filename, columnar=False,
+                     load_mode='sequential'):
+    '''
+    This function returns the ClassPeriod whose index file is
+    index_filename, like cpm.build_classperiod_from_datafile() (which
+    takes the same arguments), but uses the period's snapshot if none
+    of its data files has changed. Otherwise the period is parsed from
+    its data files and a new snapshot is written.
+    Lazy loads (load_mode 'lazy') never use snapshots.
+    '''
+    if load_mode != 'lazy':
+        cp = read_snapshot(index_filename)
+        if cp:
+            if columnar:
+                cp.use_columnar_store()
+            return cp
+    keys = None
+    data_str = dm.fetch_data_from_file(index_filename)
+    if data_str:
+        try:
+            keys = [file_key(index_filename)] + \
+                [file_key(filename) for filename in data_str.split("\n")[1:]]
+        except OSError:
+            pass  # Reported when the period is read below
+    cp = cpm.build_classperiod_from_datafile(index_filename, False, load_mode)
+    if keys is not None:
+        write_snapshot(cp, keys)
+    if columnar:
+        cp.use_columnar_store()
+    return cp
+
+
+# Unit tests
+if __name__ == "__main__":
+    import tempfile
+    import data_for_unit_testing as dfut
+    working_directory = os.getcwd()
+    with tempfile.TemporaryDirectory() as directory:
+        os.chdir(directory)
+        try:
+            cp = cpm.ClassPeriod("Period X Grades",
+                                 dfut.sample_list_of_students(),
+                                 dfut.sample_list_of_lts())
+            assert cpm.write_classperiod_to_datafile(cp)
+            index_filename = cp.saved_index_filename
+            # Test load_classperiod() and read_snapshot()
+            print("Testing load_classperiod() and read_snapshot():")
+            assert read_snapshot(index_filename) is False  # No snapshot yet
+            parsed_cp = load_classperiod(index_filename)
+            assert os.path.isfile(snapshot_filename(index_filename))
+            snapshot_cp = read_snapshot(index_filename)
+            assert repr(snapshot_cp) == repr(parsed_cp)
+            assert [str(student) for student in
+                    snapshot_cp.students_in_period] == \
+                [str(student) for student in parsed_cp.students_in_period]
+            for student in snapshot_cp.students_in_period:
+                assert type(student.scores) == sbm.ScoreBook
+                assert student.recent_counts == \
+                    parsed_cp.find_student(student.sid).recent_counts
+            assert snapshot_cp.modified_students() == []
+            assert snapshot_cp.saved_index == parsed_cp.saved_index
+            assert snapshot_cp.saved_lts == parsed_cp.saved_lts
+            assert snapshot_cp.saved_roster == parsed_cp.saved_roster
+            assert snapshot_cp.saved_roster is not None
+            assert repr(load_classperiod(index_filename)) == repr(parsed_cp)
+            print("Success!")
+            # Touching a file without changing it keeps the snapshot
+            print("Testing that snapshots follow the data files:")
+            student_filename = data_filenames(parsed_cp)[3]
+            os.utime(student_filename, ns=(0, 0))
+            assert read_snapshot(index_filename)
+            # Changing a file makes the snapshot stale
+            stu.update_grade(parsed_cp.find_student(2), 'LT01', 2.5)
+            assert cpm.write_classperiod_to_datafile(parsed_cp)
+            assert read_snapshot(index_filename) is False
+            reloaded_cp = load_classperiod(index_filename)
+            assert reloaded_cp.find_student(2).scores['LT01'][-1] == 2.5
+            assert read_snapshot(index_filename).find_student(2).\
+                scores['LT01'][-1] == 2.5
+            # A damaged snapshot is ignored
+            with open(snapshot_filename(index_filename), 'r+b') as damaged:
+                damaged.seek(SNAPSHOT_HEADER.size + 10)
+                damaged.write(b'\xff\xff\xff')
+            assert read_snapshot(index_filename) is False
+            assert repr(load_classperiod(index_filename)) == repr(reloaded_cp)
+            assert read_snapshot(index_filename)
+            # Students changed while loading (here, by removing an exempt
+            # LT) are still modified when loaded from the snapshot
+            stu.update_grade(reloaded_cp.find_student(3), 'LT03', -1)
+            assert cpm.write_classperiod_to_datafile(reloaded_cp)
+            exempt_cp = load_classperiod(index_filename)
+            assert 'LT03' not in exempt_cp.find_student(3).scores
+            assert [student.sid for student in read_snapshot(
+                    index_filename).modified_students()] == [3]
+        finally:
+            os.chdir(working_directory)
+    print("Success!\n\n")
+    print("All tests were successful.")
@@ -0,0 +1,431 @@
+# -*- coding: utf-8 -*-
+"""
+Description: sqlite_gradebook module.
+This module stores ClassPeriods in a single SQLite database file,
+as an alternative to the legacy layout written by
+classperiod_module.write_classperiod_to_datafile() (an index .txt file,
+an .ltdat file, and one .studat file per student).
+
+One database can hold any number of class periods. Each period is saved
+in a single transaction, so a failed save leaves the previous version
+intact, and the tables are indexed so that one student, or every
+student's scores on one LT, can be read without loading the period.
+Class periods saved in the legacy layout can be imported in bulk.
+"""
+
+# import modules
+import os
+import sqlite3
+import classperiod_module as cpm
+import lt_module as ltm
+import student_module as stu
+import sbg_data_methods as dm
+import scorebook_module as sbm
+
+# Global variables
+SCHEMA_VERSION = 1
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS periods (
+    period_id INTEGER PRIMARY KEY,
+    description TEXT NOT NULL UNIQUE,
+    overall_function TEXT NOT NULL,
+    d_is_valid INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS lts (
+    period_id INTEGER NOT NULL REFERENCES periods ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    lt_label TEXT NOT NULL,
+    brief TEXT NOT NULL,
+    description TEXT NOT NULL,
+    gb_column INTEGER NOT NULL,
+    PRIMARY KEY (period_id, position)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS students (
+    period_id INTEGER NOT NULL REFERENCES periods ON DELETE CASCADE,
+    sid INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    lastname TEXT NOT NULL,
+    firstname TEXT NOT NULL,
+    pronoun TEXT NOT NULL,
+    PRIMARY KEY (period_id, sid)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS scores (
+    period_id INTEGER NOT NULL,
+    sid INTEGER NOT NULL,
+    label_position INTEGER NOT NULL,
+    attempt INTEGER NOT NULL,
+    lt_label TEXT NOT NULL,
+    score REAL NOT NULL,
+    PRIMARY KEY (period_id, sid, label_position, attempt),
+    FOREIGN KEY (period_id, sid) REFERENCES students ON DELETE CASCADE
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS scores_by_lt ON scores (period_id, lt_label);
+'''
+
+
+def open_gradebook(filename):
+    '''
+    This function opens (creating if needed) a gradebook database
+    and returns an sqlite3 Connection to it.
+    Use ':memory:' as the filename for a temporary in-memory database.
+    '''
+    connection = sqlite3.connect(filename)
+    connection.execute("PRAGMA foreign_keys = ON")
+    version = connection.execute("PRAGMA user_version").fetchone()[0]
+    if version not in (0, SCHEMA_VERSION):
+        connection.close()
+        raise ValueError(f"{filename} has unsupported schema " +
+                         f"version {version}")
+    with connection:
+        connection.executescript(SCHEMA)
+        connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    return connection
+
+
+def period_id_with_description(connection, description):
+    '''
+    This function returns the database ID of the class period with the
+    specified description, or False if there is none.
+    '''
+    row = connection.execute(
+            "SELECT period_id FROM periods WHERE description = ?",
+            (description,)).fetchone()
+    if row is None:
+        return False
+    return row[0]
+
+
+def list_classperiods(connection):
+    '''
+    This function returns a list of the descriptions of all class
+    periods in the database, in the order they were first saved.
+    '''
+    return [row[0] for row in connection.execute(
+            "SELECT description FROM periods ORDER BY period_id")]
+
+
+def score_from_db(value):
+    '''
+    This function converts a score read from the database (always a
+    float) back to an int for whole-number scores, as in the .studat files.
+    '''
+    return sbm.decode_score(int(value * 2))
+
+
+def save_classperiods(connection, list_of_classperiods):
+    '''
+    This function saves a list of ClassPeriods to the database in one
+    transaction, replacing any saved periods with the same descriptions.
+    It returns True on success, False on failure (in which case
+    nothing is changed).
+    '''
+    try:
+        with connection:
+            for cp in list_of_classperiods:
+                insert_classperiod(connection, cp)
+        return True
+    except (sqlite3.Error, ValueError) as error:
+        print(f"Error saving class periods: {error}")
+        return False
+
+
+def save_classperiod(connection, classperiod):
+    '''
+    This function saves one ClassPeriod to the database, replacing any
+    saved period with the same description.
+    It returns True on success, False on failure.
+    '''
+    return save_classperiods(connection, [classperiod])
+
+
+def insert_classperiod(connection, cp):
+    '''
+    This function writes a ClassPeriod to the database. It must be
+    called inside a transaction.
+    '''
+    connection.execute("DELETE FROM periods WHERE description = ?",
+                       (cp.description,))
+    period_id = connection.execute(
+            "INSERT INTO periods (description, overall_function, " +
+            "d_is_valid) VALUES (?, ?, ?)",
+            (cp.description, cp.overall_function,
+             int(cp.d_is_valid))).lastrowid
+    connection.executemany(
+            "INSERT INTO lts VALUES (?, ?, ?, ?, ?, ?)",
+            ((period_id, position, lt.lt_label, lt.brief, lt.description,
+              lt.gb_column)
+             for position, lt in enumerate(cp.course_lts)))
+    connection.executemany(
+            "INSERT INTO students VALUES (?, ?, ?, ?, ?, ?)",
+            ((period_id, student.sid, position, student.lastname,
+              student.firstname, student.pronoun)
+             for position, student in enumerate(cp.students_in_period)))
+    connection.executemany(
+            "INSERT INTO scores VALUES (?, ?, ?, ?, ?, ?)",
+            ((period_id, student.sid, label_position, attempt, lt_label,
+              score)
+             for student in cp.students_in_period
+             for label_position, (lt_label, history)
+             in enumerate(student.scores.items())
+             for attempt, score in enumerate(history)))
+
+
+def scores_dicts_for_period(connection, period_id, sid=None):
+    '''
+    This function reads scores from the database for one class period
+    (or, if sid is specified, one student in it).
+    It returns a dictionary from sid to that student's scores dictionary.
+    Students with no scores are not included.
+    '''
+    query = "SELECT sid, lt_label, score FROM scores WHERE period_id = ?"
+    parameters = [period_id]
+    if sid is not None:
+        query += " AND sid = ?"
+        parameters.append(sid)
+    query += " ORDER BY sid, label_position, attempt"
+    scores_dicts = {}
+    for row_sid, lt_label, score in connection.execute(query, parameters):
+        scores_dicts.setdefault(row_sid, {}).setdefault(
+                lt_label, []).append(score_from_db(score))
+    return scores_dicts
+
+
+def load_classperiod(connection, description, columnar=False):
+    '''
+    This function reads the class period with the specified description
+    from the database and returns it as a ClassPeriod, or returns
+    False if there is no such period.
+    If columnar is True, the ClassPeriod's scores are kept in a
+    columnar store (see ClassPeriod.use_columnar_store()).
+    '''
+    row = connection.execute(
+            "SELECT period_id, overall_function, d_is_valid FROM periods " +
+            "WHERE description = ?", (description,)).fetchone()
+    if row is None:
+        print(f"Warning: no class period named {description}")
+        return False
+    period_id, overall_function, d_is_valid = row
+    lt_list = ltm.LearningTargetList(
+            ltm.LearningTarget(lt_label, brief, lt_description, gb_column)
+            for lt_label, brief, lt_description, gb_column
+            in connection.execute(
+                    "SELECT lt_label, brief, description, gb_column " +
+                    "FROM lts WHERE period_id = ? ORDER BY position",
+                    (period_id,)))
+    scores_dicts = scores_dicts_for_period(connection, period_id)
+    student_list = stu.StudentList()
+    for sid, lastname, firstname, pronoun in connection.execute(
+            "SELECT sid, lastname, firstname, pronoun FROM students " +
+            "WHERE period_id = ? ORDER BY position", (period_id,)):
+        student = stu.Student(sid, lastname, firstname, pronoun)
+        student.scores = scores_dicts.get(sid, {})
+        student_list.append(student)
+    cp = cpm.ClassPeriod(description, student_list, lt_list,
+                         overall_function, bool(d_is_valid))
+    if columnar:
+        cp.use_columnar_store()
+    return cp
+
+
+def load_student(connection, description, sid):
+    '''
+    This function reads one student (with scores) from the class period
+    with the specified description, without loading the rest of the
+    period. It returns a Student, or False if the student is not found.
+    '''
+    period_id = period_id_with_description(connection, description)
+    row = connection.execute(
+            "SELECT lastname, firstname, pronoun FROM students " +
+            "WHERE period_id = ? AND sid = ?", (period_id, sid)).fetchone()
+    if row is None:
+        return False
+    student = stu.Student(sid, *row)
+    student.scores = scores_dicts_for_period(connection, period_id,
+                                             sid).get(sid, {})
+    return student
+
+
+def scores_on_lt(connection, description, lt_label):
+    '''
+    This function returns a dictionary from sid to score history
+    (a list, most recent last) for every student in the specified
+    class period with a score on the LT with label lt_label.
+    '''
+    period_id = period_id_with_description(connection, description)
+    scores_by_sid = {}
+    for sid, score in connection.execute(
+            "SELECT sid, score FROM scores " +
+            "WHERE period_id = ? AND lt_label = ? ORDER BY sid, attempt",
+            (period_id, lt_label)):
+        scores_by_sid.setdefault(sid, []).append(score_from_db(score))
+    return scores_by_sid
+
+
+def delete_classperiod(connection, description):
+    '''
+    This function removes a class period and all of its data from the
+    database. It returns True if a period was removed, False otherwise.
+    '''
+    with connection:
+        cursor = connection.execute(
+                "DELETE FROM periods WHERE description = ?", (description,))
+    return cursor.rowcount > 0
+
+
+def legacy_data_path(filename, base_directory='.'):
+    '''
+    This function takes a file name found in a legacy ClassPeriod index
+    file (see classperiod_module.write_classperiod_to_datafile()) and the
+    directory containing the index file.
+    Index files written on Windows use backslashes (e.g.
+    ".\\Period_5\\Period_5_1.studat"), so these are converted to the local
+    separator. If the resulting path does not exist relative to the
+    working directory, the file is looked for next to the index file.
+    The function returns the path to use.
+    '''
+    path = os.path.normpath(filename.strip().replace('\\', '/'))
+    if os.path.isfile(path):
+        return path
+    beside_index = os.path.join(base_directory, os.path.basename(path))
+    if os.path.isfile(beside_index):
+        return beside_index
+    return path
+
+
+def read_legacy_classperiod(index_filename):
+    '''
+    This function reads a ClassPeriod saved in the legacy layout,
+    given the name of its index file, resolving the paths in the index
+    file with legacy_data_path(). It returns False on failure.
+    '''
+    data_str = dm.fetch_data_from_file(index_filename)
+    if not(data_str):
+        return False
+    base_directory = os.path.dirname(index_filename)
+    lines = [line for line in data_str.split("\n") if line.strip() != '']
+    lines[1:] = [legacy_data_path(line, base_directory) for line in lines[1:]]
+    try:
+        return cpm.build_classperiod_from_data("\n".join(lines))
+    except (AssertionError, ValueError):  # ValueError: bad score data
+        print(f"Warning: could not read class period from {index_filename}")
+        return False
+
+
+def import_legacy_classperiods(connection, list_of_index_filenames):
+    '''
+    This function reads ClassPeriods saved in the legacy layout (given a
+    list of their index files) and saves all of them to the database in
+    one transaction.
+    It returns True on success; if any period cannot be read or saved,
+    nothing is imported and it returns False.
+    '''
+    list_of_classperiods = []
+    for index_filename in list_of_index_filenames:
+        cp = read_legacy_classperiod(index_filename)
+        if not(cp):
+            return False
+        list_of_classperiods.append(cp)
+    return save_classperiods(connection, list_of_classperiods)
+
+
+# Unit tests
+if __name__ == "__main__":
+    import shutil
+    import tempfile
+    import data_for_unit_testing as dfut
+    # Test save_classperiod() and load_classperiod()
+    print("Testing save_classperiod() and load_classperiod():")
+    connection = open_gradebook(':memory:')
+    cp = cpm.ClassPeriod("Period X Grades",
+                         dfut.sample_list_of_students(),
+                         dfut.sample_list_of_lts(),
+                         overall_function='sticky', d_is_valid=False)
+    assert save_classperiod(connection, cp)
+    loaded_cp = load_classperiod(connection, "Period X Grades")
+    assert repr(loaded_cp) == repr(cp)
+    assert loaded_cp.course_lts == cp.course_lts
+    assert [str(s) for s in loaded_cp.students_in_period] == \
+        [str(s) for s in cp.students_in_period]
+    assert loaded_cp.overall_function == 'sticky'
+    assert loaded_cp.d_is_valid is False
+    assert type(loaded_cp.students_in_period[0].scores['LT01'][0]) == int
+    assert load_classperiod(connection, "No such period") is False
+    print("Success!")
+    # Saving again replaces the period
+    print("Testing that saving replaces a period:")
+    stu.update_grade(cp.students_in_period[0], 'LT01', 2.5)
+    cp.students_in_period.pop()
+    assert save_classperiod(connection, cp)
+    assert list_classperiods(connection) == ["Period X Grades"]
+    loaded_cp = load_classperiod(connection, "Period X Grades")
+    assert len(loaded_cp.students_in_period) == 9
+    assert loaded_cp.students_in_period[0].scores['LT01'][-1] == 2.5
+    print("Success!")
+    # Test load_student() and scores_on_lt()
+    print("Testing load_student() and scores_on_lt():")
+    assert str(load_student(connection, "Period X Grades", 2)) == \
+        str(cp.find_student(2))
+    assert load_student(connection, "Period X Grades", 42) is False
+    on_lt01 = scores_on_lt(connection, "Period X Grades", 'LT01')
+    assert on_lt01 == {student.sid: list(student.scores['LT01'])
+                       for student in cp.students_in_period
+                       if 'LT01' in student.scores}
+    print("Success!")
+    # Test that a failed save changes nothing
+    print("Testing failed saves:")
+    duplicate_cp = cpm.ClassPeriod("Period X Grades",
+                                   [stu.Student(1, 'A', 'B'),
+                                    stu.Student(1, 'C', 'D')])
+    assert save_classperiod(connection, duplicate_cp) is False
+    assert len(load_classperiod(
+            connection, "Period X Grades").students_in_period) == 9
+    print("Success!")
+    # Test delete_classperiod()
+    print("Testing delete_classperiod():")
+    assert delete_classperiod(connection, "Period X Grades")
+    assert delete_classperiod(connection, "Period X Grades") is False
+    assert list_classperiods(connection) == []
+    assert connection.execute("SELECT COUNT(*) FROM scores").fetchone()[0] \
+        == 0
+    connection.close()
+    print("Success!")
+    # Test legacy_data_path() and import_legacy_classperiods()
+    print("Testing import_legacy_classperiods():")
+    sample_index = os.path.join('sample_classperiod', 'sample_classperiod.txt')
+    assert legacy_data_path('.\\sample_classperiod\\sample_classperiod_1' +
+                            '.studat', 'sample_classperiod') == \
+        os.path.join('sample_classperiod', 'sample_classperiod_1.studat')
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'gradebook.sqlite')
+        connection = open_gradebook(filename)
+        assert import_legacy_classperiods(connection, [sample_index])
+        connection.close()
+        connection = open_gradebook(filename)
+        assert list_classperiods(connection) == ['sample_classperiod']
+        sample_cp = load_classperiod(connection, 'sample_classperiod')
+        assert repr(sample_cp) == repr(read_legacy_classperiod(sample_index))
+        assert len(sample_cp.students_in_period) == 9
+        assert import_legacy_classperiods(
+                connection, [sample_index, 'no_such_file.txt']) is False
+        connection.close()
+        # A damaged student file means the period is not imported
+        shutil.copytree('sample_classperiod',
+                        os.path.join(directory, 'sample_classperiod'))
+        working_directory = os.getcwd()
+        os.chdir(directory)
+        try:
+            with open(os.path.join('sample_classperiod',
+                                   'sample_classperiod_3.studat'),
+                      'w') as file:
+                file.write("sid: 3, lastname: Hilders, firstname: " +
+                           "Catherine, pronoun: they, " +
+                           "scores: {'LT01': [2, four]}")
+            assert read_legacy_classperiod(sample_index) is False
+            connection = open_gradebook(filename)
+            assert import_legacy_classperiods(connection,
+                                              [sample_index]) is False
+            connection.close()
+        finally:
+            os.chdir(working_directory)
+    print("Success!\n\n")
+    print("All tests were successful.")
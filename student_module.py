@@ -12,10 +12,18 @@ This module contains function dealing with the Student data type.
 import nitty_gritty_of_grading as ngog
 import sbg_data_methods as dm
 import lt_module as ltm
+import scorebook_module as sbm
+from indexed_list import IndexedList
 import advice
 import datetime
+import os
 from math import floor
 
+# Global variables
+# Changing any of these marks a Student as modified
+STUDENT_DATA_ATTRIBUTES = ('sid', 'lastname', 'firstname', 'pronoun',
+                           'scores')
+
 
 class Student:
     '''
@@ -23,6 +31,9 @@ class Student:
     Specifically: student ID number, last name, first name,
     preferred pronoun, and scores
     '''
+    __slots__ = ('sid', 'lastname', 'firstname', 'pronoun', '__scores',
+                 '__saved')
+
     def __init__(self, sid, lastname, firstname, pronoun="they"):
         '''
         Constructor method
@@ -39,6 +50,63 @@ class Student:
         assert dm.no_taboos(self.pronoun)
         self.scores = {}
 
+    def __setattr__(self, name, value):
+        '''
+        Method that sets an attribute. Changing any of the student's data
+        marks the student as modified (see mark_saved()).
+        '''
+        super().__setattr__(name, value)
+        if name in STUDENT_DATA_ATTRIBUTES:
+            super().__setattr__('_Student__saved', (None, 0))
+
+    def mark_saved(self):
+        '''
+        This method records that the student's data file is up to date,
+        so that the student is not modified until their data or scores
+        change again.
+        '''
+        self.__saved = (self.__scores, self.__scores.changes)
+
+    @property
+    def modified(self):
+        '''
+        True if the student's data or scores have changed since
+        mark_saved() was last called (or if it has never been called).
+        '''
+        saved_scores, saved_changes = self.__saved
+        return not(saved_scores is self.__scores and
+                   saved_changes == self.__scores.changes)
+
+    @property
+    def scores(self):
+        '''
+        The student's scores, as a ScoreMapping (usually a ScoreBook)
+        that behaves like a dictionary of LT label -> list of scores
+        (most recent last).
+        Assigning a dictionary copies it into a new ScoreBook;
+        assigning a ScoreMapping uses it as is.
+        '''
+        return self.__scores
+
+    @scores.setter
+    def scores(self, scores_dict):
+        '''
+        Setter for scores.
+        '''
+        if isinstance(scores_dict, sbm.ScoreMapping):
+            self.__scores = scores_dict
+        else:
+            self.__scores = sbm.ScoreBook(scores_dict)
+
+    @property
+    def recent_counts(self):
+        '''
+        Histogram of most recent (non-exempt) scores, e.g. {4: 2, 3: 1}.
+        The ScoreMapping keeps the counts up to date on every change,
+        so this does not scan the scores.
+        '''
+        return self.__scores.recent_counts()
+
     def all_strings_are_safe(self):
         '''
         This method makes sure that none of the strings stored by this class
@@ -67,7 +135,7 @@ class Student:
         Method that checks whether two students have the same student ID
         and returns the result
         '''
-        if isinstance(other, Student):
+        if isinstance(other, (Student, LazyStudent)):
             return self.sid == other.sid
         return False
 
@@ -95,21 +163,27 @@ class Student:
         'simple', 'piecewise', 'sticky', or 'letter',
         and returns the student's overall grade per that function.
         '''
-        function_dict = {'piecewise': ngog.piecewise_grade,
-                         'simple': ngog.simple_grade,
-                         'sticky': ngog.sticky_grade}
-        if function_string in function_dict:
-            return \
-                function_dict[function_string](ngog.list_of_most_recent_scores(
-                        self.scores))
+        if function_string in ['piecewise', 'simple', 'sticky']:
+            grades = ngog.grades_from_histogram(self.recent_counts)
+            grade = getattr(grades, function_string)
+            assert grade is not None
+            return grade
 
     def letter_grade(self, d_is_valid):
         '''
         This method uses the ngog module to calculate the student's
         letter grade.
         '''
-        return ngog.letter_grade(ngog.list_of_most_recent_scores(self.scores),
-                                 d_is_valid)
+        grades = ngog.grades_from_histogram(self.recent_counts, d_is_valid)
+        assert grades.letter is not None
+        return grades.letter
+
+    def grade_summary(self):
+        '''
+        This method returns an ngog.GradeSummary built from the
+        student's running count of most recent scores.
+        '''
+        return ngog.GradeSummary(dict(self.recent_counts))
 
     def lts_assessed(self, list_of_all_LTs):
         '''
@@ -122,11 +196,12 @@ class Student:
         for which the student has a corresponding score.
         '''
         lts_assessed = []
+        find_lt = ltm.lt_label_lookup(list_of_all_LTs)
         for lt_label in self.scores:
-            search = ltm.lt_with_label(lt_label, list_of_all_LTs)
+            search = find_lt(lt_label)
             # Make sure that an LT with the given label is in the
             # list of LTs, and throw an error if not.
-            if not(search in list_of_all_LTs):
+            if search is False:
                 error_str = ("Error: Learning Target " +
                              lt_label + " not found!")
                 assert False, error_str
@@ -134,67 +209,61 @@ class Student:
             lts_assessed.append(search)
         return lts_assessed
 
-    def __best_advice(self, list_of_all_lts, d_is_valid):
+    def score_buckets(self, list_of_all_LTs):
+        '''
+        This method takes a list of all learning targets in the gradebook
+        and returns a ScoreBuckets object holding the LTs the student has
+        been assessed on, sorted by most recent score, along with the
+        student's grade summary. The scores are scanned only once.
+        '''
+        return ScoreBuckets(self.__scores.score_histories(),
+                            list_of_all_LTs)
+
+    def __best_advice(self, list_of_all_lts, d_is_valid, buckets=None):
         '''
         This method returns a string containg study advice for the student.
         It requires two arguments:
             (i) a list of all LearningTargets in the gradebook.
             (ii) a bool for whether D is a valid grade
+        buckets is an optional ScoreBuckets object for the student,
+        if the caller already has one (see score_buckets()).
         '''
         # Store misc. data needed to generate advice strings
-        lts_assessed = self.lts_assessed(list_of_all_lts)
-        most_recent_scores = ngog.list_of_most_recent_scores(self.scores)
-        pct_met = ngog.pct_of_lts_met(most_recent_scores)
-        has_A = ngog.has_A_from_LTs(most_recent_scores)
-        has_B = ngog.has_B_from_LTs(most_recent_scores)
-        has_C = ngog.has_C_from_LTs(most_recent_scores)
-        has_D = ngog.has_D_from_LTs(most_recent_scores)
-        has_F = ngog.has_F_from_LTs(most_recent_scores)
-        list_of_0s = advice.extract_LT_list_by_score(0, self, lts_assessed)
-        list_of_1s = advice.extract_LT_list_by_score(1, self, lts_assessed)
-        list_of_0s_and_1s = list_of_0s + list_of_1s
-        list_of_2s = advice.extract_LT_list_by_score(2, self, lts_assessed)
-        list_of_0s_1s_and_2s = list_of_0s_and_1s + list_of_2s
-        list_of_3s = advice.extract_LT_list_by_score(3, self, lts_assessed)
-        list_of_4s = advice.extract_LT_list_by_score(4, self, lts_assessed)
-        count_of_4s = len(list_of_4s)
-        total_lt_count = len(lts_assessed)
-
-        if has_A:
+        if buckets is None:
+            buckets = self.score_buckets(list_of_all_lts)
+        pct_met = buckets.summary.pct_of_lts_met
+        grade_code = buckets.summary.grade_code
+        values = advice.template_values(self, list_of_all_lts, buckets)
+        total_lt_count = values['total_lt_count']
+
+        if grade_code == 'A':
             if pct_met == 1:  # Case 1: Student has A; all LTs met
-                return advice.advice_for_A_with_all_LTs_met()
+                section = 'advice_for_A_with_all_LTs_met'
             else:  # Case 2: Student has A; not all LTs met
-                return advice.advice_for_A_without_all_LTs_met(
-                    list_of_0s_1s_and_2s)
-        elif has_B:
+                section = 'advice_for_A_without_all_LTs_met'
+        elif grade_code == 'B':
             if pct_met >= 0.9:  # Case 3: Student has B; more than 90% met
-                return advice.advice_for_B_geq_90_pct(list_of_3s,
-                                                      count_of_4s,
-                                                      total_lt_count)
+                section = 'advice_for_B_geq_90_pct'
             else:  # Case 4: Student has B; 89% or below
-                return advice.advice_for_B_under_90(list_of_2s,
-                                                    list_of_3s,
-                                                    count_of_4s,
-                                                    total_lt_count)
-        elif has_C:
+                section = 'advice_for_B_under_90'
+        elif grade_code == 'C':
             if pct_met >= 0.8:  # Case 5: Student has C; over 80% met
-                return advice.advice_for_C_geq_80(list_of_0s_and_1s)
+                section = 'advice_for_C_geq_80'
             else:  # Case 6: Student has C; 79% or below met
-                return advice.advice_for_C_under_80(list_of_0s_1s_and_2s,
-                                                    total_lt_count)
-        elif has_D:  # Case 7: Student has a D
-            return advice.advice_for_D(list_of_0s_1s_and_2s, total_lt_count)
-        elif has_F:
+                section = 'advice_for_C_under_80'
+        elif grade_code == 'D':  # Case 7: Student has a D
+            section = 'advice_for_D'
+        elif grade_code == 'F' and total_lt_count > 0:
             # Case 8: student has taken assessments and has F
-            if total_lt_count > 0:
-                return advice.advice_for_F(list_of_0s_1s_and_2s,
-                                           total_lt_count)
+            section = 'advice_for_F'
+        elif grade_code == 'F':
             # Case 9: student has F and has taken no assessments
-            elif total_lt_count == 0:
-                return advice.advice_when_no_LTs_in_gradebook()
+            section = 'advice_when_no_LTs_in_gradebook'
         else:  # This should never happen
             return ("Error: invalid grade calculation occurred; " +
                     "no advice given.")
+        # Fill in the section of the advice template file
+        return advice.render_advice(section, values)
 
     def report(self, list_of_all_lts, overall_function, d_is_valid):
         '''
@@ -214,10 +283,11 @@ class Student:
                 f"\nOverall grade: {self.letter_grade(d_is_valid)} " +
                 f"({pseudo_pct}%)\n",
                 "Learning Target Scores:"]
-        for lt in self.lts_assessed(list_of_all_lts):
+        buckets = self.score_buckets(list_of_all_lts)
+        for lt in buckets.lts_assessed:
             # Create a line for most recent score on this LT
             lt_brief = "{:.<70}".format(lt.brief_string())
-            scores_on_lt = self.scores[lt.lt_label]
+            scores_on_lt = buckets.histories[lt.lt_label]
             recent_score = scores_on_lt[-1]
             old_scores = scores_on_lt[:-1]
             next_line = lt_brief + "  " + str(recent_score)
@@ -228,12 +298,251 @@ class Student:
                 lines.append("\tPrevious scores: " + str(old_scores))
         lines.append("\n")
         lines.append("Advice for study plan:\n")
-        lines.append(self.__best_advice(list_of_all_lts, d_is_valid))
+        lines.append(self.__best_advice(list_of_all_lts, d_is_valid,
+                                        buckets))
         lines.append("\n\nStudent Signature: ___________________________")
         lines.append("\n\nParent Signature: ___________________________")
         return "\n".join(lines)
 
 
+class ScoreBuckets:
+    '''
+    Class for a student's LTs sorted by most recent score, built in a
+    single pass over the scores (see Student.score_buckets()).
+    histories is a dictionary from LT label to the list of the student's
+    scores on that LT; lts_assessed is the list of LearningTarget objects
+    the student has been assessed on, in the order of the student's
+    scores; by_score is a dictionary from each most recent score to the
+    list of LTs with that score; and summary is the ngog.GradeSummary of
+    the non-exempt scores, which holds the counts, percentage of LTs met
+    and grade letter.
+    '''
+
+    __slots__ = ('histories', 'lts_assessed', 'by_score', 'summary')
+
+    def __init__(self, score_histories, list_of_all_LTs,
+                 exempt_code=ngog.DEFAULT_X_CODE):
+        '''
+        Constructor method. Takes a dictionary from LT label to a list of
+        scores and a list of all learning targets in the gradebook.
+        Raises an AssertionError if a label is not in the list of LTs.
+        '''
+        self.histories = score_histories
+        self.lts_assessed = []
+        self.by_score = {}
+        histogram = {}
+        find_lt = ltm.lt_label_lookup(list_of_all_LTs)
+        for lt_label, history in score_histories.items():
+            lt = find_lt(lt_label)
+            assert lt is not False, ("Error: Learning Target " +
+                                     lt_label + " not found!")
+            self.lts_assessed.append(lt)
+            if len(history) == 0:
+                continue
+            recent = history[-1]
+            self.by_score.setdefault(recent, []).append(lt)
+            if recent != exempt_code:
+                histogram[recent] = histogram.get(recent, 0) + 1
+        self.summary = ngog.GradeSummary(histogram)
+
+    def lts_with_score(self, *scores):
+        '''
+        This method returns a list of the LTs on which the student's most
+        recent score is one of the given scores.
+        '''
+        lts = []
+        for score in scores:
+            lts.extend(self.by_score.get(score, []))
+        return lts
+
+    def __repr__(self):
+        '''
+        Method that returns a string representation of the buckets.
+        '''
+        return ("ScoreBuckets(" +
+                ", ".join(f"{score}: {len(lts)}" for score, lts in
+                          sorted(self.by_score.items())) +
+                f"; grade {self.summary.grade_code})")
+
+
+class StudentList(IndexedList):
+    '''
+    Class for a list of Student objects that keeps an index by sid
+    (see indexed_list.IndexedList), so that students can be found
+    by ID without scanning the list.
+    '''
+    indexed_attributes = ('sid',)
+
+
+class LazyStudent:
+    '''
+    Class standing in for a Student whose data file has not been read.
+    The file is read the first time any of the student's data is needed
+    (see load()), and from then on the LazyStudent behaves like the
+    Student it loaded.
+    If the student ID is known in advance (e.g. from the data file's name;
+    see sid_from_datafile_name()), it is available without reading the
+    file, so a list of LazyStudents can be indexed by sid cheaply.
+    on_load is an optional function that is called with the Student
+    once it has been read.
+    '''
+    __slots__ = ('filename', 'known_sid', 'on_load', 'student')
+
+    def __init__(self, filename, sid=None, on_load=None):
+        '''
+        Constructor method
+        '''
+        object.__setattr__(self, 'filename', filename)
+        object.__setattr__(self, 'known_sid', sid)
+        object.__setattr__(self, 'on_load', on_load)
+        object.__setattr__(self, 'student', None)
+
+    @property
+    def loaded(self):
+        '''
+        True once the data file has been read
+        '''
+        return self.student is not None
+
+    def load(self):
+        '''
+        This method reads the student's data file (if it has not been read
+        yet) and returns the Student.
+        '''
+        if self.student is None:
+            student = make_student_from_datafile(self.filename)
+            assert self.known_sid is None or student.sid == self.known_sid, \
+                f"{self.filename} holds data for SID {student.sid}"
+            object.__setattr__(self, 'student', student)
+            if self.on_load is not None:
+                self.on_load(student)
+        return self.student
+
+    @property
+    def sid(self):
+        '''
+        The student ID, read from the data file only if not already known
+        '''
+        if self.student is None and self.known_sid is not None:
+            return self.known_sid
+        return self.load().sid
+
+    @property
+    def modified(self):
+        '''
+        False until the student has been loaded, and then
+        the loaded Student's modified value
+        '''
+        return self.student is not None and self.student.modified
+
+    def __getattr__(self, name):
+        '''
+        Method that loads the student and returns one of its attributes.
+        '''
+        return getattr(self.load(), name)
+
+    def __setattr__(self, name, value):
+        '''
+        Method that loads the student and sets one of its attributes.
+        '''
+        if name in LazyStudent.__slots__:
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self.load(), name, value)
+
+    def __repr__(self):
+        '''
+        Method that returns the loaded Student's string representation.
+        '''
+        return repr(self.load())
+
+    def __eq__(self, other):
+        '''
+        Method that checks whether two students have the same student ID
+        '''
+        if isinstance(other, (Student, LazyStudent)):
+            return self.sid == other.sid
+        return False
+
+
+class RosterEntry:
+    '''
+    Class to hold a student's identity (student ID, last name, first name
+    and preferred pronoun) and the name of their data file, without their
+    scores. This is all that menus and pick lists need.
+    '''
+    __slots__ = ('sid', 'lastname', 'firstname', 'pronoun', 'filename')
+
+    def __init__(self, sid, lastname, firstname, pronoun="they",
+                 filename=None):
+        '''
+        Constructor method
+        '''
+        self.sid = sid
+        self.lastname = lastname
+        self.firstname = firstname
+        self.pronoun = pronoun
+        self.filename = filename
+
+    def name_str(self):
+        '''
+        This function returns a student's name in the format
+        Firstname Lastname
+        '''
+        return self.firstname + ' ' + self.lastname
+
+    def __repr__(self):
+        '''
+        Method that returns a string representation of the entry, in the
+        form that begins a student data file (see Student.__repr__()).
+        '''
+        return ", ".join([f"sid: {self.sid}",
+                          f"lastname: {self.lastname}",
+                          f"firstname: {self.firstname}",
+                          f"pronoun: {self.pronoun}"])
+
+    def __eq__(self, other):
+        '''
+        Method that checks whether two entries hold the same data
+        '''
+        if isinstance(other, RosterEntry):
+            return repr(self) == repr(other) and \
+                self.filename == other.filename
+        return False
+
+
+class Roster(IndexedList):
+    '''
+    Class for a list of RosterEntry objects that keeps an index by sid
+    (see indexed_list.IndexedList).
+    '''
+    indexed_attributes = ('sid',)
+
+    def pick_list(self):
+        '''
+        This method returns a list of strings for choosing a student
+        (e.g. "2: Livingston, Bob"), sorted by name.
+        '''
+        entries = sorted(self, key=lambda entry: (entry.lastname,
+                                                  entry.firstname))
+        return [f"{entry.sid}: {entry.lastname}, {entry.firstname}"
+                for entry in entries]
+
+
+def sid_from_datafile_name(filename):
+    '''
+    This function takes the name of a student data file written by
+    classperiod_module.write_classperiod_to_datafile(), which ends in
+    "_{sid}.studat", and returns the student ID as an int.
+    It returns None if the name is not in that form.
+    '''
+    stem, extension = os.path.splitext(os.path.basename(filename.strip()))
+    sid_str = stem.rpartition('_')[2]
+    if extension != '.studat' or not sid_str.isdigit():
+        return None
+    return int(sid_str)
+
+
 def make_scoreless_student_from_data(data_str):
     '''
     This function takes a string argument that has been read from a data file.
@@ -286,13 +595,71 @@ def make_student_from_datafile(filename):
     with that data, which it returns.
     '''
     data_str = dm.fetch_data_from_file(filename)
-    assert data_str  # True if data fetched successfully, False otherwise
+    # True if data fetched successfully, False otherwise
+    assert data_str, f"Could not read student data file {filename}"
     new_student = make_scoreless_student_from_data(data_str)
-    assert new_student  # True if student made successfully, False otherwise
+    # True if student made successfully, False otherwise
+    assert new_student, f"Could not read student data in {filename}"
     new_student.scores = dm.build_scores_dict_from_data(data_str)
+    new_student.mark_saved()  # The student matches the data file
     return new_student
 
 
+def roster_entry_from_data(data_str, filename=None):
+    '''
+    This function takes the beginning of a string read from a student
+    data file, up to at least the student's pronoun, and returns a
+    RosterEntry for the student, without parsing the student's scores.
+    filename is the name of the data file, stored in the entry.
+    The function returns False on an error.
+    '''
+    scores_start = data_str.find('scores: ')
+    if scores_start >= 0:
+        data_str = data_str[:scores_start]
+    student = make_scoreless_student_from_data(data_str)
+    if not(student):
+        return False
+    return RosterEntry(student.sid, student.lastname, student.firstname,
+                       student.pronoun, filename)
+
+
+def read_roster_entry_from_datafile(filename, chunk_size=256):
+    '''
+    This function takes the name of a student data file and returns a
+    RosterEntry for the student. Only the beginning of the file, up to
+    the student's scores, is read (in chunks of chunk_size characters).
+    The function returns False on an error.
+    '''
+    try:
+        with open(filename, "r") as data_file:
+            data_str = ""
+            while 'scores: ' not in data_str:
+                chunk = data_file.read(chunk_size)
+                if chunk == "":
+                    break
+                data_str += chunk
+    except IOError:
+        print(f"Warning: could not read file {filename}")
+        return False
+    return roster_entry_from_data(data_str, filename)
+
+
+def roster_entry(student, filename, known_entry=None):
+    '''
+    This function returns a RosterEntry for a Student (or LazyStudent)
+    whose data file is filename.
+    A LazyStudent that has not been loaded is not loaded: its entry is
+    known_entry if that is given, and is otherwise read from the
+    beginning of its data file.
+    '''
+    if isinstance(student, LazyStudent) and not(student.loaded):
+        if known_entry is not None:
+            return known_entry
+        return read_roster_entry_from_datafile(student.filename)
+    return RosterEntry(student.sid, student.lastname, student.firstname,
+                       student.pronoun, filename)
+
+
 def update_grade(student, lt_label, new_score):
     '''
     This function takes three arguments:
@@ -362,6 +729,7 @@ def remove_lt(student, lt_label):
     student.scores.pop(lt_label)
     return student
 
+
 def remove_everything_between_parens(string_to_clean):
     '''
     This function takes a string input and returns the same string
@@ -515,6 +883,90 @@ if __name__ == "__main__":
     # Test with mismatched parentheses
     assert parse_score_history_from_comment("Previous: 1, (2, 3") == [1]
     print("Success!")
+    # Test running count of recent scores
+    print("Testing recent_counts:")
+    import data_for_unit_testing as dfut
+    for student in dfut.sample_list_of_students():
+        assert student.recent_counts == \
+            ngog.histogram_of_most_recent_scores(student.scores)
+    ivan = dfut.sample_list_of_students()[8]
+    assert ivan.recent_counts == {}
+    add_lt(ivan, 'LT01', 2)
+    add_lt(ivan, 'LT02', -1)  # Exempt scores are not counted
+    assert ivan.recent_counts == {2: 1}
+    update_grade(ivan, 'LT01', 4)
+    update_grade(ivan, 'LT02', 3)
+    assert ivan.recent_counts == {4: 1, 3: 1}
+    assert ivan.letter_grade(True) == 'A'
+    fix_grade_history(ivan, 'LT02', [2, 1])
+    assert ivan.recent_counts == {4: 1, 1: 1}
+    remove_lt(ivan, 'LT01')
+    assert ivan.recent_counts == {1: 1}
+    assert ivan.calculate_overall_grade('simple') == .50
+    print("Success!")
+    # Test score_buckets()
+    print("Testing score_buckets():")
+    students = dfut.sample_list_of_students()
+    lts = dfut.sample_list_of_lts()
+    for student in students:
+        buckets = student.score_buckets(lts)
+        assert buckets.lts_assessed == student.lts_assessed(lts)
+        assert buckets.histories == student.scores
+        for score in [0, 1, 2, 2.5, 3, 4]:
+            assert buckets.lts_with_score(score) == [
+                    ltm.lt_with_label(lt_label, lts) for lt_label in
+                    student.scores if student.scores[lt_label][-1] == score]
+        recent = ngog.list_of_most_recent_scores(student.scores)
+        assert buckets.summary.grade_code == \
+            ngog.letter_grade(recent, True)
+        assert buckets.summary.pct_of_lts_met == ngog.pct_of_lts_met(recent)
+    assert [lt.lt_label for lt in
+            students[3].score_buckets(lts).lts_with_score(2, 3)] == \
+        ['LT09', 'LT10', 'LT03', 'LT06']
+    assert students[8].score_buckets(lts).lts_assessed == []  # Ivan
+    assert repr(students[0].score_buckets(lts)) == \
+        "ScoreBuckets(3: 5, 4: 5; grade A)"
+    try:
+        students[0].score_buckets(lts[:3])
+        assert False, "Missing LTs should raise an AssertionError"
+    except AssertionError as error:
+        assert "not found" in str(error)
+    print("Success!")
+    # Test modified and mark_saved()
+    print("Testing modified and mark_saved():")
+    assert ivan.modified  # Never saved
+    ivan.mark_saved()
+    assert not(ivan.modified)
+    update_grade(ivan, 'LT02', 2)
+    assert ivan.modified
+    ivan.mark_saved()
+    ivan.scores['LT02'].append(3)  # Changes through the view count too
+    assert ivan.modified
+    ivan.mark_saved()
+    ivan.pronoun = "he"
+    assert ivan.modified
+    ivan.mark_saved()
+    ivan.scores = {'LT01': [4]}
+    assert ivan.modified
+    print("Success!")
+    # Test the roster functions
+    print("Testing read_roster_entry_from_datafile():")
+    import tempfile
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "Period_1_9.studat")
+        ivan.scores = {f'LT{number}': [1, 2, 3, 4] for number in range(99)}
+        assert dm.write_student_data_to_file(ivan, filename)
+        entry = read_roster_entry_from_datafile(filename, chunk_size=16)
+        assert entry == RosterEntry(9, "Whittier", "Ivan", "he", filename)
+        assert repr(entry) == str(ivan).split(", scores: ")[0]
+        assert entry.name_str() == ivan.name_str()
+        assert roster_entry(LazyStudent(filename), filename) == entry
+        assert roster_entry(ivan, filename) == entry
+        assert read_roster_entry_from_datafile(filename + "x") is False
+    roster = Roster([entry, RosterEntry(2, "Livingston", "Bob", "he")])
+    assert roster.find('sid', 9) is entry
+    assert roster.pick_list() == ["2: Livingston, Bob", "9: Whittier, Ivan"]
+    print("Success!")
     # Print final success message
     print("All tests passed successfully!")
     
\ No newline at end of file
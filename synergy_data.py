@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+"""
+Description: synergy_data module.
+This module contains functions that turn the data on a Grade Book Main
+page of the Synergy Education Platform into a ClassPeriod. They work on
+plain strings, so they need neither selenium nor a browser: the data
+can be scraped from a live page (see synergy_to_sbg.scrape_gradebook())
+or read from a saved one.
+
+The data on a gradebook page is held in a dictionary with the keys
+    'focus': the text of the class focus label
+        (e.g. 'Current Focus: (S1) Dirks, M  Int Math Top 1 S1(3) SEC: 2'),
+    'assignments': the value of the assignment name index, in which the
+        names of the assignments are separated by ASSIGNMENT_SEPARATOR,
+    'names': one name per student, as 'Last, First', and
+    'scores': the text of every score box in the score grid, row by
+        row, with one row per student and one box per assignment.
+"""
+
+# import modules
+import classperiod_module as cpm
+import lt_module as ltm
+import student_module as stu
+from nitty_gritty_of_grading import DEFAULT_X_CODE
+
+# Global variables
+# Separator between assignment names in the assignment name index
+ASSIGNMENT_SEPARATOR = '║'
+# Label text before the class period's name
+CURRENT_FOCUS_PREFIX = 'Current Focus: '
+GRADEBOOK_DATA_KEYS = ('focus', 'assignments', 'names', 'scores')
+# Keyword to look for in assignment name of 'overall grade' column
+OVERALL_GRADE_KEYWORD = 'IGNORE'
+
+
+def split_assignment_index(assignment_index):
+    '''
+    This function takes the value of a gradebook page's assignment name
+    index and returns a list of the names of the assignments, in column
+    order.
+    '''
+    return assignment_index.split(ASSIGNMENT_SEPARATOR)
+
+
+def assignment_is_probably_lt(assignment_name):
+    '''
+    This function returns True if a given string is likely the name
+    of an LT assignment.
+    It's really stupid. It just checks whether the first two characters
+    are 'LT'
+    '''
+    return assignment_name[0:2] == 'LT'
+
+
+def classperiod_name_from_focus(focus_text):
+    '''
+    This function takes the text of a gradebook page's class focus label
+    (e.g. 'Current Focus: (S1) Dirks, M  Int Math Top 1 S1(3) SEC: 2')
+    and returns a string describing the class period, with spaces and
+    punctuation replaced by underscores (e.g. '_S1__Dirks__M__Int_...').
+    '''
+    # Chop off leading string 'Current focus',
+    # and also everything after 'SEC'.
+    focus_text = str(focus_text).strip()
+    sec_index = focus_text.find(' SEC:')
+    class_name = focus_text[len(CURRENT_FOCUS_PREFIX):sec_index].strip()
+    return cpm.replace_punctuation_with_underscores(class_name)
+
+
+def lts_from_assignments(assignments):
+    '''
+    This function takes a list of assignment names in column order and
+    returns a LearningTargetList of LearningTarget objects corresponding
+    to the assignments whose titles begin with 'LT'.
+    For example, if there is an assignment called 'LT1A Basket Weaving',
+    the list will contain a corresponding LearningTarget object
+    with lt_label 'LT1A', brief 'Basket Weaving', and gb_column
+    set to the assignment's column.
+    '''
+    list_of_lts = ltm.LearningTargetList()
+    for column, assignment in enumerate(assignments):
+        assignment = assignment.strip()
+        if assignment_is_probably_lt(assignment):
+            first_space_index = assignment.find(' ')
+            lt_label = assignment[0:first_space_index]
+            lt_brief = assignment[first_space_index+1:]
+            list_of_lts.append(ltm.LearningTarget(lt_label,
+                                                  lt_brief,
+                                                  gb_column=column))
+    return list_of_lts
+
+
+def student_from_name(index, student_name):
+    '''
+    This function takes an index and a student's name as it appears on
+    a gradebook page ('Last, First'), and returns a Student object with
+    that index as its ID.
+    If for some reason a student name has multiple commas,
+    everything after the first comma is in the first name.
+    '''
+    student_last, _, student_first = str(student_name).partition(', ')
+    return stu.Student(index, student_last, student_first)
+
+
+def score_from_text(score_text):
+    '''
+    This function takes the text of a score box and returns the score as
+    a float. If the box is blank, a letter, or anything else that is not
+    a number, it returns DEFAULT_X_CODE (exempt) so that the score
+    doesn't figure into the grade.
+    '''
+    try:
+        return float(score_text)
+    except ValueError:
+        return DEFAULT_X_CODE
+
+
+def lt_score_matrix(score_texts, assignment_count, list_of_lts,
+                    student_count):
+    '''
+    This function takes four arguments:
+        (i) the text of every score box in the score grid, row by row,
+        (ii) the number of assignments (boxes per row),
+        (iii) a list of LTs whose gb_column values correspond to their
+             columns in the score grid, and
+        (iv) the number of students (rows).
+    It returns a list of lists, where each inner list contains one
+    student's scores (see score_from_text()) on the LTs, in the order of
+    the columns of the LTs.
+    '''
+    lt_columns = sorted(lt.gb_column for lt in list_of_lts)
+    score_matrix = []
+    for student_index in range(student_count):
+        row = score_texts[student_index * assignment_count:
+                          (student_index + 1) * assignment_count]
+        score_matrix.append([score_from_text(row[column])
+                             for column in lt_columns if column < len(row)])
+    return score_matrix
+
+
+def classperiod_from_gradebook_data(data):
+    '''
+    This function takes a dictionary of the data on a gradebook page
+    (see the module description) and returns a ClassPeriod object
+    containing the students on that page, the learning targets, and
+    student scores on learning targets.
+    It raises a ValueError if any of the data is missing.
+    '''
+    missing_keys = [key for key in GRADEBOOK_DATA_KEYS if key not in data]
+    if len(missing_keys) > 0:
+        raise ValueError(f"Gradebook data is missing {missing_keys}")
+    assignments = split_assignment_index(data['assignments'])
+    list_of_lts = lts_from_assignments(assignments)
+    student_list = [student_from_name(index, name)
+                    for index, name in enumerate(data['names'])]
+    score_matrix = lt_score_matrix(data['scores'], len(assignments),
+                                   list_of_lts, len(student_list))
+    # Pair each column's scores with the LT in that column
+    lts_in_columns = sorted(list_of_lts, key=lambda lt: lt.gb_column)
+    cp = cpm.ClassPeriod(classperiod_name_from_focus(data['focus']),
+                         student_list, list_of_lts)
+    for student, scores in zip(cp.students_in_period, score_matrix):
+        for lt, score in zip(lts_in_columns, scores):
+            stu.add_lt(student, lt.lt_label, score)
+    return cp
+
+
+def overall_grade_column(assignments, keyword=OVERALL_GRADE_KEYWORD):
+    '''
+    This function takes a list of assignment names in column order and
+    a keyword that is found only in the overall grade column.
+    It returns the column of the first assignment whose name contains
+    the keyword (ignoring case) and is not an LT, or -1 if there is none.
+    '''
+    keyword = keyword.upper()
+    for column, assignment in enumerate(assignments):
+        if (keyword in assignment.upper()) and\
+                (assignment[:2].upper() != 'LT'):
+            return column
+    return -1
+
+
+def overall_scores_are_valid(scores, comments, student_count):
+    '''
+    This function checks a list of overall grades and a list of comments
+    before they are written to a gradebook page with student_count
+    students: every grade must be an int, and there must be one grade
+    and one comment per student.
+    It returns True if so. Otherwise it prints the problem and returns
+    False.
+    '''
+    # Make sure all scores are ints
+    for score in scores:
+        if type(score) != int:
+            print("Error: overall grades must be a list of ints.")
+            print(f"Non-int found: {score}")
+            return False
+    # Make sure number of scores == number of students
+    if len(scores) != student_count:
+        print("Error: score count does not match student count.")
+        return False
+    # Make sure number of comments == number of students
+    if len(comments) != student_count:
+        print("Error: comment count does not match student count.")
+        return False
+    return True
+
+
+def column_of_score_texts(score_texts, assignment_count, column):
+    '''
+    This function takes the text of every score box in the score grid,
+    row by row, the number of assignments (boxes per row) and a column,
+    and returns the text of each student's box in that column.
+    '''
+    return score_texts[column::assignment_count]
+
+
+def score_mismatches(names, scores, score_texts):
+    '''
+    This function compares the scores that were written to a column of
+    a gradebook page with the text read back from that column.
+    It takes a list of student names, a list of the scores written (one
+    per student) and a list of the text of each student's box.
+    It returns a list of (student index, student name, score written,
+    text found) tuples, one for each student whose box does not show
+    the score that was written.
+    '''
+    mismatches = []
+    for index, (name, score) in enumerate(zip(names, scores)):
+        text = score_texts[index] if index < len(score_texts) else ''
+        if score_from_text(text) != score:
+            mismatches.append((index, name, score, text))
+    return mismatches
+
+
+# Unit tests
+if __name__ == "__main__":
+    data = {'focus': 'Current Focus: (S1) Dirks, M  Int Math 1 SEC: 2',
+            'assignments': '║'.join(['LT1 Basket Weaving', 'Quiz 1',
+                                     'LT2A Knots', 'IGNORE Overall']),
+            'names': ['Aerik, Frank', 'Bob, Livingston, Jr.'],
+            'scores': ['3', '71', '\xa0', '', '4', '68', '2.5', '']}
+    # Test classperiod_name_from_focus()
+    print("Testing classperiod_name_from_focus():")
+    assert classperiod_name_from_focus(data['focus']) == \
+        '_S1__Dirks__M__Int_Math_1'
+    print("Success!")
+    # Test lts_from_assignments()
+    print("Testing lts_from_assignments():")
+    lts = lts_from_assignments(split_assignment_index(data['assignments']))
+    assert [(lt.lt_label, lt.brief, lt.gb_column) for lt in lts] == \
+        [('LT1', 'Basket Weaving', 0), ('LT2A', 'Knots', 2)]
+    print("Success!")
+    # Test student_from_name()
+    print("Testing student_from_name():")
+    student = student_from_name(1, 'Bob, Livingston, Jr.')
+    assert (student.sid, student.lastname, student.firstname) == \
+        (1, 'Bob', 'Livingston, Jr.')
+    print("Success!")
+    # Test lt_score_matrix()
+    print("Testing lt_score_matrix():")
+    assert lt_score_matrix(data['scores'], 4, lts, 2) == \
+        [[3.0, DEFAULT_X_CODE], [4.0, 2.5]]
+    assert lt_score_matrix(data['scores'][:5], 4, lts, 2) == \
+        [[3.0, DEFAULT_X_CODE], [4.0]]
+    print("Success!")
+    # Test classperiod_from_gradebook_data()
+    print("Testing classperiod_from_gradebook_data():")
+    cp = classperiod_from_gradebook_data(data)
+    assert cp.description == '_S1__Dirks__M__Int_Math_1'
+    assert [lt.lt_label for lt in cp.course_lts] == ['LT1', 'LT2A']
+    assert dict(cp.find_student(0).scores) == {'LT1': [3.0],
+                                               'LT2A': [DEFAULT_X_CODE]}
+    assert dict(cp.find_student(1).scores) == {'LT1': [4.0],
+                                               'LT2A': [2.5]}
+    try:
+        classperiod_from_gradebook_data({'focus': ''})
+        assert False, "Missing data should raise a ValueError"
+    except ValueError:
+        pass
+    print("Success!")
+    # Test overall_grade_column()
+    print("Testing overall_grade_column():")
+    assignments = split_assignment_index(data['assignments'])
+    assert overall_grade_column(assignments) == 3
+    assert overall_grade_column(assignments, 'quiz') == 1
+    assert overall_grade_column(assignments, 'knots') == -1
+    print("Success!")
+    # Test overall_scores_are_valid()
+    print("Testing overall_scores_are_valid():")
+    assert overall_scores_are_valid([90, 85], ['', 'Nice work'], 2)
+    assert not(overall_scores_are_valid([90, 85.5], ['', ''], 2))
+    assert not(overall_scores_are_valid([90], [''], 2))
+    assert not(overall_scores_are_valid([90, 85], [''], 2))
+    print("Success!")
+    # Test score_mismatches()
+    print("Testing score_mismatches():")
+    found = column_of_score_texts(data['scores'], 4, 1)
+    assert found == ['71', '68']
+    assert score_mismatches(data['names'], [71, 68], found) == []
+    assert score_mismatches(data['names'], [71, 70], found) == \
+        [(1, 'Bob, Livingston, Jr.', 70, '68')]
+    assert score_mismatches(data['names'], [71, 68], found[:1]) == \
+        [(1, 'Bob, Livingston, Jr.', 68, '')]
+    print("Success!\n\n")
+    print("All tests were successful.")
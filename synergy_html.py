@@ -0,0 +1,319 @@
+# -*- coding: utf-8 -*-
+"""
+Description: synergy_html module.
+This module reads a Grade Book Main page of the Synergy Education
+Platform that was saved as an HTML file, and turns it into the same
+ClassPeriod that synergy_to_sbg.create_classperiod_from_synergy() would
+build from the live page. It needs neither selenium nor a browser, so
+saved gradebook pages can be imported on a machine without a display.
+
+The page is read in a single pass with html.parser, which picks out
+    *the class focus label (ctl00_lbl_ACC_ClassFocus),
+    *the assignment name index
+        (ctl00_lowerFixedBarContainer_hf_AssignmentNameIndex),
+    *the rows of the student table (ctl00_cphbody_gv_StudentsScores),
+        skipping the heading and bottom rows, and
+    *the score boxes (class SAI) of the score grid
+        (ctl00_cphbody_GV_Assignments).
+"""
+
+# import modules
+import os
+from html.parser import HTMLParser
+import synergy_data as sd
+
+# Global variables
+FOCUS_ID = 'ctl00_lbl_ACC_ClassFocus'
+ASSIGNMENT_INDEX_ID = 'ctl00_lowerFixedBarContainer_hf_AssignmentNameIndex'
+STUDENT_TABLE_ID = 'ctl00_cphbody_gv_StudentsScores'
+SCORE_GRID_ID = 'ctl00_cphbody_GV_Assignments'
+SCORE_BOX_CLASS = 'SAI'
+# Tags that start a new line of a row's text, as a browser would show it
+LINE_BREAK_TAGS = frozenset(['br', 'div', 'p', 'tr', 'li'])
+# Tags that have no end tag
+VOID_TAGS = frozenset(['area', 'base', 'br', 'col', 'embed', 'hr', 'img',
+                       'input', 'link', 'meta', 'param', 'source', 'track',
+                       'wbr'])
+
+
+class GradebookPageParser(HTMLParser):
+    '''
+    Class that reads the data on a saved gradebook page (see the module
+    description) as the page is fed to it. After close(), the data is
+    in gradebook_data() (see synergy_data for the keys).
+    '''
+
+    def __init__(self):
+        '''
+        Constructor method.
+        '''
+        super().__init__()
+        self.focus_parts = []
+        self.assignments = None
+        self.row_texts = None  # Text of each row of the student table
+        self.scores = None
+        # Number of open elements of each kind being read
+        # (0 when not inside one)
+        self.focus_depth = 0
+        self.student_table_depth = 0
+        self.score_grid_depth = 0
+        self.score_box_depth = 0
+        # (index, text) of each open row of the student table
+        self.open_rows = []
+        self.score_box_parts = []
+
+    def handle_starttag(self, tag, attrs):
+        '''
+        Method called for each start tag.
+        '''
+        attrs = dict(attrs)
+        element_id = attrs.get('id')
+        if tag == 'input' and element_id == ASSIGNMENT_INDEX_ID:
+            self.assignments = attrs.get('value') or ''
+        if tag == 'span' and (self.focus_depth > 0 or element_id == FOCUS_ID):
+            self.focus_depth += 1
+        if tag == 'table':
+            if self.student_table_depth > 0 or element_id == STUDENT_TABLE_ID:
+                if self.row_texts is None:
+                    self.row_texts = []
+                self.student_table_depth += 1
+            if self.score_grid_depth > 0 or element_id == SCORE_GRID_ID:
+                if self.scores is None:
+                    self.scores = []
+                self.score_grid_depth += 1
+        if self.student_table_depth > 0:
+            if tag == 'tr':
+                # Rows are kept in the order they start
+                self.open_rows.append((len(self.row_texts), []))
+                self.row_texts.append('')
+            if tag in LINE_BREAK_TAGS:
+                self.add_row_text('\n')
+            elif tag in ('td', 'th'):
+                self.add_row_text(' ')
+        if tag in VOID_TAGS:
+            return
+        if self.score_box_depth > 0:
+            self.score_box_depth += 1
+        elif (self.score_grid_depth > 0 and
+                SCORE_BOX_CLASS in (attrs.get('class') or '').split()):
+            self.score_box_depth = 1
+            self.score_box_parts = []
+
+    def handle_startendtag(self, tag, attrs):
+        '''
+        Method called for each empty element tag (e.g. <br/>).
+        '''
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        '''
+        Method called for each end tag.
+        '''
+        if tag == 'span' and self.focus_depth > 0:
+            self.focus_depth -= 1
+        if self.student_table_depth > 0:
+            if tag in LINE_BREAK_TAGS:
+                self.add_row_text('\n')
+            if tag == 'tr' and len(self.open_rows) > 0:
+                row_index, parts = self.open_rows.pop()
+                self.row_texts[row_index] = "".join(parts)
+            if tag == 'table':
+                self.student_table_depth -= 1
+        if tag == 'table' and self.score_grid_depth > 0:
+            self.score_grid_depth -= 1
+        if self.score_box_depth > 0 and tag not in VOID_TAGS:
+            self.score_box_depth -= 1
+            if self.score_box_depth == 0:
+                self.scores.append("".join(self.score_box_parts).strip())
+
+    def handle_data(self, data):
+        '''
+        Method called for the text between tags.
+        '''
+        if self.focus_depth > 0:
+            self.focus_parts.append(data)
+        if self.student_table_depth > 0:
+            # Runs of whitespace show up as a single space
+            self.add_row_text(" ".join(data.split()) if data.strip() != ''
+                              else ' ')
+        if self.score_box_depth > 0:
+            self.score_box_parts.append(data)
+
+    def add_row_text(self, text):
+        '''
+        This method adds text to every open row of the student table
+        (a row's text includes the text of any rows nested in it).
+        '''
+        for _, parts in self.open_rows:
+            parts.append(text)
+
+    def gradebook_data(self):
+        '''
+        This method returns a dictionary of the data read from the page
+        (see synergy_data). Data that was not found on the page is left
+        out, except for the class focus, which is blank.
+        '''
+        data = {'focus': "".join(self.focus_parts).strip()}
+        if self.assignments is not None:
+            data['assignments'] = self.assignments
+        if self.row_texts is not None:
+            # Skip heading and bottom
+            data['names'] = [student_name_from_row_text(text)
+                             for text in self.row_texts[1:-1]]
+        if self.scores is not None:
+            data['scores'] = self.scores
+        return data
+
+
+def student_name_from_row_text(row_text):
+    '''
+    This function takes the text of a row of the student table and
+    returns the student's name, the first line of the text
+    (e.g. 'Aerik, Frank').
+    '''
+    for line in row_text.split('\n'):
+        line = " ".join(line.split())
+        if line != '':
+            return line
+    return ''
+
+
+def read_gradebook_html(html_text):
+    '''
+    This function takes the HTML of a saved gradebook page as a string
+    and returns a dictionary of the data on the page (see synergy_data).
+    '''
+    parser = GradebookPageParser()
+    parser.feed(html_text)
+    parser.close()
+    return parser.gradebook_data()
+
+
+def classperiod_from_gradebook_html(html_text, description=None):
+    '''
+    This function takes the HTML of a saved gradebook page as a string
+    and returns a ClassPeriod object containing the students on that
+    page, the learning targets, and student scores on learning targets
+    (see sd.classperiod_from_gradebook_data()).
+    If description is given, it is used as the description of the
+    ClassPeriod when the page has no class focus label.
+    It raises a ValueError if the page has no assignment index, student
+    table or score grid.
+    '''
+    data = read_gradebook_html(html_text)
+    cp = sd.classperiod_from_gradebook_data(data)
+    if data['focus'] == '' and description is not None:
+        cp.description = description
+    return cp
+
+
+def read_gradebook_file(filename):
+    '''
+    This function takes the name of a saved gradebook page (an HTML
+    file) and returns the ClassPeriod on that page
+    (see classperiod_from_gradebook_html()). If the page has no class
+    focus label, the ClassPeriod is named after the file.
+    On error, it prints a warning and returns False.
+    '''
+    try:
+        with open(filename, 'r', encoding='utf-8', errors='replace') as file:
+            html_text = file.read()
+    except IOError:
+        print(f"Warning: could not read file {filename}")
+        return False
+    description = os.path.splitext(os.path.basename(filename))[0]
+    try:
+        return classperiod_from_gradebook_html(html_text, description)
+    except ValueError as error:
+        print(f"Warning: {filename} is not a gradebook page ({error})")
+        return False
+
+
+# Unit tests
+if __name__ == "__main__":
+    import tempfile
+    from nitty_gritty_of_grading import DEFAULT_X_CODE
+
+    def score_cell(score):
+        return ('<td class="cAGR"><div class="dc">' +
+                f'<div class="SAI">{score}</div>' +
+                '<div class="SS" style="display:none;">0.00</div>' +
+                '<div class="SAE"><input class="GB_AssignmentGridTextbox" ' +
+                f'type="text" value="{score}"></div></div></td>')
+
+    page = "\n".join([
+        '<html><body>',
+        f'<span id="{FOCUS_ID}" class="sr-only">',
+        '    Current Focus: (S1) Dirks, M  Int Math 1 SEC: 2</span>',
+        f'<input type="hidden" id="{ASSIGNMENT_INDEX_ID}" ',
+        '    value="LT1 Basket Weaving║Quiz 1║LT2A Knots &amp; Bows║' +
+        'IGNORE Overall">',
+        f'<table id="{STUDENT_TABLE_ID}"><tbody>',
+        '<tr><th>Student</th></tr>',
+        '<tr><td><a href="#">Aerik,\n  Frank</a><br/>Grade 9</td>' +
+        '<td>12345</td></tr>',
+        '<tr><td><div>Bob, Livingston, Jr.</div>' +
+        '<table><tr><td>nested</td></tr></table></td></tr>',
+        '<tr><td>Total</td></tr>',
+        '</tbody></table>',
+        f'<table id="{SCORE_GRID_ID}"><tbody>',
+        '<tr class="topLocation"><th>LT1</th></tr>',
+        '<tr class="cAGR">' + "".join(score_cell(score) for score in
+                                      ['3', '71', '&nbsp;', '']) + '</tr>',
+        '<tr class="cAGR">' + "".join(score_cell(score) for score in
+                                      ['4', '68', '2.5', '']) + '</tr>',
+        '<tr class="GB_AssignmentGridFooterRow"><td>Avg</td></tr>',
+        '</tbody></table>',
+        '<div class="SAI">not a score</div>',
+        '</body></html>'])
+    # Test read_gradebook_html()
+    print("Testing read_gradebook_html():")
+    data = read_gradebook_html(page)
+    assert data['focus'] == \
+        'Current Focus: (S1) Dirks, M  Int Math 1 SEC: 2'
+    assert sd.split_assignment_index(data['assignments']) == \
+        ['LT1 Basket Weaving', 'Quiz 1', 'LT2A Knots & Bows',
+         'IGNORE Overall']
+    # The nested row counts as a row, as it does in a browser
+    assert data['names'] == ['Aerik, Frank', 'Bob, Livingston, Jr.',
+                             'nested']
+    assert data['scores'] == ['3', '71', '', '', '4', '68', '2.5', '']
+    print("Success!")
+    # Test classperiod_from_gradebook_html()
+    print("Testing classperiod_from_gradebook_html():")
+    page = page.replace('<table><tr><td>nested</td></tr></table>', '')
+    cp = classperiod_from_gradebook_html(page)
+    expected = sd.classperiod_from_gradebook_data(
+            {'focus': 'Current Focus: (S1) Dirks, M  Int Math 1 SEC: 2',
+             'assignments': 'LT1 Basket Weaving║Quiz 1║LT2A Knots & ' +
+             'Bows║IGNORE Overall',
+             'names': ['Aerik, Frank', 'Bob, Livingston, Jr.'],
+             'scores': ['3', '71', '', '', '4', '68', '2.5', '']})
+    assert repr(cp) == repr(expected)
+    assert cp.description == '_S1__Dirks__M__Int_Math_1'
+    assert dict(cp.find_student(0).scores) == {'LT1': [3.0],
+                                               'LT2A': [DEFAULT_X_CODE]}
+    assert cp.find_student(1).firstname == 'Livingston, Jr.'
+    try:
+        classperiod_from_gradebook_html('<html>Not a gradebook</html>')
+        assert False, "Pages with no gradebook should raise a ValueError"
+    except ValueError:
+        pass
+    print("Success!")
+    # Test read_gradebook_file()
+    print("Testing read_gradebook_file():")
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, "Period 3.html")
+        with open(filename, 'w', encoding='utf-8') as file:
+            file.write(page.replace(FOCUS_ID, 'some_other_label'))
+        cp = read_gradebook_file(filename)
+        assert cp.description == "Period 3"
+        assert len(cp.students_in_period) == 2
+        with open(filename, 'w', encoding='utf-8') as file:
+            file.write('<html></html>')
+        assert read_gradebook_file(filename) is False
+        assert read_gradebook_file(os.path.join(directory, "none")) is False
+    print("Success!\n\n")
+    print("All tests were successful.")
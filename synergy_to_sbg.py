@@ -16,18 +16,64 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.keys import Keys
+from selenium.webdriver.common.action_chains import ActionChains
 from selenium.common.exceptions import NoSuchElementException, \
-    ElementClickInterceptedException
-import student_module as stu
+    ElementClickInterceptedException, TimeoutException
+import json
 import lt_module as ltm
-import classperiod_module as cpm
+import synergy_data as sd
 from nitty_gritty_of_grading import DEFAULT_X_CODE
 
 # Global variables (shudder)
 # Keyword to look for in assignment name of 'overall grade' column
-OVERALL_GRADE_KEYWORD = 'IGNORE'
+OVERALL_GRADE_KEYWORD = sd.OVERALL_GRADE_KEYWORD
 SYNERGY_URL = 'https://wa-bsd405.edupoint.com/'
 SYNERGY_TRAIN_MODE_URL = 'https://wa-bsd405.edupoint.com/train/login.aspx'
+# Seconds to wait for grades written to Synergy to show up on the page
+WRITE_BACK_TIMEOUT = 10
+# JavaScript that returns the score box in a given column of the first row
+FIRST_SCORE_BOX_SCRIPT = '''
+    return document.getElementById('ctl00_cphbody_GV_Assignments')
+        .getElementsByClassName('SAI')[arguments[0]];
+'''
+# JavaScript that reads everything on a Grade Book Main page in one call
+# and returns it as a JSON string (see synergy_data for the keys).
+# Reading each element through the WebDriver costs one round trip per
+# element, which adds up to thousands of round trips per gradebook.
+GRADEBOOK_SCRAPE_SCRIPT = '''
+    var byId = function(id) { return document.getElementById(id); };
+    var focus = byId('ctl00_lbl_ACC_ClassFocus');
+    var index = byId('ctl00_lowerFixedBarContainer_hf_AssignmentNameIndex');
+    var rows = byId('ctl00_cphbody_gv_StudentsScores')
+        .getElementsByTagName('tr');
+    var boxes = byId('ctl00_cphbody_GV_Assignments')
+        .getElementsByClassName('SAI');
+    var names = [];
+    for (var i = 1; i < rows.length - 1; i++) {
+        names.push(rows[i].innerText.split('\\n')[0].trim());
+    }
+    var scores = [];
+    for (var j = 0; j < boxes.length; j++) {
+        scores.push(boxes[j].textContent.trim());
+    }
+    return JSON.stringify({
+        focus: focus ? focus.textContent.trim() : '',
+        assignments: index.value,
+        names: names,
+        scores: scores});
+'''
+# JavaScript that returns the text of every score box in a given column
+# (arguments[0]) of a page with a given number of assignments
+# (arguments[1]), in row order
+COLUMN_SCORES_SCRIPT = '''
+    var boxes = document.getElementById('ctl00_cphbody_GV_Assignments')
+        .getElementsByClassName('SAI');
+    var texts = [];
+    for (var i = arguments[0]; i < boxes.length; i += arguments[1]) {
+        texts.push(boxes[i].textContent.trim());
+    }
+    return texts;
+'''
 
 # Define functions
 
@@ -46,16 +92,6 @@ def count_assignments(driver):
     return len(assignments)
 
 
-def assignment_is_probably_lt(assignment_name):
-    '''
-    This function returns True if a given string is likely the name
-    of an LT assignment.
-    It's really stupid. It just checks whether the first two characters
-    are 'LT'
-    '''
-    return assignment_name[0:2] == 'LT'
-
-
 def get_classperiod_name(driver):
     '''
     This function takes a selenium WebDriver object as an argument.
@@ -72,14 +108,7 @@ def get_classperiod_name(driver):
     </span>
     '''
     span_elt = driver.find_element_by_id('ctl00_lbl_ACC_ClassFocus')
-    class_name = str(span_elt.text)
-    # Chop off leading string 'Current focus',
-    # and also everything after 'SEC'.
-    current_focus_str = 'Current_Focus: '
-    current_focus_len = len(current_focus_str)
-    sec_index = class_name.find(' SEC:')
-    class_name = class_name[current_focus_len:sec_index].strip()
-    return cpm.replace_punctuation_with_underscores(class_name)
+    return sd.classperiod_name_from_focus(span_elt.text)
 
 
 def get_lt_list(driver):
@@ -93,21 +122,11 @@ def get_lt_list(driver):
     the list will contain a corresponding LearningTarget object
     with lt_label '1A' and lt_brief 'Basket Weaving'.
     '''
-    list_of_lts = []
     assignment_elts = driver.find_element_by_id(
             'ctl00_lowerFixedBarContainer_hf_AssignmentNameIndex')
     assignment_list_str = assignment_elts.get_attribute('value')
-    assignments = assignment_list_str.split('║')
-    for column, assignment in enumerate(assignments):
-        assignment = assignment.strip()
-        if assignment_is_probably_lt(assignment):
-            first_space_index = assignment.find(' ')
-            lt_label = assignment[0:first_space_index]
-            lt_brief = assignment[first_space_index+1:]
-            list_of_lts.append(ltm.LearningTarget(lt_label,
-                                                  lt_brief,
-                                                  gb_column=column))
-    return(list_of_lts)
+    return sd.lts_from_assignments(
+            sd.split_assignment_index(assignment_list_str))
 
 
 def get_student_list(driver):
@@ -122,17 +141,8 @@ def get_student_list(driver):
     table_id = driver.find_element_by_id('ctl00_cphbody_gv_StudentsScores')
     students = table_id.find_elements_by_tag_name('tr')
     for index, record in enumerate(students[1:-1]):  # Skip heading and bottom
-        # Figure out student name by splitting on newlines and then commas.
-        # If for some reason a student name has multiple commas,
-        # assume everything after the first comma is in the first name.
-        student_name = str(record.text).split('\n')[0].split(', ')
-        student_last = student_name[0]
-        student_first = student_name[1]
-        if len(student_name) > 2:  # Add on to first name if necessary
-            for next_name in student_name[2:]:
-                student_first += ', ' + next_name
-        list_of_students.append(
-                stu.Student(index, student_last, student_first))
+        student_name = str(record.text).split('\n')[0]
+        list_of_students.append(sd.student_from_name(index, student_name))
     return(list_of_students)
 
 
@@ -299,6 +309,19 @@ def initialize_driver_with_user_input(synergy_url=SYNERGY_URL):
     return browser
 
 
+def scrape_gradebook(driver):
+    '''
+    This function takes a selenium WebDriver object as an argument.
+    The WebDriver should be pointed at a Grade Book Main page
+    on the Synergy Education Platform.
+    The function reads the class focus, the assignment name index, the
+    student names and the text of every score box in a single script
+    call (see GRADEBOOK_SCRAPE_SCRIPT), and returns them as a dictionary
+    (see synergy_data).
+    '''
+    return json.loads(driver.execute_script(GRADEBOOK_SCRAPE_SCRIPT))
+
+
 def create_classperiod_from_synergy(browser):
     '''
     This function takes one argument, a WebDriver object pointed to a
@@ -307,31 +330,10 @@ def create_classperiod_from_synergy(browser):
     the learning targets, and student scores on learning targets.
     If a student score is blank, a letter, or anything other than
     a valid score (0-4), is is replaced with -1 (exempt).
+    The page is read in a single round trip to the browser
+    (see scrape_gradebook()).
     '''
-    # Scrape data
-    class_name = get_classperiod_name(browser)
-    list_of_lts = get_lt_list(browser)  # Get list of LTs
-    student_list = get_student_list(browser)  # Get list of students
-    # Get scores and comments
-    score_matrix, comment_matrix = get_lt_score_matrix(browser, list_of_lts)
-    '''
-    print("Scores:")
-    print(score_matrix)
-    print("Comments:")
-    print(comment_matrix)
-    '''
-    # Create ClassPeriod object from the above data
-    cp = cpm.ClassPeriod(class_name, student_list, list_of_lts)
-    # Add student scores to the ClassPeriod
-    for student_index, student in enumerate(cp.students_in_period):
-        # Get the list of student scores across LTs.
-        # This will be a list of floats such as [3.0, 4.0, 2.0]
-        scores = score_matrix[student_index]
-        for score_index, score in enumerate(scores):
-            lt_label = list_of_lts[score_index].lt_label
-            assert type(score) == float or type(score) == int
-            student = stu.add_lt(student, lt_label, score)
-    return cp
+    return sd.classperiod_from_gradebook_data(scrape_gradebook(browser))
 
 
 def assignment_exists_with_keyword(driver, keyword):
@@ -350,12 +352,29 @@ def assignment_exists_with_keyword(driver, keyword):
     return False
 
 
-def fill_overall_scores(driver,
-                        scores,
-                        comments=[],
-                        keyword=OVERALL_GRADE_KEYWORD):
+def overall_score_mismatches(driver, names, scores, column,
+                             assignment_count):
+    '''
+    This function takes a selenium WebDriver pointed at a Synergy
+    gradebook page, a list of student names, a list of overall grades
+    (one per student), the column they were written to and the number of
+    assignments on the page. It reads only that column back from the page
+    in a single script call (see COLUMN_SCORES_SCRIPT) and returns a list
+    of mismatches (see sd.score_mismatches()), which is empty if every
+    student's box shows the grade that was written.
     '''
-    This function takes three arguments:
+    score_texts = driver.execute_script(COLUMN_SCORES_SCRIPT, column,
+                                        assignment_count)
+    return sd.score_mismatches(names, scores, score_texts)
+
+
+def write_overall_scores(driver,
+                         scores,
+                         comments=[],
+                         keyword=OVERALL_GRADE_KEYWORD,
+                         timeout=WRITE_BACK_TIMEOUT):
+    '''
+    This function takes five arguments:
         (i) driver, a selenium WebDriver argument pointed at a Synergy
             gradebook page;
         (ii) scores, a list of overall grades (ints),
@@ -364,77 +383,61 @@ def fill_overall_scores(driver,
                 blank by default
         (iv) A keyword that is found only in the overall grade column.
              By default this should be something like "Overall".
-    It returns True on success, False on failure.
+        (v) timeout, the number of seconds to wait for the grades to
+            show up on the page.
+    It writes the grades in one batch: every keystroke for the whole
+    column is queued and sent to the browser in a single action.
+    It then reads the column back (see overall_score_mismatches()),
+    waiting up to timeout seconds for the grades to show up, and prints
+    a warning for each student whose box does not show their grade.
+    It returns True if every grade was written, False otherwise.
     Note that the grades must be ints or errors will occur!
     '''
-    student_count = len(get_student_list(driver))
-    # Take care of a few conventions
-    keyword = keyword.upper()
+    data = scrape_gradebook(driver)
+    names = data['names']
+    assignments = sd.split_assignment_index(data['assignments'])
+    student_count = len(names)
     # If no comments given, change it to a list of empty comments
     if comments == []:
         comments = ['']*student_count
-    # Validate data
-    # Make sure all scores are ints
-    for score in scores:
-        if type(score) != int:
-            print("Error: fill_overall_scores expects a list of ints.")
-            print(f"Non-int found: {score}")
-            return False
-    # Make sure specified column exists
-    if not assignment_exists_with_keyword(driver, keyword):
-        print("Error: could not find overall grade column.")
-        print(f"Expected to find keyword {keyword}, but could not find it.")
+    if not sd.overall_scores_are_valid(scores, comments, student_count):
         return False
-    # Make sure number of scores == number of students
-    if len(scores) != student_count:
-        print("Error: score count does not match student count.")
-        return False
-    # Make sure number of comments == number of students
-    if len(comments) != student_count:
-        print("Error: comment count does not match student count.")
-        return False
-    # Find column that contains the overall scores
-    assignment_elts = driver.find_element_by_id(
-         'ctl00_lowerFixedBarContainer_hf_AssignmentNameIndex')
-    assignment_list_str = assignment_elts.get_attribute('value')
-    assignments = assignment_list_str.split('║')
-    overall_grade_column = -1  # Initialize as nonsense
-    for column, assignment in enumerate(assignments):
-        if (keyword in assignment.upper()) and\
-                (assignment[:2].upper() != 'LT'):
-            overall_grade_column = column
-            break
-    if overall_grade_column == -1:
+    column = sd.overall_grade_column(assignments, keyword)
+    if column == -1:
         print("Error: could not find column " +
-              f"whose header contains {keyword}")
+              f"whose header contains {keyword.upper()}")
         return False
-    # Create list containing all score boxes
-    table = driver.find_element_by_id('ctl00_cphbody_GV_Assignments')
-    score_boxes = table.find_elements_by_class_name('SAI')
     # Click on the first-row box of the overall grade column
     try:
-        score_boxes[overall_grade_column].click()
+        driver.execute_script(FIRST_SCORE_BOX_SCRIPT, column).click()
     except ElementClickInterceptedException:
         print("Could not write scores. Try saving the page first.")
-    # Write first score, press enter, and move down the list.
-    for student_index in range(len(scores)):
-        clicked_box = driver.switch_to.active_element
-        clicked_box.send_keys(scores[student_index])
-        # Write comment if applicable
-        comment = comments[student_index]
+        return False
+    if any(comment != '' for comment in comments):
+        comment_box = driver.find_element_by_id('txt_NotesPublic')
+    # Queue each score (and comment) and an Enter to move down the list
+    actions = ActionChains(driver)
+    for score, comment in zip(scores, comments):
+        actions.send_keys(str(score))
         if comment != '':
-            driver.switch_to.parent_frame
-            comment_box = driver.find_element_by_id('txt_NotesPublic')
-            comment_box.click()
-            comment_box.send_keys(comments[student_index])
-            # Press Enter to move to next score box
-            comment_box.send_keys(Keys.ENTER)
-        else:
-            # Press Enter to move to the next score box
-            clicked_box.send_keys(Keys.ENTER)
-    # Switch focus back to grades frame
-    driver.switch_to.default_content
-    return True
+            actions.click(comment_box)
+            actions.send_keys(comment)
+        actions.send_keys(Keys.ENTER)
+    actions.perform()
+    # Read the column back until it shows every grade, or time runs out
+    try:
+        WebDriverWait(driver, timeout).until(
+                lambda driver: overall_score_mismatches(
+                        driver, names, scores, column,
+                        len(assignments)) == [])
+    except TimeoutException:
+        pass
+    mismatches = overall_score_mismatches(driver, names, scores, column,
+                                          len(assignments))
+    for index, name, score, text in mismatches:
+        print(f"Warning: wrote {score} for {name} (row {index + 1}), " +
+              f"but Synergy shows '{text}'")
+    return len(mismatches) == 0
 
 
 def fill_username_on_home(driver, username):
@@ -454,5 +457,4 @@ if __name__ == "__main__":
     cp = create_classperiod_from_synergy(browser)
     print(cp)
     scores = cp.get_list_of_overall_grades()
-    comments = [''] * len(get_student_list(browser))
-    fill_overall_scores(browser, scores, comments, OVERALL_GRADE_KEYWORD)
+    write_overall_scores(browser, scores, [], OVERALL_GRADE_KEYWORD)